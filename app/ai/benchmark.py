@@ -0,0 +1,143 @@
+# app/ai/benchmark.py
+"""
+Бенчмарк собственных накладных расходов AI-пайплайна.
+
+Запускает генерацию, очистку и анализ схемы через локальный провайдер и измеряет,
+сколько времени платформа тратит вокруг вызова модели (сборка промпта, разбор JSON
+и т.д.). Время внутри провайдера вычитается, поэтому сеть и сама модель не нужны.
+
+Пример запуска:
+    python -m app.ai.benchmark --iterations 200 --rows 50 --latency-ms 5
+"""
+import os
+import json
+import time
+import argparse
+import contextlib
+import statistics
+from typing import List, Dict, Any, Callable
+
+from . import services
+from .providers import LLMProvider, LocalProvider, set_provider
+from .scheduler import RequestScheduler, set_scheduler, estimate_tokens
+
+
+BENCHMARK_SCHEMA = {
+    "fields": [
+        {"field_name": "full_name", "display_name": "ФИО", "type": "string"},
+        {"field_name": "email", "display_name": "Email", "type": "email"},
+        {"field_name": "age", "display_name": "Возраст", "type": "integer"},
+        {"field_name": "balance", "display_name": "Баланс", "type": "number"},
+        {"field_name": "is_active", "display_name": "Активен", "type": "boolean"},
+        {"field_name": "signed_up", "display_name": "Дата регистрации", "type": "date"},
+    ]
+}
+
+
+class TimingProvider(LLMProvider):
+    """Обёртка над провайдером, которая суммирует время, проведённое внутри него."""
+
+    def __init__(self, inner: LLMProvider):
+        self.inner = inner
+        self.name = f"timed:{inner.name}"
+        self.elapsed = 0.0
+
+    def complete(self, messages, temperature, json_mode=True, task=None, context=None):
+        started = time.perf_counter()
+        try:
+            return self.inner.complete(messages, temperature, json_mode=json_mode, task=task, context=context)
+        finally:
+            self.elapsed += time.perf_counter() - started
+
+    def stream(self, messages, temperature, task=None, context=None):
+        iterator = self.inner.stream(messages, temperature, task=task, context=context)
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.elapsed += time.perf_counter() - started
+            yield chunk
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _measure(provider: TimingProvider, operation: Callable[[], Any], iterations: int) -> Dict[str, float]:
+    totals, overheads = [], []
+    for _ in range(iterations):
+        provider.elapsed = 0.0
+        started = time.perf_counter()
+        operation()
+        total = time.perf_counter() - started
+        totals.append(total)
+        overheads.append(total - provider.elapsed)
+
+    return {
+        "iterations": iterations,
+        "total_ms_mean": statistics.mean(totals) * 1000,
+        "overhead_ms_mean": statistics.mean(overheads) * 1000,
+        "overhead_ms_p50": _percentile(overheads, 0.50) * 1000,
+        "overhead_ms_p99": _percentile(overheads, 0.99) * 1000,
+    }
+
+
+def run_benchmark(iterations: int = 100, rows: int = 50, latency_ms: float = 0.0,
+                  tokens_per_second: float = 0.0) -> Dict[str, Dict[str, float]]:
+    """Запускает бенчмарк и возвращает метрики по каждой операции."""
+    provider = TimingProvider(LocalProvider(latency_ms=latency_ms, tokens_per_second=tokens_per_second))
+    set_provider(provider)
+    # Квоты не ограничиваем: измеряем только накладные расходы самого планировщика
+    set_scheduler(RequestScheduler(requests_per_minute=0, tokens_per_minute=0))
+    # Словарь tiktoken загружается один раз на процесс — не включаем это в замер
+    estimate_tokens([{"content": "warm-up"}])
+
+    sample_rows = LocalProvider().complete(
+        [{"role": "user", "content": "sample"}], temperature=0.0,
+        task="generate", context={"schema": BENCHMARK_SCHEMA, "count": rows}
+    )
+    sample_rows = json.loads(sample_rows.text)["data"]
+
+    operations = {
+        "generate": lambda: services.generate_rows_for_schema(BENCHMARK_SCHEMA, "benchmark instruction", rows),
+        "generate_stream": lambda: list(services.stream_rows_for_schema(BENCHMARK_SCHEMA, "benchmark instruction", rows)),
+        "clean": lambda: services.clean_rows_with_ai(BENCHMARK_SCHEMA, sample_rows, "normalize whitespace"),
+        "suggest": lambda: services.get_schema_suggestion_from_ai(BENCHMARK_SCHEMA, sample_rows[:20]),
+    }
+
+    results = {}
+    # Сервисы пишут в stdout на каждый запрос; печать остаётся частью замера, но не засоряет вывод
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name, operation in operations.items():
+            results[name] = _measure(provider, operation, iterations)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AI pipeline overhead with a local LLM provider.")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.iterations, args.rows, args.latency_ms, args.tokens_per_second)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'operation':<16}{'total ms':>12}{'overhead ms':>14}{'p50':>10}{'p99':>10}")
+    for name, metrics in results.items():
+        print(f"{name:<16}{metrics['total_ms_mean']:>12.3f}{metrics['overhead_ms_mean']:>14.3f}"
+              f"{metrics['overhead_ms_p50']:>10.3f}{metrics['overhead_ms_p99']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
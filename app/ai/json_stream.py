@@ -0,0 +1,99 @@
+# app/ai/json_stream.py
+import json
+import re
+from typing import List, Dict, Any
+
+
+class RowStreamParser:
+    """
+    Инкрементальный парсер ответа вида {"data": [{...}, {...}]}.
+
+    Модель отдаёт ответ кусочками (токенами). Парсер принимает эти кусочки
+    через feed() и возвращает строки-объекты, как только очередной объект
+    массива полностью получен. Разбор линейный: каждый символ просматривается
+    один раз, а в памяти хранится только текущий незавершённый объект.
+    """
+
+    def __init__(self, key: str = "data"):
+        self._array_start = re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[')
+        self._prefix = ""          # Текст до начала массива
+        self._in_array = False
+        self._done = False
+        self._pending = []         # Части текущего незавершённого объекта
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self) -> bool:
+        """True, если закрывающая скобка массива уже получена."""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Принимает очередной кусок текста и возвращает завершённые объекты."""
+        if self._done or not chunk:
+            return []
+
+        if not self._in_array:
+            # Ищем начало массива: '"data": ['
+            self._prefix += chunk
+            match = self._array_start.search(self._prefix)
+            if not match:
+                return []
+            self._in_array = True
+            chunk = self._prefix[match.end():]
+            self._prefix = ""
+
+        return self._scan(chunk)
+
+    def _scan(self, text: str) -> List[Dict[str, Any]]:
+        rows = []
+        start = 0 if self._depth > 0 else None
+
+        for i, ch in enumerate(text):
+            if self._depth == 0:
+                # Между элементами массива: пропускаем пробелы и запятые
+                if ch == "{":
+                    self._depth = 1
+                    start = i
+                elif ch == "]":
+                    self._done = True
+                    break
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._pending.append(text[start:i + 1])
+                    row = self._decode("".join(self._pending))
+                    self._pending = []
+                    start = None
+                    if row is not None:
+                        rows.append(row)
+
+        # Сохраняем хвост незавершённого объекта до следующего куска
+        if self._depth > 0 and start is not None:
+            self._pending.append(text[start:])
+
+        return rows
+
+    @staticmethod
+    def _decode(text: str):
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        return value if isinstance(value, dict) else None
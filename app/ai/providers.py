@@ -0,0 +1,264 @@
+# app/ai/providers.py
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Iterator, Optional
+
+from ..config import GROQ_API_KEY, GROQ_MODEL_NAME
+
+# Какой провайдер использовать: "groq" (по умолчанию) или "local" (детерминированная заглушка)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq")
+# Параметры локального провайдера: задержка до первого токена и скорость выдачи токенов
+LOCAL_LLM_LATENCY_MS = float(os.getenv("LOCAL_LLM_LATENCY_MS", "0"))
+LOCAL_LLM_TOKENS_PER_SEC = float(os.getenv("LOCAL_LLM_TOKENS_PER_SEC", "0"))
+LOCAL_LLM_SEED = int(os.getenv("LOCAL_LLM_SEED", "0"))
+
+
+class LLMResult:
+    """Ответ модели: текст и расход токенов."""
+
+    def __init__(self, text: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class LLMProvider(ABC):
+    """
+    Базовый интерфейс LLM-провайдера.
+
+    Сервисы передают сообщения чата и, дополнительно, описание задачи (task/context).
+    Настоящие провайдеры используют только сообщения, а локальный провайдер строит
+    ответ по описанию задачи, не разбирая текст промпта.
+    """
+    name = "base"
+
+    @abstractmethod
+    def complete(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        json_mode: bool = True,
+        task: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> LLMResult:
+        """Полный ответ модели."""
+
+    @abstractmethod
+    def stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        task: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Iterator[str]:
+        """Ответ модели по частям (дельты текста)."""
+
+
+class GroqProvider(LLMProvider):
+    """Провайдер на основе Groq API. Клиент создаётся при первом запросе."""
+    name = "groq"
+
+    def __init__(self, api_key: Optional[str] = GROQ_API_KEY, model: str = GROQ_MODEL_NAME):
+        self.api_key = api_key
+        self.model = model
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from groq import Groq
+                    self._client = Groq(api_key=self.api_key)
+        return self._client
+
+    def complete(self, messages, temperature, json_mode=True, task=None, context=None) -> LLMResult:
+        kwargs = {}
+        if json_mode:
+            # Эта опция заставляет модель гарантированно вернуть валидный JSON!
+            kwargs["response_format"] = {"type": "json_object"}
+
+        chat_completion = self.client.chat.completions.create(
+            messages=messages,
+            model=self.model,
+            temperature=temperature,
+            **kwargs
+        )
+
+        usage = getattr(chat_completion, "usage", None)
+        return LLMResult(
+            text=chat_completion.choices[0].message.content,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        )
+
+    def stream(self, messages, temperature, task=None, context=None) -> Iterator[str]:
+        # JSON mode в Groq не совместим со стримингом, поэтому формат ответа
+        # задаётся только системным промптом.
+        stream = self.client.chat.completions.create(
+            messages=messages,
+            model=self.model,
+            temperature=temperature,
+            stream=True,
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+
+class LocalProvider(LLMProvider):
+    """
+    Детерминированная локальная замена LLM для нагрузочного тестирования и бенчмарков.
+
+    Генерирует строки, соответствующие схеме шаблона, возвращает "очищенные" строки
+    и шаблонную рекомендацию по схеме. Задержка до первого токена и скорость выдачи
+    токенов настраиваются, чтобы имитировать поведение настоящего API без сети.
+    """
+    name = "local"
+
+    # Примерное число символов на токен, используется для расчёта "расхода" токенов
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self, latency_ms: float = 0.0, tokens_per_second: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.seed = seed
+
+    def complete(self, messages, temperature, json_mode=True, task=None, context=None) -> LLMResult:
+        text = self._render(messages, task, context or {})
+        completion_tokens = self._count_tokens(text)
+
+        self._sleep(self.latency_ms / 1000)
+        if self.tokens_per_second > 0:
+            self._sleep(completion_tokens / self.tokens_per_second)
+
+        return LLMResult(
+            text=text,
+            prompt_tokens=sum(self._count_tokens(m.get("content", "")) for m in messages),
+            completion_tokens=completion_tokens,
+        )
+
+    def stream(self, messages, temperature, task=None, context=None) -> Iterator[str]:
+        text = self._render(messages, task, context or {})
+        step = self.CHARS_PER_TOKEN
+
+        self._sleep(self.latency_ms / 1000)
+        for i in range(0, len(text), step):
+            if self.tokens_per_second > 0:
+                self._sleep(1 / self.tokens_per_second)
+            yield text[i:i + step]
+
+    # --- Построение ответов ---
+
+    def _render(self, messages: List[Dict[str, str]], task: Optional[str], context: Dict[str, Any]) -> str:
+        # Один и тот же промпт всегда даёт один и тот же ответ
+        prompt = "".join(m.get("content", "") for m in messages)
+        digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=8).digest()
+        rng = random.Random(self.seed ^ int.from_bytes(digest, "big"))
+
+        if task == "generate":
+            fields = context.get("schema", {}).get("fields", [])
+            rows = [self._fake_row(fields, i, rng) for i in range(context.get("count", 1))]
+            return json.dumps({"data": rows}, ensure_ascii=False)
+
+        if task == "clean":
+            rows = context.get("rows", [])
+            return json.dumps({"cleaned_data": [self._clean_row(row) for row in rows]}, ensure_ascii=False)
+
+        if task == "suggest":
+            schema_str = json.dumps(context.get("schema", {}), indent=2, ensure_ascii=False)
+            suggestion = (
+                "The sample matches the current schema; no structural changes are required.\n\n"
+                f"```json\n{schema_str}\n```"
+            )
+            return json.dumps({"suggestion": suggestion}, ensure_ascii=False)
+
+        return json.dumps({}, ensure_ascii=False)
+
+    @staticmethod
+    def _fake_row(fields: List[Dict[str, Any]], index: int, rng: random.Random) -> Dict[str, Any]:
+        row = {}
+        for field in fields:
+            name = field.get("field_name", "")
+            field_type = str(field.get("type", "string")).lower()
+            if field_type in ("integer", "int"):
+                value = rng.randint(0, 10_000)
+            elif field_type in ("number", "float", "decimal"):
+                value = round(rng.uniform(0, 10_000), 2)
+            elif field_type in ("boolean", "bool"):
+                value = rng.random() < 0.5
+            elif field_type == "email":
+                value = f"user{index}.{rng.randint(0, 99_999)}@example.com"
+            elif field_type == "date":
+                value = (date(2020, 1, 1) + timedelta(days=rng.randint(0, 2000))).isoformat()
+            elif field_type == "datetime":
+                value = (datetime(2020, 1, 1) + timedelta(seconds=rng.randint(0, 10 ** 8))).isoformat()
+            else:
+                value = f"{name}_{index}_{rng.randint(0, 99_999)}"
+            row[name] = value
+        return row
+
+    @staticmethod
+    def _clean_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            key: " ".join(value.split()) if isinstance(value, str) else value
+            for key, value in row.items()
+        }
+
+    def _count_tokens(self, text: str) -> int:
+        return max(1, len(text) // self.CHARS_PER_TOKEN)
+
+    @staticmethod
+    def _sleep(seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+# --- Выбор провайдера ---
+
+_provider: Optional[LLMProvider] = None
+_provider_lock = threading.Lock()
+
+
+def create_provider(name: str) -> LLMProvider:
+    """Создаёт провайдер по имени ("groq" или "local")."""
+    if name == "groq":
+        return GroqProvider()
+    if name == "local":
+        return LocalProvider(
+            latency_ms=LOCAL_LLM_LATENCY_MS,
+            tokens_per_second=LOCAL_LLM_TOKENS_PER_SEC,
+            seed=LOCAL_LLM_SEED,
+        )
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+
+def get_provider() -> LLMProvider:
+    """Возвращает текущий провайдер (по умолчанию выбирается переменной LLM_PROVIDER)."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_provider(LLM_PROVIDER)
+    return _provider
+
+
+def set_provider(provider: LLMProvider):
+    """Подменяет провайдер (используется в бенчмарках и нагрузочных тестах)."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -0,0 +1,403 @@
+# app/ai/scheduler.py
+"""
+Планировщик запросов к LLM с учётом квот провайдера.
+
+Все обращения к модели проходят через общий RequestScheduler:
+- две "корзины токенов" ограничивают число запросов и токенов в минуту;
+- ожидающие запросы обслуживаются в порядке приоритета (затем в порядке поступления);
+- при ответе 429 планировщик приостанавливает выдачу на время из retry-after,
+  временно снижает скорость (AIMD) и повторяет запрос через tenacity;
+- metrics() возвращает глубину очереди и счётчики для мониторинга.
+"""
+import os
+import time
+import heapq
+import random
+import itertools
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from tenacity import Retrying, retry_if_exception, stop_after_attempt
+
+from .. import metrics
+
+# Квоты провайдера (0 — без ограничения)
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+GROQ_TOKENS_PER_MINUTE = float(os.getenv("GROQ_TOKENS_PER_MINUTE", "6000"))
+# Сколько раз повторять запрос после 429 и сколько максимум ждать в очереди
+GROQ_MAX_ATTEMPTS = int(os.getenv("GROQ_MAX_ATTEMPTS", "4"))
+GROQ_MAX_QUEUE_WAIT_S = float(os.getenv("GROQ_MAX_QUEUE_WAIT_S", "60"))
+
+# Приоритеты: меньше — важнее
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+
+class AIRateLimitError(Exception):
+    """Квота исчерпана: запрос не удалось выполнить за отведённое время или число попыток."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Классическая корзина токенов: ёмкость capacity, пополнение rate в секунду."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def refill(self, now: float, factor: float = 1.0):
+        if self.unlimited:
+            return
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate * factor)
+        self.updated = now
+
+    def time_until(self, amount: float, factor: float = 1.0) -> float:
+        """Через сколько секунд в корзине будет amount токенов (после refill)."""
+        if self.unlimited:
+            return 0.0
+        amount = min(amount, self.capacity)
+        missing = amount - self.tokens
+        return 0.0 if missing <= 0 else missing / (self.rate * factor)
+
+    def consume(self, amount: float):
+        """Списывает токены. Баланс может уйти в минус — это "долг" после уточнения расхода."""
+        if not self.unlimited:
+            self.tokens = min(self.capacity, self.tokens - min(amount, self.capacity))
+
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def estimate_tokens(messages: List[Dict[str, str]], completion_tokens: int = 0) -> int:
+    """
+    Оценивает число токенов запроса через tiktoken (cl100k_base).
+    Если словарь недоступен (нет сети при первом запуске), считаем ~4 символа на токен.
+    """
+    global _encoding
+    text = "".join(m.get("content", "") for m in messages)
+
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    print(f"⚠️ tiktoken недоступен, используется грубая оценка токенов: {e}")
+                    _encoding = False
+
+    prompt_tokens = len(_encoding.encode(text)) if _encoding else len(text) // 4
+    return prompt_tokens + completion_tokens
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """True для ответа 429 от провайдера (groq.RateLimitError и аналоги)."""
+    return getattr(error, "status_code", None) == 429
+
+
+def _retry_after_from(error: BaseException) -> Optional[float]:
+    """Достаёт задержку из заголовков retry-after / x-ratelimit-reset-* ответа с ошибкой."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+    # Groq дополнительно присылает значения вида "7.66s" или "2m59.56s"
+    resets = [
+        _parse_duration(headers.get(name))
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+    ]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    total, number = 0.0, ""
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0}
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch.isdigit() or ch == ".":
+            number += ch
+        elif value.startswith("ms", i):
+            total += float(number or 0) / 1000
+            number = ""
+            i += 1
+        elif ch in units:
+            total += float(number or 0) * units[ch]
+            number = ""
+        else:
+            return None
+        i += 1
+    return total if not number else total + float(number)
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "tokens", "cancelled")
+
+    def __init__(self, priority: int, seq: int, tokens: int):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.cancelled = False
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class RequestScheduler:
+    """Общий планировщик запросов к LLM (см. описание модуля)."""
+
+    # Параметры адаптивного снижения скорости после 429 (AIMD)
+    BACKOFF_DECREASE = 0.5
+    BACKOFF_RECOVERY = 0.05
+    BACKOFF_MIN = 0.1
+
+    def __init__(
+        self,
+        requests_per_minute: float = GROQ_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = GROQ_TOKENS_PER_MINUTE,
+        max_attempts: int = GROQ_MAX_ATTEMPTS,
+        max_queue_wait: float = GROQ_MAX_QUEUE_WAIT_S,
+    ):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self.max_attempts = max_attempts
+        self.max_queue_wait = max_queue_wait
+
+        self._cond = threading.Condition()
+        self._queue: List[_Ticket] = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._rate_factor = 1.0
+
+        self._in_flight = 0
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rate_limited": 0, "retries": 0, "rejected": 0}
+
+    # --- Публичный интерфейс ---
+
+    def submit(
+        self,
+        call: Callable[[], Any],
+        estimated_tokens: int,
+        priority: int = PRIORITY_NORMAL,
+        actual_tokens: Optional[Callable[[Any], Optional[int]]] = None,
+    ) -> Any:
+        """
+        Выполняет call(), когда позволяют квоты, и повторяет его после 429.
+
+        :param estimated_tokens: оценка токенов запроса (промпт + ожидаемый ответ).
+        :param actual_tokens: функция, достающая фактический расход из результата,
+                              чтобы поправить баланс корзины токенов.
+        """
+        with self._cond:
+            self._stats["submitted"] += 1
+
+        retrying = Retrying(
+            retry=retry_if_exception(is_rate_limit_error),
+            stop=stop_after_attempt(self.max_attempts),
+            wait=self._register_backoff,
+            reraise=True,
+        )
+
+        try:
+            for attempt in retrying:
+                with attempt:
+                    if attempt.retry_state.attempt_number > 1:
+                        with self._cond:
+                            self._stats["retries"] += 1
+                        # Повторные попытки не должны пропускать вперёд новые запросы
+                        priority = PRIORITY_HIGH
+                    result = self._run(call, estimated_tokens, priority)
+        except AIRateLimitError:
+            raise
+        except Exception as e:
+            if is_rate_limit_error(e):
+                retry_after = _retry_after_from(e) or self._fallback_delay(self.max_attempts)
+                with self._cond:
+                    self._stats["failed"] += 1
+                raise AIRateLimitError("LLM provider rate limit exceeded", retry_after) from e
+            with self._cond:
+                self._stats["failed"] += 1
+            raise
+
+        if actual_tokens is not None:
+            used = actual_tokens(result)
+            if used:
+                with self._cond:
+                    # Уточняем расход: разница с оценкой докладывается (или возвращается) в корзину
+                    self.tokens.consume(used - min(estimated_tokens, self.tokens.capacity))
+
+        with self._cond:
+            self._stats["completed"] += 1
+            self._rate_factor = min(1.0, self._rate_factor + self.BACKOFF_RECOVERY)
+        return result
+
+    def metrics(self) -> Dict[str, Any]:
+        """Снимок состояния очереди и счётчиков."""
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now, self._rate_factor)
+            self.tokens.refill(now, self._rate_factor)
+            by_priority: Dict[str, int] = {}
+            for ticket in self._queue:
+                if not ticket.cancelled:
+                    key = str(ticket.priority)
+                    by_priority[key] = by_priority.get(key, 0) + 1
+            return {
+                "queue_depth": sum(by_priority.values()),
+                "queue_depth_by_priority": by_priority,
+                "in_flight": self._in_flight,
+                "paused_for_s": max(0.0, self._paused_until - now),
+                "rate_factor": self._rate_factor,
+                "requests_available": None if self.requests.unlimited else self.requests.tokens,
+                "tokens_available": None if self.tokens.unlimited else self.tokens.tokens,
+                **self._stats,
+            }
+
+    # --- Внутренняя логика ---
+
+    def _run(self, call: Callable[[], Any], estimated_tokens: int, priority: int) -> Any:
+        self._acquire(estimated_tokens, priority)
+        try:
+            return call()
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _acquire(self, estimated_tokens: int, priority: int):
+        ticket = _Ticket(priority, next(self._seq), estimated_tokens)
+        deadline = time.monotonic() + self.max_queue_wait
+
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._drop_cancelled()
+                    wait = self._admission_delay(ticket, now)
+                    if wait <= 0:
+                        heapq.heappop(self._queue)
+                        self.requests.consume(1)
+                        self.tokens.consume(ticket.tokens)
+                        self._in_flight += 1
+                        self._cond.notify_all()
+                        return
+
+                    if now + wait > deadline:
+                        ticket.cancelled = True
+                        self._stats["rejected"] += 1
+                        self._cond.notify_all()
+                        raise AIRateLimitError("LLM request queue is saturated", retry_after=wait)
+
+                    self._cond.wait(timeout=wait)
+            except BaseException:
+                ticket.cancelled = True
+                raise
+
+    def _admission_delay(self, ticket: _Ticket, now: float) -> float:
+        """Сколько ещё ждать тикету; 0 — можно выполнять прямо сейчас."""
+        if self._queue[0] is not ticket:
+            # Ждём своей очереди; нас разбудит notify_all, но перепроверяем и по таймауту
+            return max(0.05, self._head_delay(now))
+        return self._head_delay(now)
+
+    def _head_delay(self, now: float) -> float:
+        self.requests.refill(now, self._rate_factor)
+        self.tokens.refill(now, self._rate_factor)
+        head = self._queue[0]
+        return max(
+            self._paused_until - now,
+            self.requests.time_until(1, self._rate_factor),
+            self.tokens.time_until(head.tokens, self._rate_factor),
+            0.0,
+        )
+
+    def _drop_cancelled(self):
+        while self._queue and self._queue[0].cancelled:
+            heapq.heappop(self._queue)
+
+    def _register_backoff(self, retry_state) -> float:
+        """
+        Стратегия ожидания для tenacity: после 429 приостанавливаем всю очередь
+        (квота общая для всех запросов) и снижаем скорость выдачи. Сама пауза
+        выдерживается в _acquire, поэтому tenacity ждать не нужно.
+        """
+        error = retry_state.outcome.exception()
+        delay = _retry_after_from(error)
+        if delay is None:
+            delay = self._fallback_delay(retry_state.attempt_number)
+
+        with self._cond:
+            self._stats["rate_limited"] += 1
+            self._rate_factor = max(self.BACKOFF_MIN, self._rate_factor * self.BACKOFF_DECREASE)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._cond.notify_all()
+        print(f"⚠️ LLM API вернул 429, пауза {delay:.2f} c (попытка {retry_state.attempt_number})")
+        return 0.0
+
+    @staticmethod
+    def _fallback_delay(attempt_number: int) -> float:
+        # Экспоненциальная задержка с джиттером, если провайдер не прислал retry-after
+        return min(60.0, 2 ** attempt_number) * (0.5 + random.random() / 2)
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """Возвращает общий планировщик процесса."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler()
+    return _scheduler
+
+
+def set_scheduler(scheduler: RequestScheduler):
+    """Подменяет планировщик (например, на безлимитный в бенчмарках)."""
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
+
+
+def _collect_metrics():
+    # Планировщик создаётся при первом запросе к LLM — до этого отдавать нечего
+    if _scheduler is None:
+        return []
+    state = _scheduler.metrics()
+    collected = [
+        (f"ai_scheduler_{key}_total", "counter", f"LLM scheduler requests: {key}", [({}, state[key])])
+        for key in ("submitted", "completed", "failed", "rate_limited", "retries", "rejected")
+    ]
+    collected += [
+        ("ai_scheduler_queue_depth", "gauge", "LLM requests waiting for quota", [({}, state["queue_depth"])]),
+        ("ai_scheduler_in_flight", "gauge", "LLM requests being executed", [({}, state["in_flight"])]),
+        ("ai_scheduler_rate_factor", "gauge", "Quota slowdown factor after 429 responses", [({}, state["rate_factor"])]),
+    ]
+    return collected
+
+
+metrics.registry.register_collector("ai_scheduler", _collect_metrics)
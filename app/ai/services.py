@@ -1,13 +1,47 @@
 # app/ai/services.py
 import json
-from typing import List, Dict, Any
-from groq import Groq
-from ..config import GROQ_API_KEY, GROQ_MODEL_NAME
+import time
+from typing import List, Dict, Any, Iterator
+from .. import metrics
+from .json_stream import RowStreamParser
+from .providers import get_provider, LLMResult
+from .scheduler import (
+    get_scheduler, estimate_tokens, AIRateLimitError, PRIORITY_HIGH, PRIORITY_NORMAL
+)
 
-# 1. Создаем клиент Groq.
-# Он будет автоматически использовать ключ, если вы установите его как переменную окружения,
-# или можно передать его напрямую: client = Groq(api_key="ВАШ_КЛЮЧ")
-client = Groq(api_key=GROQ_API_KEY)
+# 1. Все запросы к модели идут через LLM-провайдер (см. providers.py).
+# Провайдер выбирается переменной окружения LLM_PROVIDER: "groq" или "local".
+# Перед провайдером стоит общий планировщик (см. scheduler.py), который следит за квотами.
+
+# Грубая оценка размера одного поля в ответе модели (в токенах) для планировщика
+TOKENS_PER_FIELD = 8
+
+
+def _complete(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    task: str,
+    context: Dict[str, Any],
+    expected_completion_tokens: int,
+    priority: int = PRIORITY_NORMAL
+) -> LLMResult:
+    """Выполняет запрос к модели через общий планировщик."""
+    provider = get_provider()
+
+    def call() -> LLMResult:
+        with metrics.ai_request_duration_seconds.time(task=task, stage="provider"):
+            return provider.complete(messages, temperature, task=task, context=context)
+
+    with metrics.ai_request_duration_seconds.time(task=task, stage="total"):
+        result = get_scheduler().submit(
+            call,
+            estimated_tokens=estimate_tokens(messages, expected_completion_tokens),
+            priority=priority,
+            actual_tokens=lambda result: result.total_tokens,
+        )
+    metrics.ai_tokens_total.inc(result.prompt_tokens, task=task, kind="prompt")
+    metrics.ai_tokens_total.inc(result.completion_tokens, task=task, kind="completion")
+    return result
 
 # 2. Определяем системный промпт.
 # Это инструкция для модели, которая не меняется. Она задает "личность" и формат ответа.
@@ -19,40 +53,42 @@ Do not include any other text, explanations, or markdown formatting in your resp
 """
 
 
-def generate_rows_for_schema(schema: Dict, instruction: str, count: int) -> List[Dict[str, Any]]:
-    """
-    Генерирует строки данных для датасета с помощью Groq API.
-    """
-    # 3. Формируем пользовательский промпт с переменными данными
+def _build_generation_prompt(schema: Dict, instruction: str, count: int) -> str:
+    """Формирует пользовательский промпт для генерации строк."""
     schema_str = json.dumps(schema, indent=2, ensure_ascii=False)
-    user_prompt = f"""
+    return f"""
     Based on the provided data schema, generate {count} new data rows.
     Follow the user's instruction: "{instruction}".
     The data schema is as follows:
     {schema_str}
     """
 
-    print("--- Отправка запроса в Groq API ---")
+
+def generate_rows_for_schema(schema: Dict, instruction: str, count: int) -> List[Dict[str, Any]]:
+    """
+    Генерирует строки данных для датасета с помощью LLM-провайдера.
+    """
+    # 3. Формируем пользовательский промпт с переменными данными
+    user_prompt = _build_generation_prompt(schema, instruction, count)
+
+    print("--- Отправка запроса в LLM API ---")
     try:
-        # 4. Вызываем API Groq
-        chat_completion = client.chat.completions.create(
+        # 4. Вызываем модель через провайдер (с учётом квот)
+        result = _complete(
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            # Мы используем быструю и умную модель Llama 3
-            model=GROQ_MODEL_NAME,
-
-            # Эта опция заставляет модель гарантированно вернуть валидный JSON!
-            response_format={"type": "json_object"},
-
             # Температура влияет на "креативность" ответа
             temperature=0.7,
+            task="generate",
+            context={"schema": schema, "count": count},
+            expected_completion_tokens=count * max(1, len(schema.get("fields", []))) * TOKENS_PER_FIELD,
         )
 
         # 5. Получаем и парсим ответ
-        response_str = chat_completion.choices[0].message.content
-        print("--- Ответ от Groq API получен ---")
+        response_str = result.text
+        print("--- Ответ от LLM API получен ---")
 
         # Преобразуем строковый JSON в Python-объект
         data = json.loads(response_str)
@@ -60,12 +96,73 @@ def generate_rows_for_schema(schema: Dict, instruction: str, count: int) -> List
         # Возвращаем список из ключа "data", как мы просили в системном промпте
         return data.get("data", [])
 
+    except AIRateLimitError:
+        # Исчерпанную квоту отдаём наверх, чтобы API ответило 429, а не 500
+        raise
     except Exception as e:
-        print(f"❌ ОШИБКА при работе с Groq API: {e}")
+        print(f"❌ ОШИБКА при работе с LLM API: {e}")
         import traceback
         traceback.print_exc()
         return []
 
+def stream_rows_for_schema(schema: Dict, instruction: str, count: int) -> Iterator[Dict[str, Any]]:
+    """
+    Генерирует строки данных в потоковом режиме.
+
+    Ответ модели запрашивается стримом и разбирается по мере поступления токенов:
+    каждая строка отдаётся вызывающему коду, как только её JSON-объект получен целиком.
+    """
+    user_prompt = _build_generation_prompt(schema, instruction, count)
+
+    print("--- Отправка потокового запроса в LLM API ---")
+    started = time.perf_counter()
+    try:
+        # Формат ответа в стриме задаётся только системным промптом,
+        # а парсер пропускает всё, что не относится к массиву "data".
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        provider = get_provider()
+
+        def start_stream():
+            # Ошибка 429 приходит при открытии стрима, поэтому через планировщик
+            # проходит открытие стрима и получение первого куска
+            with metrics.ai_request_duration_seconds.time(task="generate_stream", stage="first_chunk"):
+                stream = provider.stream(messages, 0.7, task="generate", context={"schema": schema, "count": count})
+                return next(stream, ""), stream
+
+        first, stream = get_scheduler().submit(
+            start_stream,
+            estimated_tokens=estimate_tokens(
+                messages, count * max(1, len(schema.get("fields", []))) * TOKENS_PER_FIELD
+            ),
+        )
+
+        parser = RowStreamParser(key="data")
+        for row in parser.feed(first):
+            yield row
+        for delta in stream:
+            if parser.done:
+                break
+            for row in parser.feed(delta):
+                yield row
+
+        print("--- Потоковый ответ от LLM API получен ---")
+
+    except AIRateLimitError:
+        # Исчерпанную квоту отдаём наверх, чтобы API ответило 429, а не 500
+        raise
+    except Exception as e:
+        print(f"❌ ОШИБКА при работе с LLM API: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        # Вызывающий код может перестать читать стрим раньше — время считается и тогда
+        metrics.ai_request_duration_seconds.observe(
+            time.perf_counter() - started, task="generate_stream", stage="total"
+        )
+
 cleaning_system_prompt = """
 You are an expert assistant that cleans and normalizes data in JSON format.
 The user will provide you with a list of "dirty" JSON objects and an instruction for how to clean them.
@@ -80,7 +177,7 @@ def clean_rows_with_ai(
     instruction: str
 ) -> List[Dict[str, Any]]:
     """
-    Очищает строки данных с помощью Groq API.
+    Очищает строки данных с помощью LLM-провайдера.
     """
     # Превращаем данные в строки для промпта
     schema_str = json.dumps(schema, indent=2, ensure_ascii=False)
@@ -95,26 +192,32 @@ def clean_rows_with_ai(
     {dirty_rows_str}
     """
 
-    print("--- Отправка запроса на очистку в Groq API ---")
+    print("--- Отправка запроса на очистку в LLM API ---")
     try:
-        chat_completion = client.chat.completions.create(
+        result = _complete(
             messages=[
                 {"role": "system", "content": cleaning_system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            model=GROQ_MODEL_NAME,
-            response_format={"type": "json_object"},
             temperature=0.1, # Используем низкую температуру для предсказуемости
+            task="clean",
+            context={"schema": schema, "rows": dirty_rows},
+            # Очищенные строки примерно того же размера, что и исходные
+            expected_completion_tokens=estimate_tokens([{"content": dirty_rows_str}]),
+            priority=PRIORITY_HIGH,
         )
 
-        response_str = chat_completion.choices[0].message.content
-        print("--- Ответ от Groq API получен ---")
+        response_str = result.text
+        print("--- Ответ от LLM API получен ---")
 
         data = json.loads(response_str)
         return data.get("cleaned_data", [])
 
+    except AIRateLimitError:
+        # Исчерпанную квоту отдаём наверх, чтобы API ответило 429, а не 500
+        raise
     except Exception as e:
-        print(f"❌ ОШИБКА при работе с Groq API: {e}")
+        print(f"❌ ОШИБКА при работе с LLM API: {e}")
         return []
 
 suggestion_system_prompt = """
@@ -128,7 +231,7 @@ def get_schema_suggestion_from_ai(
     data_sample: List[Dict]
 ) -> Dict[str, Any]:
     """
-    Анализирует данные и предлагает улучшения для схемы с помощью Groq API.
+    Анализирует данные и предлагает улучшения для схемы с помощью LLM-провайдера.
     """
     schema_str = json.dumps(current_schema, indent=2, ensure_ascii=False)
     sample_str = json.dumps(data_sample, indent=2, ensure_ascii=False)
@@ -143,24 +246,29 @@ def get_schema_suggestion_from_ai(
     Please analyze this data and provide suggestions for improving the schema. Explain your reasoning.
     """
 
-    print("--- Отправка запроса на анализ схемы в Groq API ---")
+    print("--- Отправка запроса на анализ схемы в LLM API ---")
     try:
-        chat_completion = client.chat.completions.create(
+        result = _complete(
             messages=[
                 {"role": "system", "content": suggestion_system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            model=GROQ_MODEL_NAME,
-            response_format={"type": "json_object"},
             temperature=0.2,
+            task="suggest",
+            context={"schema": current_schema, "sample": data_sample},
+            expected_completion_tokens=512,
+            priority=PRIORITY_HIGH,
         )
 
-        response_str = chat_completion.choices[0].message.content
-        print("--- Ответ от Groq API получен ---")
+        response_str = result.text
+        print("--- Ответ от LLM API получен ---")
 
         # Возвращаем весь JSON-объект, который должен содержать ключ "suggestion"
         return json.loads(response_str)
 
+    except AIRateLimitError:
+        # Исчерпанную квоту отдаём наверх, чтобы API ответило 429, а не 500
+        raise
     except Exception as e:
-        print(f"❌ ОШИБКА при работе с Groq API: {e}")
+        print(f"❌ ОШИБКА при работе с LLM API: {e}")
         return {"suggestion": "Failed to get a suggestion from the AI."}
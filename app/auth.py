@@ -61,4 +61,12 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     user = crud.get_user_by_email(db, email=email)
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return user
+
+def get_current_admin(current_user: models.User = Depends(get_current_user)):
+    """
+    Пропускает только пользователей с ролью admin.
+    """
+    if current_user.role != models.UserRole.admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
@@ -0,0 +1,87 @@
+# app/benchmarks/data.py
+"""
+Синтетические данные для бенчмарков: шаблон и строки заданного размера.
+
+Строки генерируются потоком из детерминированного генератора (один seed — одни
+и те же данные), поэтому файлы на 10 млн строк пишутся без загрузки в память, а
+результаты прогонов на одном seed сравнимы между собой.
+
+Модуль не импортирует приложение: бенчмарк сначала настраивает окружение
+(DATABASE_URL и т.п.), а уже потом загружает app.main.
+"""
+import os
+import csv
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator
+
+# Ограничение формата XLSX: 1 048 576 строк на лист, одна из них — заголовок
+XLSX_MAX_ROWS = 1_048_575
+
+_FIRST_NAMES = ["Алия", "Ержан", "Мария", "Иван", "Айгерим", "Данияр", "Ольга", "Тимур", "Сауле", "Павел"]
+_LAST_NAMES = ["Ахметов", "Иванова", "Сейткали", "Петров", "Омарова", "Ким", "Смирнова", "Нурланов"]
+_CITIES = ["Алматы", "Астана", "Шымкент", "Караганда", "Актобе", "Павлодар"]
+_EPOCH = date(2015, 1, 1)
+
+BENCHMARK_SCHEMA = {
+    "fields": [
+        {"field_name": "full_name", "display_name": "ФИО", "type": "string"},
+        {"field_name": "email", "display_name": "Email", "type": "email"},
+        {"field_name": "age", "display_name": "Возраст", "type": "integer"},
+        {"field_name": "balance", "display_name": "Баланс", "type": "number"},
+        {"field_name": "is_active", "display_name": "Активен", "type": "boolean"},
+        {"field_name": "signed_up", "display_name": "Дата регистрации", "type": "date"},
+        {"field_name": "city", "display_name": "Город", "type": "string"},
+    ]
+}
+
+
+def template_payload(name: str = "benchmark") -> Dict[str, Any]:
+    """Тело запроса POST /api/templates для шаблона бенчмарка."""
+    return {"name": name, "description": "Synthetic benchmark template", "schema": BENCHMARK_SCHEMA}
+
+
+def field_names():
+    return [field["field_name"] for field in BENCHMARK_SCHEMA["fields"]]
+
+
+def display_names():
+    return [field["display_name"] for field in BENCHMARK_SCHEMA["fields"]]
+
+
+def make_rows(count: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Генерирует count строк по схеме бенчмарка."""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            "full_name": f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}",
+            "email": f"user{seed}_{i}@example.com",
+            "age": rng.randint(18, 90),
+            # Логнормальное распределение похоже на реальные суммы на счетах
+            "balance": round(rng.lognormvariate(8, 1.2), 2),
+            "is_active": rng.random() < 0.7,
+            "signed_up": (_EPOCH + timedelta(days=rng.randrange(3650))).isoformat(),
+            "city": rng.choice(_CITIES),
+        }
+
+
+def write_csv(path: str, count: int, seed: int = 0) -> int:
+    """Пишет CSV для импорта (заголовок — имена полей) и возвращает его размер в байтах."""
+    names = field_names()
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        for row in make_rows(count, seed):
+            writer.writerow([row[name] for name in names])
+    return os.path.getsize(path)
+
+
+def write_xlsx(path: str, count: int, seed: int = 0) -> int:
+    """Пишет XLSX для импорта (заголовок — отображаемые имена полей). Возвращает число строк."""
+    import pandas as pd
+
+    count = min(count, XLSX_MAX_ROWS)
+    frame = pd.DataFrame.from_records(list(make_rows(count, seed)), columns=field_names())
+    frame.columns = display_names()
+    frame.to_excel(path, index=False, sheet_name="Dataset")
+    return count
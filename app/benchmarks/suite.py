@@ -0,0 +1,550 @@
+# app/benchmarks/suite.py
+"""
+Воспроизводимый бенчмарк горячих путей платформы.
+
+Генерирует синтетический шаблон и датасет заданного размера (--rows, от 10 тыс.
+до 10 млн строк) и прогоняет сценарии через HTTP API: импорт CSV/XLSX, экспорт
+во всех форматах, постраничное чтение, логин и накладные расходы проверки
+токена, анализ Veritas (файл и сохранённый датасет) с локальной моделью.
+
+Приложение запускается в том же процессе (--transport inprocess, TestClient)
+или отдельным процессом uvicorn (--transport uvicorn), либо бенчмарк
+обращается к уже запущенному серверу (--base-url). По каждому сценарию
+считаются p50/p99, пропускная способность и пиковый RSS процесса приложения.
+Результат пишется в JSON и может сравниваться с сохранённым базовым прогоном.
+
+Примеры запуска:
+    python -m app.benchmarks.suite --rows 100000 --output baseline.json
+    python -m app.benchmarks.suite --rows 100000 --transport uvicorn --baseline baseline.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import platform
+import tempfile
+import contextlib
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from . import data
+
+# Каталог проекта (в нём лежит пакет app) — рабочий каталог для uvicorn
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CSV_TYPE = "text/csv"
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Метрики, по которым прогон сравнивается с базовым: имя -> больше ли значит лучше
+COMPARED_METRICS = {"p50_ms": False, "p99_ms": False, "throughput": True}
+
+
+# --- Память процесса приложения ---
+
+def _status_kb(pid: int, key: str) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(key + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss(pid: Optional[int]):
+    """Сбрасывает пиковый RSS процесса (Linux), чтобы мерить пик каждого сценария отдельно."""
+    if pid is None:
+        return
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb(pid: Optional[int]) -> Optional[float]:
+    """Пиковый RSS процесса в МБ (None, если процесс чужой или ОС не сообщает)."""
+    if pid is None:
+        return None
+    kb = _status_kb(pid, "VmHWM")
+    if kb is None and pid == os.getpid():
+        try:
+            import resource
+        except ImportError:
+            return None
+        # Пик за всё время жизни процесса; в Linux — в КБ, в macOS — в байтах
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            kb //= 1024
+    return round(kb / 1024, 1) if kb else None
+
+
+# --- Замеры ---
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class Measurement:
+    """Замеры одного сценария: длительности итераций и объём обработанного (строки, байты, запросы)."""
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+        self.durations: List[float] = []
+        self.amount = 0.0
+        self.errors = 0
+        self.extra: Dict[str, Any] = {}
+        self.skipped: Optional[str] = None
+        self.peak_rss_mb: Optional[float] = None
+
+    def add(self, seconds: float, amount: float = 1.0):
+        self.durations.append(seconds)
+        self.amount += amount
+
+    def summary(self) -> Dict[str, Any]:
+        if self.skipped is not None:
+            return {"skipped": self.skipped}
+        if not self.durations:
+            return {"skipped": "no successful iterations", "errors": self.errors}
+        total = sum(self.durations)
+        return {
+            "unit": self.unit,
+            "iterations": len(self.durations),
+            "errors": self.errors,
+            "mean_ms": round(statistics.mean(self.durations) * 1000, 3),
+            "p50_ms": round(_percentile(self.durations, 0.50) * 1000, 3),
+            "p99_ms": round(_percentile(self.durations, 0.99) * 1000, 3),
+            "throughput": round(self.amount / total, 3) if total > 0 else None,
+            "peak_rss_mb": self.peak_rss_mb,
+            **self.extra,
+        }
+
+
+def _timed(call: Callable[[], httpx.Response]):
+    started = time.perf_counter()
+    response = call()
+    return response, time.perf_counter() - started
+
+
+class BenchContext:
+    """Общее состояние прогона: клиент, токен, параметры и созданный датасет."""
+
+    def __init__(self, client: httpx.Client, server_pid: Optional[int], args: argparse.Namespace, workdir: str):
+        self.client = client
+        self.server_pid = server_pid
+        self.rows = args.rows
+        self.iterations = args.iterations
+        self.page_size = args.page_size
+        self.xlsx_rows = min(args.xlsx_rows, args.rows, data.XLSX_MAX_ROWS)
+        self.veritas_rows = min(args.veritas_rows, args.rows)
+        self.import_timeout = args.import_timeout
+        self.seed = args.seed
+        self.workdir = workdir
+        self.email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+        self.password = "benchmark-password"
+        self.headers: Dict[str, str] = {}
+        self.template_id: Optional[str] = None
+        self.dataset_id: Optional[str] = None
+
+    def setup(self):
+        """Регистрирует пользователя, получает токен и создаёт шаблон бенчмарка."""
+        self.client.post("/api/auth/register", json={"email": self.email, "password": self.password, "name": "Benchmark"})
+        self.headers = {"Authorization": f"Bearer {self.login().json()['access_token']}"}
+        response = self.client.post("/api/templates", json=data.template_payload(), headers=self.headers)
+        response.raise_for_status()
+        self.template_id = response.json()["id"]
+
+    def login(self) -> httpx.Response:
+        response = self.client.post("/api/auth/login", data={"username": self.email, "password": self.password})
+        response.raise_for_status()
+        return response
+
+    def create_dataset(self, name: str) -> str:
+        response = self.client.post(
+            "/api/datasets", json={"name": name, "template_id": self.template_id}, headers=self.headers
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def upload(self, dataset_id: str, path: str, file_format: str) -> httpx.Response:
+        content_type = CSV_TYPE if file_format == "csv" else XLSX_TYPE
+        with open(path, "rb") as f:
+            return self.client.post(
+                f"/api/datasets/{dataset_id}/import/{file_format}",
+                files={"file": (os.path.basename(path), f, content_type)},
+                headers=self.headers,
+            )
+
+    def wait_rows(self, dataset_id: str, expected: int):
+        """Импорт идёт в фоне: ждём, пока в датасете появится последняя строка."""
+        deadline = time.perf_counter() + self.import_timeout
+        while True:
+            response = self.client.get(
+                f"/api/datasets/{dataset_id}/rows", params={"skip": expected - 1, "limit": 1}, headers=self.headers
+            )
+            if response.status_code == 200 and response.json():
+                return
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"import into {dataset_id} did not finish in {self.import_timeout} s")
+            time.sleep(0.05)
+
+    def dataset(self) -> str:
+        """Основной датасет для чтения и экспорта; создаётся импортом CSV без замера, если сценарий импорта не запускался."""
+        if self.dataset_id is None:
+            path = os.path.join(self.workdir, "dataset.csv")
+            data.write_csv(path, self.rows, self.seed)
+            self.dataset_id = self.create_dataset("benchmark")
+            self.upload(self.dataset_id, path, "csv").raise_for_status()
+            self.wait_rows(self.dataset_id, self.rows)
+        return self.dataset_id
+
+
+# --- Сценарии ---
+
+def scenario_login(ctx: BenchContext) -> Measurement:
+    m = Measurement("login", "req/s")
+    for _ in range(ctx.iterations):
+        _, seconds = _timed(ctx.login)
+        m.add(seconds)
+    return m
+
+
+def scenario_auth_overhead(ctx: BenchContext) -> Measurement:
+    """Запрос с проверкой токена (статус модели — без работы в БД, кроме поиска пользователя) против открытого."""
+    m = Measurement("auth_overhead", "req/s")
+    open_durations = []
+    for _ in range(ctx.iterations * 5):
+        _, seconds = _timed(lambda: ctx.client.get("/"))
+        open_durations.append(seconds)
+        response, seconds = _timed(lambda: ctx.client.get("/api/veritas/model", headers=ctx.headers))
+        if response.status_code == 200:
+            m.add(seconds)
+        else:
+            m.errors += 1
+    if m.durations:
+        open_p50 = _percentile(open_durations, 0.50)
+        m.extra["open_p50_ms"] = round(open_p50 * 1000, 3)
+        m.extra["overhead_p50_ms"] = round((_percentile(m.durations, 0.50) - open_p50) * 1000, 3)
+    return m
+
+
+def _import(ctx: BenchContext, file_format: str, rows: int) -> Measurement:
+    m = Measurement(f"import_{file_format}", "rows/s")
+    path = os.path.join(ctx.workdir, f"import.{file_format}")
+    if file_format == "csv":
+        data.write_csv(path, rows, ctx.seed)
+    else:
+        data.write_xlsx(path, rows, ctx.seed)
+    m.extra["rows"] = rows
+    m.extra["file_mb"] = round(os.path.getsize(path) / 1e6, 2)
+
+    dataset_id = ctx.create_dataset(f"benchmark-import-{file_format}")
+    started = time.perf_counter()
+    response = ctx.upload(dataset_id, path, file_format)
+    if response.status_code != 200:
+        m.skipped = f"upload failed: HTTP {response.status_code}"
+        return m
+    ctx.wait_rows(dataset_id, rows)
+    m.add(time.perf_counter() - started, rows)
+    if file_format == "csv" and rows == ctx.rows and ctx.dataset_id is None:
+        # Импортированный датасет дальше используется для чтения и экспорта
+        ctx.dataset_id = dataset_id
+    return m
+
+
+def scenario_import_csv(ctx: BenchContext) -> Measurement:
+    return _import(ctx, "csv", ctx.rows)
+
+
+def scenario_import_xlsx(ctx: BenchContext) -> Measurement:
+    return _import(ctx, "xlsx", ctx.xlsx_rows)
+
+
+def _export(ctx: BenchContext, file_format: str) -> Measurement:
+    m = Measurement(f"export_{file_format}", "MB/s")
+    dataset_id = ctx.dataset()
+    for _ in range(ctx.iterations):
+        response, seconds = _timed(
+            lambda: ctx.client.get(f"/api/datasets/{dataset_id}/export/{file_format}", headers=ctx.headers)
+        )
+        if response.status_code == 200:
+            m.add(seconds, len(response.content) / 1e6)
+        else:
+            m.errors += 1
+    return m
+
+
+def scenario_export_csv(ctx: BenchContext) -> Measurement:
+    return _export(ctx, "csv")
+
+
+def scenario_export_json(ctx: BenchContext) -> Measurement:
+    return _export(ctx, "json")
+
+
+def scenario_export_xlsx(ctx: BenchContext) -> Measurement:
+    return _export(ctx, "xlsx")
+
+
+def scenario_read_rows(ctx: BenchContext) -> Measurement:
+    """Страницы по всему датасету, от начала до самых глубоких смещений."""
+    m = Measurement("read_rows", "rows/s")
+    dataset_id = ctx.dataset()
+    pages = max(2, ctx.iterations * 10)
+    last_offset = max(0, ctx.rows - ctx.page_size)
+    for i in range(pages):
+        offset = last_offset * i // (pages - 1)
+        response, seconds = _timed(lambda: ctx.client.get(
+            f"/api/datasets/{dataset_id}/rows", params={"skip": offset, "limit": ctx.page_size}, headers=ctx.headers
+        ))
+        if response.status_code == 200:
+            m.add(seconds, len(response.json()))
+        else:
+            m.errors += 1
+    m.extra["page_size"] = ctx.page_size
+    return m
+
+
+def scenario_veritas_file(ctx: BenchContext) -> Measurement:
+    """Анализ загруженного файла; у каждой итерации свой файл, чтобы не попадать в кэш результатов."""
+    m = Measurement("veritas_file", "rows/s")
+    m.extra["rows"] = ctx.veritas_rows
+    for i in range(ctx.iterations):
+        path = os.path.join(ctx.workdir, f"veritas_{i}.csv")
+        data.write_csv(path, ctx.veritas_rows, ctx.seed + 1000 + i)
+        with open(path, "rb") as f:
+            response, seconds = _timed(lambda: ctx.client.post(
+                "/api/veritas/analyze/file", files={"file": ("veritas.csv", f, CSV_TYPE)}, headers=ctx.headers
+            ))
+        os.unlink(path)
+        if response.status_code == 200:
+            m.add(seconds, ctx.veritas_rows)
+        elif not m.durations and response.status_code >= 500:
+            # Нет модели или пул не запустился — сценарий не имеет смысла
+            m.skipped = f"HTTP {response.status_code}: {response.text[:200]}"
+            return m
+        else:
+            m.errors += 1
+    return m
+
+
+def scenario_veritas_dataset(ctx: BenchContext) -> Measurement:
+    """Анализ сохранённого датасета: первый вызов собирает состояние признаков, остальные его переиспользуют."""
+    m = Measurement("veritas_dataset", "req/s")
+    dataset_id = ctx.dataset()
+    for i in range(ctx.iterations + 1):
+        response, seconds = _timed(
+            lambda: ctx.client.post(f"/api/veritas/analyze/dataset/{dataset_id}", headers=ctx.headers)
+        )
+        if response.status_code != 200:
+            if i == 0:
+                m.skipped = f"HTTP {response.status_code}: {response.text[:200]}"
+                return m
+            m.errors += 1
+        elif i == 0:
+            m.extra["first_ms"] = round(seconds * 1000, 3)
+        else:
+            m.add(seconds)
+    return m
+
+
+# Порядок важен: импорт CSV создаёт датасет, который читают следующие сценарии
+SCENARIOS: Dict[str, Callable[[BenchContext], Measurement]] = {
+    "login": scenario_login,
+    "auth_overhead": scenario_auth_overhead,
+    "import_csv": scenario_import_csv,
+    "import_xlsx": scenario_import_xlsx,
+    "read_rows": scenario_read_rows,
+    "export_csv": scenario_export_csv,
+    "export_json": scenario_export_json,
+    "export_xlsx": scenario_export_xlsx,
+    "veritas_file": scenario_veritas_file,
+    "veritas_dataset": scenario_veritas_dataset,
+}
+
+
+# --- Запуск приложения ---
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(client: httpx.Client, timeout: float = 120.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if client.get("/ready").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError("application did not become ready")
+
+
+@contextlib.contextmanager
+def _inprocess_client():
+    # Импорт после настройки окружения: app.config читает DATABASE_URL при импорте
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        client.timeout = None
+        _wait_ready(client)
+        yield client, os.getpid()
+
+
+@contextlib.contextmanager
+def _uvicorn_client():
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=PROJECT_DIR,
+        env=os.environ.copy(),
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            _wait_ready(client)
+            yield client, server.pid
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+@contextlib.contextmanager
+def _remote_client(base_url: str):
+    with httpx.Client(base_url=base_url, timeout=None) as client:
+        _wait_ready(client)
+        # Память чужого процесса не измеряем
+        yield client, None
+
+
+# --- Базовый прогон ---
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Список регрессий относительно базового прогона (хуже больше чем на tolerance)."""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or "skipped" in current or "skipped" in previous:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="dp-bench-")
+    if not args.base_url:
+        # Свежая БД на каждый прогон, чтобы результаты не зависели от истории
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'benchmark.db')}")
+        os.environ.setdefault("LLM_PROVIDER", "local")
+
+    if args.base_url:
+        client_factory = _remote_client(args.base_url)
+    elif args.transport == "uvicorn":
+        client_factory = _uvicorn_client()
+    else:
+        client_factory = _inprocess_client()
+
+    selected = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = [name for name in selected if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+
+    scenarios = {}
+    with client_factory as (client, server_pid):
+        ctx = BenchContext(client, server_pid, args, workdir)
+        ctx.setup()
+        for name in SCENARIOS:
+            if name not in selected:
+                continue
+            print(f"--- Сценарий {name} ---", file=sys.stderr)
+            reset_peak_rss(server_pid)
+            measurement = SCENARIOS[name](ctx)
+            measurement.peak_rss_mb = peak_rss_mb(server_pid)
+            scenarios[name] = measurement.summary()
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "rows": args.rows,
+            "iterations": args.iterations,
+            "seed": args.seed,
+            "transport": "remote" if args.base_url else args.transport,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "scenarios": scenarios,
+    }
+
+
+def _print_table(results: Dict[str, Any]):
+    print(f"{'scenario':<18}{'p50 ms':>11}{'p99 ms':>11}{'throughput':>14} {'unit':<8}{'peak RSS MB':>12}")
+    for name, summary in results["scenarios"].items():
+        if "skipped" in summary:
+            print(f"{name:<18} skipped: {summary['skipped']}")
+            continue
+        rss = summary["peak_rss_mb"] if summary["peak_rss_mb"] is not None else "-"
+        print(f"{name:<18}{summary['p50_ms']:>11.2f}{summary['p99_ms']:>11.2f}"
+              f"{summary['throughput'] or 0:>14.1f} {summary['unit']:<8}{rss:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the platform's hot paths through the HTTP API.")
+    parser.add_argument("--rows", type=int, default=10_000, help="Size of the main synthetic dataset")
+    parser.add_argument("--iterations", type=int, default=10, help="Iterations per scenario")
+    parser.add_argument("--scenarios", help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--transport", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--base-url", help="Benchmark an already running server instead")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--xlsx-rows", type=int, default=50_000, help="Rows for the XLSX import (capped by --rows)")
+    parser.add_argument("--veritas-rows", type=int, default=100_000, help="Rows per Veritas upload (capped by --rows)")
+    parser.add_argument("--import-timeout", type=float, default=3600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare with a previously saved results file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression vs. baseline")
+    args = parser.parse_args()
+
+    results = run(args)
+    _print_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Регрессии относительно базового прогона:")
+            for line in regressions:
+                print(f"    {line}")
+            sys.exit(1)
+        print("Регрессий относительно базового прогона нет.")
+
+
+if __name__ == "__main__":
+    main()
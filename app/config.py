@@ -0,0 +1,25 @@
+# app/config.py
+"""
+Настройки приложения из переменных окружения.
+
+SECRET_KEY (ключ подписи JWT) и DATABASE_URL обязательны: без них приложение не
+запускается, чтобы токены никогда не подписывались известным ключом по умолчанию.
+"""
+import os
+
+
+def _required(name: str) -> str:
+    value = os.getenv(name)
+    if not value:
+        raise RuntimeError(f"Переменная окружения {name} не задана")
+    return value
+
+
+DATABASE_URL = _required("DATABASE_URL")
+SECRET_KEY = _required("SECRET_KEY")
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+# Ключ Groq нужен только для генерации через провайдер groq
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_MODEL_NAME = os.getenv("GROQ_MODEL_NAME", "llama-3.1-8b-instant")
@@ -1,19 +1,28 @@
 # app/crud.py
 from sqlalchemy.orm import Session
-from . import models, schemas
+from . import models, schemas, row_storage, shards
+from .metrics import crud_query_duration_seconds
 import uuid
-from typing import List
+from typing import List, Dict, Any, Optional
+
+
+def _timed(fn):
+    # Длительность каждой функции (запрос и коммит) попадает в /metrics под её именем
+    return crud_query_duration_seconds.timed(function=fn.__name__)(fn)
 
 # --- Функции для работы с Шаблонами (Templates) ---
 
+@_timed
 def get_template(db: Session, template_id: uuid.UUID):
     """Получить один шаблон по его ID."""
     return db.query(models.Template).filter(models.Template.id == template_id).first()
 
+@_timed
 def get_templates(db: Session, skip: int = 0, limit: int = 100):
     """Получить список шаблонов с пагинацией."""
     return db.query(models.Template).offset(skip).limit(limit).all()
 
+@_timed
 def create_template(db: Session, template: schemas.TemplateCreate, user_id: uuid.UUID):
     """Создать новый шаблон в БД."""
     db_template = models.Template(
@@ -21,19 +30,30 @@ def create_template(db: Session, template: schemas.TemplateCreate, user_id: uuid
         description=template.description,
         schema_=template.schema_,
         ui_hints=template.ui_hints,
+        storage=template.storage,
         owner_id=user_id
     )
     db.add(db_template)
+    if template.storage == "typed":
+        # Таблица строк создаётся в той же транзакции, что и шаблон
+        db.flush()
+        try:
+            row_storage.create_table(db, db_template)
+        except row_storage.RowStorageError:
+            db.rollback()
+            raise
     db.commit()
     db.refresh(db_template)
     return db_template
 
 # --- Функции для работы с Пользователями (Users) ---
 
+@_timed
 def get_user_by_email(db: Session, email: str):
     """Получить пользователя по его email."""
     return db.query(models.User).filter(models.User.email == email).first()
 
+@_timed
 def create_user(db: Session, user: schemas.UserCreate):
     """Создать нового пользователя."""
     from . import auth
@@ -50,34 +70,119 @@ def create_user(db: Session, user: schemas.UserCreate):
 
 # --- Функции для работы с Датасетами (Datasets) ---
 
+@_timed
 def create_dataset(db: Session, dataset: schemas.DatasetCreate, user_id: uuid.UUID):
     """Создать новый датасет."""
+    if dataset.isolated and not shards.SHARDS_AVAILABLE:
+        raise row_storage.RowStorageError("Isolated datasets are only available with SQLite")
     db_dataset = models.Dataset(**dataset.model_dump(), owner_id=user_id)
     db.add(db_dataset)
     db.commit()
     db.refresh(db_dataset)
+    if db_dataset.isolated:
+        # Файл строк создаётся сразу, а не при первой вставке
+        row_storage.get_store(db, db_dataset.id)
     return db_dataset
 
+@_timed
+def delete_dataset(db: Session, db_dataset: models.Dataset):
+    """
+    Удалить датасет вместе со строками и состоянием признаков Veritas.
+    Строки изолированного датасета удаляются вместе с его файлом.
+    """
+    store = row_storage.get_store(db, db_dataset.id)
+    if store.shard is None:
+        db.execute(store.table.delete().where(store.dataset_id == db_dataset.id))
+    # Состояние признаков удаляется каскадом; строки из общей таблицы уже удалены выше
+    db.delete(db_dataset)
+    db.commit()
+    row_storage.forget_store(db, db_dataset.id)
+    if store.shard is not None:
+        row_storage.drop_shard(db_dataset.id)
+
+@_timed
 def get_datasets(db: Session, owner_id: uuid.UUID, skip: int = 0, limit: int = 100):
     """Получить список датасетов для пользователя."""
     return db.query(models.Dataset).filter(models.Dataset.owner_id == owner_id).offset(skip).limit(limit).all()
 
+@_timed
 def get_dataset(db: Session, dataset_id: uuid.UUID):
     """Получить датасет по ID."""
     return db.query(models.Dataset).filter(models.Dataset.id == dataset_id).first()
 
+@_timed
 def create_dataset_row(db: Session, row: schemas.DatasetRowCreate, dataset_id: uuid.UUID):
     """Добавить строку в датасет."""
-    db_row = models.DatasetRow(row_data=row.row_data, dataset_id=dataset_id)
-    db.add(db_row)
+    db_row = _insert_rows(db, dataset_id, [row.row_data])[0]
     db.commit()
-    db.refresh(db_row)
     return db_row
 
+@_timed
+def create_dataset_rows(db: Session, rows: List[Dict[str, Any]], dataset_id: uuid.UUID) -> int:
+    """
+    Добавить несколько строк в датасет одной транзакцией. Возвращает число строк.
+    Признаки Veritas дочитают новые строки при следующем анализе (veritas/dataset_features.py).
+    """
+    inserted = _insert_rows(db, dataset_id, rows)
+    db.commit()
+    return len(inserted)
+
+def _insert_rows(db: Session, dataset_id: uuid.UUID, rows: List[Dict[str, Any]]):
+    """
+    Вставляет строки в хранилище датасета (без коммита) одним executemany, без
+    ORM-объектов: при импорте unit of work стоил дороже самой вставки. В
+    типизированной таблице значения приводятся к типам полей (RowValidationError, если нельзя).
+    """
+    while True:
+        store = row_storage.get_store(db, dataset_id)
+        if store.shard is not None:
+            return store.insert(db, dataset_id, rows)
+        # Вставка в основную БД — в точке сохранения: если датасет перенесли в отдельный
+        # файл, пока выбиралось хранилище, откатывается только она, а не вся транзакция
+        savepoint = db.begin_nested()
+        inserted = store.insert(db, dataset_id, rows)
+        if not row_storage.moved_to_shard(db, dataset_id):
+            savepoint.commit()
+            return inserted
+        savepoint.rollback()
+
+@_timed
 def get_dataset_rows(db: Session, dataset_id: uuid.UUID, skip: int = 0, limit: int = 100):
     """Получить строки датасета."""
+    store = row_storage.get_store(db, dataset_id)
+    if store is not row_storage.json_store:
+        return [
+            row_storage.StoredRow(row_id, row_dataset_id, created_at, row_storage.parse_row_data(row_data))
+            for row_id, row_dataset_id, created_at, row_data in get_dataset_rows_raw(db, dataset_id, skip, limit)
+        ]
     return db.query(models.DatasetRow).filter(models.DatasetRow.dataset_id == dataset_id).offset(skip).limit(limit).all()
 
-def get_rows_by_ids(db: Session, row_ids: List[uuid.UUID]) -> List[models.DatasetRow]:
-    """Получить несколько строк датасета по списку их ID."""
+@_timed
+def get_dataset_rows_raw(db: Session, dataset_id: uuid.UUID, skip: int = 0, limit: int = 100):
+    """
+    Получить строки датасета кортежами (id, dataset_id, created_at, row_data),
+    где row_data — исходный JSON-текст из БД, без создания ORM-объектов и разбора JSON.
+    """
+    store = row_storage.get_store(db, dataset_id)
+    return (
+        db.query(store.id, store.dataset_id, store.created_at, store.row_data)
+        .filter(store.dataset_id == dataset_id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+@_timed
+def get_rows_by_ids(db: Session, row_ids: List[uuid.UUID], dataset_id: Optional[uuid.UUID] = None):
+    """
+    Получить несколько строк датасета по списку их ID (dataset_id нужен для
+    типизированных шаблонов и изолированных датасетов).
+    """
+    store = row_storage.get_store(db, dataset_id) if dataset_id is not None else row_storage.json_store
+    if store is not row_storage.json_store:
+        rows = db.query(store.id, store.dataset_id, store.created_at, store.row_data).filter(store.id.in_(row_ids))
+        return [
+            row_storage.StoredRow(row_id, row_dataset_id, created_at, row_storage.parse_row_data(row_data))
+            for row_id, row_dataset_id, created_at, row_data in rows
+        ]
     return db.query(models.DatasetRow).filter(models.DatasetRow.id.in_(row_ids)).all()
\ No newline at end of file
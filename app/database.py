@@ -1,5 +1,6 @@
 # app/database.py
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .config import DATABASE_URL
 
@@ -10,6 +11,20 @@ if "sqlite" in DATABASE_URL:
 
 engine = create_engine(DATABASE_URL, connect_args=connect_args)
 
+# Сколько миллисекунд SQLite ждёт освобождения блокировки записи другим процессом
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL: читатели не блокируют писателя, поэтому несколько воркеров могут работать с одной БД;
+        # писатель по-прежнему один, остальные ждут до busy_timeout вместо мгновенной ошибки
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
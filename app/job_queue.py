@@ -0,0 +1,319 @@
+# app/job_queue.py
+"""
+Очередь фоновых задач в БД, общая для всех воркеров.
+
+Импорт файлов и асинхронный анализ Veritas не выполняются в процессе, принявшем
+запрос: задача записывается в таблицу job_queue, а исполнитель (JobRunner) в
+каждом воркере забирает задачи оттуда. Захват задачи — условный UPDATE
+(status = 'queued' -> 'running'), поэтому одну задачу получает ровно один воркер,
+а статус и результат видны из любого воркера.
+
+Пока задача выполняется, исполнитель её воркера раз в JOB_HEARTBEAT_INTERVAL_S
+обновляет heartbeat_at. Задача running, чей heartbeat старше JOB_LEASE_S, считается
+брошенной (воркер умер или остановился посреди задачи) и возвращается в очередь:
+это делает любой живой исполнитель при периодическом обслуживании и каждый процесс
+при старте. Задачи живых воркеров не трогаются, сколько бы процессов ни запускалось
+(uvicorn --workers N, перезапуск одного процесса). Если воркер умер, мастер
+(app/serve.py) возвращает его задачи сразу, не дожидаясь истечения аренды. После
+JOB_MAX_ATTEMPTS попыток задача помечается failed.
+
+Завершённые задачи (done, failed) хранятся JOB_RETENTION_S и затем удаляются при
+том же обслуживании.
+"""
+import os
+import time
+import uuid
+import socket
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Set
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+# Как часто исполнитель проверяет очередь, если его не разбудили
+JOB_POLL_INTERVAL_S = float(os.getenv("JOB_POLL_INTERVAL_S", "0.5"))
+# Сколько задач воркер выполняет одновременно
+JOB_RUNNER_THREADS = int(os.getenv("JOB_RUNNER_THREADS", "2"))
+# Сколько раз задача может быть начата заново после падения воркера
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Как часто исполнитель отмечает, что его задачи ещё выполняются
+JOB_HEARTBEAT_INTERVAL_S = float(os.getenv("JOB_HEARTBEAT_INTERVAL_S", "5"))
+# Задача без heartbeat дольше этого срока возвращается в очередь
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "60"))
+# Как часто исполнитель возвращает брошенные задачи и удаляет старые завершённые
+JOB_MAINTENANCE_INTERVAL_S = float(os.getenv("JOB_MAINTENANCE_INTERVAL_S", "60"))
+# Сколько хранить завершённые задачи (их статус и результат), по умолчанию неделю
+JOB_RETENTION_S = float(os.getenv("JOB_RETENTION_S", str(7 * 24 * 3600)))
+# Сколько раз пытаться захватить задачу, если её перехватил другой воркер
+_CLAIM_RETRIES = 5
+
+# Обработчики задач по виду: функция (или корутина) от payload, возвращающая результат (JSON) или None
+_handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+
+
+def handler(kind: str):
+    """Регистрирует обработчик задач вида kind (модуль с обработчиком должен быть импортирован воркером)."""
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue(db: Session, kind: str, payload: Dict[str, Any], status: str = "queued",
+            result: Optional[Dict[str, Any]] = None) -> models.QueuedJob:
+    """Ставит задачу в очередь (или сразу записывает готовый результат, если status='done')."""
+    job = models.QueuedJob(kind=kind, payload=payload, status=status, result=result)
+    if status == "done":
+        job.finished_at = _now()
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    job_runner.notify()
+    return job
+
+
+def get_job(db: Session, job_id: uuid.UUID) -> Optional[models.QueuedJob]:
+    return db.get(models.QueuedJob, job_id)
+
+
+def claim(db: Session, worker: str) -> Optional[models.QueuedJob]:
+    """Забирает самую старую задачу из очереди; None, если задач нет."""
+    for _ in range(_CLAIM_RETRIES):
+        candidate = (
+            db.query(models.QueuedJob.id)
+            .filter(models.QueuedJob.status == "queued", models.QueuedJob.kind.in_(list(_handlers)))
+            .order_by(models.QueuedJob.created_at)
+            .limit(1)
+            .scalar()
+        )
+        if candidate is None:
+            return None
+        # Условный UPDATE атомарен: если задачу уже взял другой воркер, обновится 0 строк
+        claimed = (
+            db.query(models.QueuedJob)
+            .filter(models.QueuedJob.id == candidate, models.QueuedJob.status == "queued")
+            .update({
+                "status": "running",
+                "worker": worker,
+                "started_at": _now(),
+                "heartbeat_at": _now(),
+                "attempts": models.QueuedJob.attempts + 1,
+            }, synchronize_session=False)
+        )
+        db.commit()
+        if claimed == 1:
+            return db.get(models.QueuedJob, candidate)
+    return None
+
+
+def finish(db: Session, job_id: uuid.UUID, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None,
+           worker: Optional[str] = None):
+    """
+    Записывает результат задачи. С worker — только если задача всё ещё за ним: задачу,
+    которую вернули в очередь и отдали другому воркеру, завершит уже он.
+    """
+    query = db.query(models.QueuedJob).filter(models.QueuedJob.id == job_id)
+    if worker is not None:
+        query = query.filter(models.QueuedJob.worker == worker, models.QueuedJob.status == "running")
+    query.update({
+        "status": "failed" if error is not None else "done",
+        "result": result,
+        "error": error,
+        "finished_at": _now(),
+    }, synchronize_session=False)
+    db.commit()
+
+
+def heartbeat(db: Session, job_ids: Set[uuid.UUID]):
+    """Продлевает аренду выполняющихся задач."""
+    db.query(models.QueuedJob).filter(
+        models.QueuedJob.id.in_(list(job_ids)), models.QueuedJob.status == "running"
+    ).update({"heartbeat_at": _now()}, synchronize_session=False)
+    db.commit()
+
+
+def requeue_running(db: Session, worker: Optional[str] = None) -> int:
+    """
+    Возвращает в очередь задачи, которые выполнял умерший воркер worker, или, если
+    воркер не указан, задачи running с истёкшей арендой (heartbeat старше JOB_LEASE_S).
+    """
+    query = db.query(models.QueuedJob).filter(models.QueuedJob.status == "running")
+    if worker is not None:
+        query = query.filter(models.QueuedJob.worker == worker)
+    else:
+        expired = _now() - timedelta(seconds=JOB_LEASE_S)
+        # Задачи, взятые до появления heartbeat_at, проверяются по времени начала
+        query = query.filter(or_(
+            func.coalesce(models.QueuedJob.heartbeat_at, models.QueuedJob.started_at) < expired,
+            func.coalesce(models.QueuedJob.heartbeat_at, models.QueuedJob.started_at).is_(None),
+        ))
+    requeued = 0
+    for job in query.all():
+        if job.attempts >= JOB_MAX_ATTEMPTS:
+            job.status = "failed"
+            job.error = "Worker died while running the job"
+            job.finished_at = _now()
+        else:
+            job.status = "queued"
+            job.worker = None
+            requeued += 1
+    db.commit()
+    return requeued
+
+
+def purge_finished(db: Session, older_than_s: float = JOB_RETENTION_S) -> int:
+    """Удаляет завершённые задачи старше older_than_s секунд; возвращает их число."""
+    deleted = (
+        db.query(models.QueuedJob)
+        .filter(models.QueuedJob.status.in_(("done", "failed")),
+                models.QueuedJob.finished_at < _now() - timedelta(seconds=older_than_s))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+class JobRunner:
+    """Исполнитель задач очереди внутри одного воркера."""
+
+    def __init__(self, threads: int = JOB_RUNNER_THREADS, poll_interval: float = JOB_POLL_INTERVAL_S):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(threads)
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Задачи, которые выполняются сейчас: для них поток опроса продлевает аренду
+        self._running: Set[uuid.UUID] = set()
+        self._running_lock = threading.Lock()
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Запускает опрос очереди; loop — event loop воркера для обработчиков-корутин."""
+        if self._thread is not None:
+            return
+        self._loop = loop
+        self._stop.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="job-runner")
+        self._thread = threading.Thread(target=self._poll, name="job-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        # Не ждём выполняющиеся задачи: корутинам нужен уже останавливающийся event loop.
+        # Незавершённые задачи останутся running и вернутся в очередь при следующем старте
+        self._pool.shutdown(wait=False)
+        self._thread = None
+        self._pool = None
+
+    def notify(self):
+        """Будит исполнитель, не дожидаясь следующего опроса."""
+        self._wake.set()
+
+    def _poll(self):
+        worker = worker_id()
+        next_heartbeat = next_maintenance = 0.0
+        while not self._stop.is_set():
+            # Аренда своих задач и обслуживание очереди — в том же потоке, между опросами
+            now = time.monotonic()
+            if now >= next_heartbeat:
+                self._heartbeat()
+                next_heartbeat = now + JOB_HEARTBEAT_INTERVAL_S
+            if now >= next_maintenance:
+                self._maintain()
+                next_maintenance = now + JOB_MAINTENANCE_INTERVAL_S
+
+            # Ждём свободный слот, затем задачу
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+            job = None
+            db = SessionLocal()
+            try:
+                job = claim(db, worker)
+                if job is not None:
+                    with self._running_lock:
+                        self._running.add(job.id)
+                    self._pool.submit(self._execute, job.id, job.kind, job.payload, worker)
+            except Exception as e:
+                print(f"!!! Ошибка очереди задач: {e}")
+            finally:
+                db.close()
+                if job is None:
+                    self._slots.release()
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _heartbeat(self):
+        with self._running_lock:
+            running = set(self._running)
+        if not running:
+            return
+        db = SessionLocal()
+        try:
+            heartbeat(db, running)
+        except Exception as e:
+            print(f"!!! Не удалось продлить аренду задач: {e}")
+        finally:
+            db.close()
+
+    def _maintain(self):
+        db = SessionLocal()
+        try:
+            requeued = requeue_running(db)
+            purged = purge_finished(db)
+        except Exception as e:
+            print(f"!!! Ошибка обслуживания очереди задач: {e}")
+            return
+        finally:
+            db.close()
+        if requeued:
+            print(f"--- В очередь возвращено брошенных задач: {requeued} ---")
+        if purged:
+            print(f"--- Удалено завершённых задач: {purged} ---")
+
+    def _execute(self, job_id: uuid.UUID, kind: str, payload: Dict[str, Any], worker: str):
+        result, error = None, None
+        try:
+            fn = _handlers[kind]
+            if asyncio.iscoroutinefunction(fn):
+                # Корутины (анализ Veritas) выполняются в event loop воркера: там живут микробатчер и пул
+                result = asyncio.run_coroutine_threadsafe(fn(payload), self._loop).result()
+            else:
+                result = fn(payload)
+        except Exception as e:
+            print(f"❌ ОШИБКА в задаче {kind} {job_id}: {e}")
+            error = str(getattr(e, "detail", None) or e) or type(e).__name__
+        finally:
+            self._slots.release()
+
+        db = SessionLocal()
+        try:
+            finish(db, job_id, result=result, error=error, worker=worker)
+        finally:
+            db.close()
+            with self._running_lock:
+                self._running.discard(job_id)
+
+
+# Один исполнитель на процесс; запускается в lifespan приложения
+job_runner = JobRunner()
@@ -1,23 +1,98 @@
 # app/main.py
 
-from fastapi import FastAPI
-from . import models
-from .database import engine
-from .routers import auth as auth_router
-from .routers import templates as templates_router
-from .routers import datasets as datasets_router
-from .routers import ai as ai_router
-from .routers import veritas as veritas_router
-
-# Эта команда создает все таблицы в БД при старте, если их нет
-models.Base.metadata.create_all(bind=engine)
+import math
+import asyncio
+from contextlib import asynccontextmanager
+from . import startup
+from .startup import startup_profiler, lazy_import, preload
+
+# Тяжёлые подсистемы (pandas, numpy, модель Veritas) импортируются лениво — здесь
+# остаются только то, что нужно для приёма запросов; фазы старта видны в GET /ready
+with startup_profiler.phase("import fastapi"):
+    from fastapi import FastAPI, Request
+    from fastapi.concurrency import run_in_threadpool
+    from fastapi.responses import JSONResponse, PlainTextResponse
+with startup_profiler.phase("import models"):
+    from .migrations import run_migrations, RUN_MIGRATIONS_ON_STARTUP
+with startup_profiler.phase("import routers"):
+    from .routers import auth as auth_router
+    from .routers import templates as templates_router
+    from .routers import datasets as datasets_router
+    from .routers import ai as ai_router
+    from .routers import veritas as veritas_router
+    from .routers import jobs as jobs_router
+    from .routers import debug as debug_router
+    from .database import SessionLocal, engine
+    from . import job_queue, query_stats
+    from .ai.scheduler import AIRateLimitError
+    from . import metrics
+
+veritas_predictor = lazy_import("app.veritas.predictor")
+
+# Число SQL-запросов и время в БД по каждому HTTP-запросу (см. app/query_stats.py)
+query_stats.install(engine)
+
+
+def _recover_jobs():
+    """
+    Возвращает в очередь задачи, прерванные остановкой прошлого запуска (с истёкшей
+    арендой: задачи живых воркеров других процессов не трогаются).
+    """
+    db = SessionLocal()
+    try:
+        requeued = job_queue.requeue_running(db)
+    finally:
+        db.close()
+    if requeued:
+        print(f"--- В очередь возвращено прерванных задач: {requeued} ---")
+
+
+def _warm_up():
+    """Прогрев после старта: импорт тяжёлых модулей и (по желанию) загрузка модели Veritas."""
+    try:
+        preload()
+        # Модель Veritas по умолчанию загружается при первом запросе; warm-up переносит загрузку на старт
+        if veritas_predictor.VERITAS_MODEL_WARMUP:
+            with startup_profiler.phase("warm up Veritas model"):
+                veritas_predictor.model_registry.warm_up()
+        startup_profiler.mark_ready()
+    except Exception as e:
+        startup_profiler.error = str(e)
+        print(f"!!! Ошибка прогрева: {e}")
+    startup_profiler.print_report()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 1. Схема БД должна быть готова до первого запроса; при запуске через app.serve
+    #    схему и очередь один раз готовит мастер, а не каждый воркер
+    if not startup.prepared_by_master:
+        if RUN_MIGRATIONS_ON_STARTUP:
+            with startup_profiler.phase("migrations"):
+                await run_in_threadpool(run_migrations)
+        await run_in_threadpool(_recover_jobs)
+    # 2. Исполнитель общей очереди задач (импорт, асинхронный анализ)
+    job_queue.job_runner.start(asyncio.get_running_loop())
+    # 3. Прогрев идёт в фоне: сервер уже принимает запросы, а /ready отвечает 200 после прогрева
+    #    (воркеры app.serve получают уже прогретые модули и модель от мастера)
+    if not startup.prepared_by_master:
+        app.state.warm_up = asyncio.create_task(run_in_threadpool(_warm_up))
+    yield
+    await run_in_threadpool(job_queue.job_runner.stop)
 
 app = FastAPI(
     title="Dataset Management Platform API",
     description="API для управления, генерации и анализа датасетов с сервисом 'Veritas'.",
-    version="1.1"
+    version="1.1",
+    lifespan=lifespan
 )
 
+# Задержки и число запросов по маршрутам для /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# SQL-запросы каждого HTTP-запроса: заголовки X-DB-Query-Count/Server-Timing и лог N+1
+app.add_middleware(query_stats.QueryStatsMiddleware)
+
 # Подключаем роутер для аутентификации
 app.include_router(auth_router.router, prefix="/api/auth")
 
@@ -33,6 +108,32 @@ app.include_router(ai_router.router, prefix="/api")
 # Подключаем роутер для сервиса "Veritas"
 app.include_router(veritas_router.router, prefix="/api")
 
+# Подключаем роутер состояния фоновых задач
+app.include_router(jobs_router.router, prefix="/api")
+
+# Подключаем отладочный роутер (только для админов)
+app.include_router(debug_router.router, prefix="/api")
+
+# Исчерпанная квота LLM-провайдера — это 429 с подсказкой, когда повторить запрос
+@app.exception_handler(AIRateLimitError)
+def ai_rate_limit_handler(request: Request, exc: AIRateLimitError):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
 @app.get("/", tags=["Root"])
 def read_root():
-    return {"status": "ok", "message": "Welcome to the Dataset Platform API!"}
\ No newline at end of file
+    return {"status": "ok", "message": "Welcome to the Dataset Platform API!"}
+
+@app.get("/ready", tags=["Root"])
+def read_ready():
+    # 503, пока не закончился прогрев (или если он завершился ошибкой)
+    report = startup_profiler.report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+@app.get("/metrics", tags=["Root"], response_class=PlainTextResponse)
+def read_metrics():
+    # Текстовый формат Prometheus; метрики своего процесса-воркера
+    return PlainTextResponse(metrics.registry.expose(), media_type="text/plain; version=0.0.4; charset=utf-8")
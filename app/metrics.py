@@ -0,0 +1,268 @@
+# app/metrics.py
+"""
+Встроенные метрики горячих путей в текстовом формате Prometheus (GET /metrics).
+
+Метрики хранятся в памяти процесса, внешний сервис не нужен — Prometheus (или
+curl) просто читает /metrics. Есть три вида:
+
+- Counter — монотонный счётчик (число запросов, строк, токенов);
+- Histogram — распределение длительностей по корзинам (задержки по маршрутам,
+  запросам к БД, фазам Veritas, вызовам LLM);
+- коллекторы — функции, которые подсистемы регистрируют при импорте, чтобы
+  отдать свои внутренние счётчики (микробатчер, кэш, планировщик) на момент чтения.
+
+Все метрики процесса-воркера свои: при нескольких воркерах их суммирует Prometheus.
+"""
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Корзины по умолчанию для длительностей, в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Для запросов без совпавшего маршрута (404), чтобы не плодить серии на каждый URL
+UNMATCHED_ROUTE = "unmatched"
+
+# Значение коллектора: [(имя, тип, описание, [(метки, значение), ...])]
+Sample = Tuple[Dict[str, str], float]
+CollectedMetric = Tuple[str, str, str, List[Sample]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик."""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам с суммой и числом наблюдений."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # По каждой серии: [счётчики корзин (не накопительные), сумма, число]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # Первая корзина, в которую попадает значение
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Измеряет длительность блока with (даже если блок завершился исключением)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, **labels):
+        """Декоратор: измеряет длительность каждого вызова функции."""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total, n)) for key, (counts, total, n) in self._series.items())
+        lines = []
+        for key, (counts, total, n) in series:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = dict(labels, le=_format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {n}")
+        return lines
+
+
+class MetricsRegistry:
+    """Все метрики процесса и коллекторы подсистем."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], List[CollectedMetric]]] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Повторный импорт модуля (например, при перезагрузке) получает ту же метрику
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, name: str, collect: Callable[[], List[CollectedMetric]]):
+        """Регистрирует функцию, которая при каждом чтении /metrics отдаёт текущие значения подсистемы."""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def expose(self) -> str:
+        """Все метрики в текстовом формате Prometheus 0.0.4."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.expose())
+        for collector_name, collect in collectors:
+            try:
+                collected = collect()
+            except Exception as e:
+                # Сломанный коллектор не должен ломать всю страницу метрик
+                print(f"!!! Ошибка коллектора метрик {collector_name}: {e}")
+                continue
+            for name, kind, documentation, samples in collected:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Один реестр на процесс
+registry = MetricsRegistry()
+
+# --- Метрики, общие для нескольких модулей ---
+
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status code", ("method", "route", "status"))
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response body is sent", ("method", "route"))
+crud_query_duration_seconds = registry.histogram(
+    "crud_query_duration_seconds", "Latency of app.crud functions (query and commit)", ("function",))
+import_rows_total = registry.counter(
+    "dataset_import_rows_total", "Rows inserted by file imports", ("format",))
+import_duration_seconds = registry.histogram(
+    "dataset_import_duration_seconds", "Duration of a whole file import", ("format",))
+veritas_phase_duration_seconds = registry.histogram(
+    "veritas_phase_duration_seconds", "Veritas phases: worker-pool jobs by function (parse and features, "
+    "incl. queueing) and predict (one model batch)", ("phase",))
+veritas_batch_size = registry.histogram(
+    "veritas_predict_batch_size", "Feature sets per model call in the micro-batcher", (),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+ai_request_duration_seconds = registry.histogram(
+    "ai_request_duration_seconds", "LLM calls: total (incl. rate-limit queueing) and provider (the call itself)",
+    ("task", "stage"))
+ai_tokens_total = registry.counter(
+    "ai_tokens_total", "LLM tokens reported by the provider", ("task", "kind"))
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: число запросов и гистограмма задержки по шаблону маршрута.
+
+    Задержка считается до отправки последнего куска тела, поэтому потоковые
+    ответы (NDJSON, SSE) учитываются целиком. Шаблон маршрута (/api/datasets/{dataset_id})
+    берётся из scope после маршрутизации, чтобы число серий не зависело от id в URL.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            method = scope.get("method", "")
+            http_request_duration_seconds.observe(time.perf_counter() - started, method=method, route=path)
+            http_requests_total.inc(method=method, route=path, status=str(status["code"]))
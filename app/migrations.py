@@ -0,0 +1,63 @@
+# app/migrations.py
+"""
+Явный шаг подготовки схемы БД.
+
+Раньше таблицы создавались при импорте app.main; теперь это делает lifespan
+приложения (или отдельный запуск `python -m app.migrations`, если при нескольких
+воркерах схему должен готовить один процесс — тогда RUN_MIGRATIONS_ON_STARTUP=false).
+
+create_all создаёт только отсутствующие таблицы, поэтому индексы и колонки,
+добавленные в модели позже (например, ix_dataset_rows_dataset_id_id или
+templates.storage), для уже существующих таблиц создаются отдельно. Колонки
+добавляются только такие, которым хватает ALTER TABLE ADD COLUMN: допускающие
+NULL или со значением по умолчанию на стороне БД. Индексы, которые заменены
+другими, удаляются: иначе вставка продолжала бы их поддерживать.
+
+Таблицы строк типизированных шаблонов (app/row_storage.py) не описаны в моделях
+и создаются по списку шаблонов.
+"""
+import os
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn
+
+from . import models, row_storage
+from .database import engine as default_engine
+
+# Выполнять ли миграции при старте API-процесса
+RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+# Индексы прежних версий, которые покрываются новыми:
+# ix_dataset_rows_dataset_id — префикс ix_dataset_rows_dataset_id_id (dataset_id, id)
+_OBSOLETE_INDEXES = ("ix_dataset_rows_dataset_id",)
+
+
+def run_migrations(engine: Engine = default_engine):
+    # 1. Отсутствующие таблицы (вместе с их индексами)
+    models.Base.metadata.create_all(bind=engine)
+
+    # 2. Колонки и индексы, которых нет в таблицах, созданных более старой версией приложения
+    inspector = inspect(engine)
+    for table in models.Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and (column.nullable or column.server_default is not None):
+                definition = CreateColumn(column).compile(dialect=engine.dialect)
+                with engine.begin() as connection:
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        for name in _OBSOLETE_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    # 3. Таблицы строк типизированных шаблонов
+    with Session(bind=engine) as db:
+        row_storage.ensure_tables(db)
+
+
+if __name__ == "__main__":
+    run_migrations()
+    print("Схема БД актуальна.")
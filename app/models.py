@@ -1,7 +1,7 @@
 # app/models.py
 
 import uuid
-from sqlalchemy import Column, String, DateTime, func, Enum as SAEnum, JSON, ForeignKey, Integer
+from sqlalchemy import Column, String, DateTime, func, Enum as SAEnum, JSON, ForeignKey, Integer, LargeBinary, Index, Boolean
 # ИЗМЕНЕНИЕ: Импортируем UUID из основного пакета, а не из диалекта postgresql
 from sqlalchemy import UUID
 from sqlalchemy.orm import relationship
@@ -35,6 +35,8 @@ class Template(Base):
     description = Column(String)
     schema_ = Column("schema", JSON, nullable=False)
     ui_hints = Column(JSON)
+    # "json" — строки в общей таблице dataset_rows, "typed" — своя таблица с колонкой на поле (app/row_storage.py)
+    storage = Column(String, nullable=False, default="json", server_default="json")
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
@@ -49,6 +51,8 @@ class Dataset(Base):
     name = Column(String, index=True, nullable=False)
     meta = Column(JSON)
     row_count = Column(Integer, default=0)
+    # Строки датасета лежат в отдельном файле SQLite (app/shards.py), а не в основной БД
+    isolated = Column(Boolean, nullable=False, default=False, server_default="0")
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
@@ -58,6 +62,7 @@ class Dataset(Base):
     owner = relationship("User")
     template = relationship("Template")
     rows = relationship("DatasetRow", back_populates="dataset", cascade="all, delete-orphan")
+    feature_state = relationship("DatasetFeatureState", uselist=False, cascade="all, delete-orphan")
 
 
 class DatasetRow(Base):
@@ -69,4 +74,43 @@ class DatasetRow(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     dataset_id = Column(UUID(as_uuid=True), ForeignKey("datasets.id"), nullable=False)
-    dataset = relationship("Dataset", back_populates="rows")
\ No newline at end of file
+    dataset = relationship("Dataset", back_populates="rows")
+
+    # Составной индекс: выборка строк датасета по страницам и подсчёт (см. app/sampling.py)
+    __table_args__ = (Index("ix_dataset_rows_dataset_id_id", "dataset_id", "id"),)
+
+
+class DatasetFeatureState(Base):
+    """Сохранённый аккумулятор признаков Veritas для датасета (см. veritas/dataset_features.py)."""
+    __tablename__ = "dataset_feature_states"
+
+    dataset_id = Column(UUID(as_uuid=True), ForeignKey("datasets.id"), primary_key=True)
+    # Сколько строк учтено в состоянии — сверяется с числом строк в БД перед использованием
+    row_count = Column(Integer, nullable=False, default=0)
+    field_names = Column(JSON, nullable=False)
+    # Состояние в формате npz без pickle (версия формата и водяной знак — внутри)
+    state = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class QueuedJob(Base):
+    """Фоновая задача (импорт, асинхронный анализ) в общей очереди воркеров (см. app/job_queue.py)."""
+    __tablename__ = "job_queue"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    # "queued", "running", "done", "failed"
+    status = Column(String, nullable=False, default="queued")
+    result = Column(JSON)
+    error = Column(String)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Какой воркер (хост:pid) взял задачу — по нему задачи упавшего воркера возвращаются в очередь
+    worker = Column(String)
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime)
+    # Исполнитель продлевает аренду задачи, пока она выполняется (см. JOB_LEASE_S)
+    heartbeat_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    # Выбор следующей задачи: самая старая в статусе queued
+    __table_args__ = (Index("ix_job_queue_status_created_at", "status", "created_at"),)
@@ -0,0 +1,224 @@
+# app/query_stats.py
+"""
+Учёт SQL-запросов в разрезе HTTP-запроса.
+
+Обработчики событий движка SQLAlchemy (before/after_cursor_execute) записывают
+каждый запрос в статистику текущего HTTP-запроса, которая хранится в contextvar:
+её видят и асинхронные обработчики, и синхронные, выполняемые в пуле потоков.
+Запросы вне HTTP-запроса (очередь задач, миграции) не учитываются.
+
+По каждому запросу считаются число запросов, суммарное время в БД, самые
+медленные запросы (с параметрами, заменёнными на их типы) и повторы одной и той
+же «формы» запроса — признак N+1 (например, ленивая загрузка связи в цикле).
+
+Результат:
+- заголовки ответа X-DB-Query-Count и Server-Timing (db;dur=...) — только при
+  QUERY_STATS_HEADERS, для локальной отладки: в продакшене они раскрывали бы
+  клиентам устройство запросов к БД;
+- лог, если запросов больше QUERY_LOG_MAX_COUNT, есть медленный запрос или N+1;
+- последние такие отчёты — GET /api/debug/queries (только для админов);
+- гистограммы db_queries_per_request и db_time_per_request_seconds в /metrics.
+
+Заголовки отправляются до тела ответа, поэтому для потоковых ответов в них
+попадают только запросы, выполненные до начала потока; в лог и историю — все.
+"""
+import os
+import re
+import time
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import metrics
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Добавлять ли статистику в заголовки ответа (по умолчанию выключено)
+QUERY_STATS_HEADERS = os.getenv("QUERY_STATS_HEADERS", "false").lower() in ("1", "true", "yes")
+# Запрос дольше этого порога попадает в лог
+QUERY_SLOW_MS = float(os.getenv("QUERY_SLOW_MS", "100"))
+# HTTP-запрос с большим числом SQL-запросов попадает в лог
+QUERY_LOG_MAX_COUNT = int(os.getenv("QUERY_LOG_MAX_COUNT", "50"))
+# Столько одинаковых по форме запросов за HTTP-запрос считаются N+1
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_N_PLUS_ONE_THRESHOLD", "5"))
+# Сколько самых медленных запросов хранить в отчёте
+QUERY_TOP_SLOWEST = int(os.getenv("QUERY_TOP_SLOWEST", "5"))
+# Сколько отчётов о проблемных HTTP-запросах хранить для /api/debug/queries
+QUERY_REPORT_HISTORY = int(os.getenv("QUERY_REPORT_HISTORY", "100"))
+
+db_queries_per_request = metrics.registry.histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request", ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000))
+db_time_per_request_seconds = metrics.registry.histogram(
+    "db_time_per_request_seconds", "Total time spent in SQL statements per HTTP request", ("route",))
+
+_current: ContextVar[Optional["RequestQueryStats"]] = ContextVar("request_query_stats", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+# IN (?), IN (?, ?, ?) — списки параметров разной длины — одна и та же форма запроса
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)")
+
+
+def statement_shape(statement: str) -> str:
+    """Текст запроса без различий в пробелах и длине списков параметров."""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    return _PLACEHOLDER_LIST.sub("(?...)", shape)
+
+
+def redact_parameters(parameters: Any) -> Any:
+    """Заменяет значения параметров их типами: в отчёт не попадают пароли и данные строк."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        # executemany передаёт список наборов параметров — достаточно первого и их числа
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return {"rows": len(parameters), "first": redact_parameters(parameters[0])}
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class RequestQueryStats:
+    """SQL-запросы одного HTTP-запроса."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.count = 0
+        self.total_seconds = 0.0
+        self.shapes: Dict[str, int] = {}
+        self.slowest: List[Dict[str, Any]] = []
+        # Синхронные зависимости и обработчик могут выполняться в разных потоках
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, parameters: Any, seconds: float, executemany: bool):
+        shape = statement_shape(statement)
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.shapes[shape] = self.shapes.get(shape, 0) + 1
+            if len(self.slowest) < QUERY_TOP_SLOWEST or seconds > self.slowest[-1]["seconds"]:
+                self.slowest.append({
+                    "statement": shape,
+                    "parameters": redact_parameters(parameters),
+                    "executemany": executemany,
+                    "seconds": round(seconds, 6),
+                })
+                self.slowest.sort(key=lambda item: item["seconds"], reverse=True)
+                del self.slowest[QUERY_TOP_SLOWEST:]
+
+    def n_plus_one(self) -> List[Dict[str, Any]]:
+        """Формы запросов, повторённые не меньше QUERY_N_PLUS_ONE_THRESHOLD раз."""
+        with self._lock:
+            repeated = [(shape, count) for shape, count in self.shapes.items() if count >= QUERY_N_PLUS_ONE_THRESHOLD]
+        return [{"statement": shape, "count": count} for shape, count in sorted(repeated, key=lambda x: -x[1])]
+
+    def is_suspicious(self) -> bool:
+        return (
+            self.count > QUERY_LOG_MAX_COUNT
+            or bool(self.slowest and self.slowest[0]["seconds"] * 1000 >= QUERY_SLOW_MS)
+            or bool(self.n_plus_one())
+        )
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "query_count": self.count,
+            "db_ms": round(self.total_seconds * 1000, 3),
+            "n_plus_one": self.n_plus_one(),
+            "slowest": list(self.slowest),
+        }
+
+
+class QueryReportHistory:
+    """Последние отчёты о HTTP-запросах с N+1, медленными запросами или их избытком."""
+
+    def __init__(self, size: int = QUERY_REPORT_HISTORY):
+        self._reports = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, report: Dict[str, Any]):
+        with self._lock:
+            self._reports.append(report)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._reports))
+
+
+report_history = QueryReportHistory()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    stats.record(statement, parameters, time.perf_counter() - started.pop(), executemany)
+
+
+def _handle_error(exception_context):
+    # Упавший запрос не доходит до after_cursor_execute — снимаем его время начала
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def install(engine: Engine):
+    """Подключает учёт запросов к движку (повторный вызов ничего не меняет)."""
+    if not QUERY_STATS_ENABLED:
+        return
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+class QueryStatsMiddleware:
+    """ASGI-middleware: открывает статистику запросов на время HTTP-запроса и отдаёт её итог."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_STATS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats(scope.get("method", ""), scope.get("path", ""))
+        token = _current.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and QUERY_STATS_HEADERS:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"server-timing", f"db;dur={stats.total_seconds * 1000:.3f}".encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            stats.route = getattr(scope.get("route"), "path", None) or metrics.UNMATCHED_ROUTE
+            db_queries_per_request.observe(stats.count, route=stats.route)
+            db_time_per_request_seconds.observe(stats.total_seconds, route=stats.route)
+            if stats.is_suspicious():
+                report = stats.report()
+                report_history.add(report)
+                print(f"!!! SQL {stats.method} {stats.route}: {report['query_count']} запросов, "
+                      f"{report['db_ms']} мс в БД, N+1: {len(report['n_plus_one'])}")
+                for repeated in report["n_plus_one"]:
+                    print(f"    N+1 x{repeated['count']}: {repeated['statement'][:200]}")
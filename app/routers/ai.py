@@ -1,12 +1,16 @@
 # app/routers/ai.py
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
+import json
 import uuid
-from typing import List, Dict, Any
-from .. import schemas, crud, auth, models, database
+from typing import List, Dict, Any, Optional
+from .. import schemas, crud, auth, models, database, sampling, row_storage
 from ..ai import services as ai_services
+from ..ai.scheduler import get_scheduler, AIRateLimitError
+
 
 router = APIRouter(
     prefix="/ai",
@@ -25,8 +29,10 @@ class AIGenerationResponse(BaseModel):
     rows: List[Dict[str, Any]]
 
 class AICleaningRequest(BaseModel):
-    row_ids: List[uuid.UUID] = Field(..., description="List of row IDs to clean")
+    row_ids: Optional[List[uuid.UUID]] = Field(None, description="List of row IDs to clean; a random sample is used if omitted")
     instruction: str = Field(..., max_length=500, description="Text prompt with cleaning rules")
+    sample_size: int = Field(20, gt=0, le=100, description="Number of rows to sample when row_ids is omitted")
+    sample_by: Optional[str] = Field(None, description="Stratify the sample by this field")
 
 class AICleaningResponse(BaseModel):
     count: int
@@ -62,14 +68,81 @@ def generate_data_for_dataset(dataset_id: uuid.UUID, request: AIGenerationReques
     if not generated_rows:
         raise HTTPException(status_code=500, detail="AI failed to generate data or returned an invalid format.")
 
-    # 4. Проходим по каждой сгенерированной строке и сохраняем её
-    for row_data in generated_rows:
-        row_to_create = schemas.DatasetRowCreate(row_data=row_data)
-        crud.create_dataset_row(db=db, row=row_to_create, dataset_id=dataset_id)
+    # 4. Проверяем сгенерированные строки и сохраняем их одной транзакцией
+    rows_to_create = [schemas.DatasetRowCreate(row_data=row_data).row_data for row_data in generated_rows]
+    try:
+        crud.create_dataset_rows(db=db, rows=rows_to_create, dataset_id=dataset_id)
+    except row_storage.RowValidationError as e:
+        raise HTTPException(status_code=422, detail=f"AI generated a row that does not match the template: {e}")
 
     # 5. Возвращаем структурированный ответ (теперь он соответствует response_model)
     return {"count": len(generated_rows), "rows": generated_rows}
 
+def _sse_event(event: str, payload: Dict[str, Any]) -> str:
+    """Форматирует одно событие Server-Sent Events."""
+    data = json.dumps(payload, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+@router.post("/datasets/{dataset_id}/generate/stream")
+def generate_data_for_dataset_stream(dataset_id: uuid.UUID, request: AIGenerationRequest, db: Session = Depends(database.get_db)):
+    """
+    Generate new rows for a dataset using AI and stream them to the client (SSE).
+
+    Each row is validated and saved as soon as it is parsed from the model output,
+    then pushed to the client as a `row` event. The stream ends with a `done` event.
+    """
+    db_dataset = crud.get_dataset(db, dataset_id=dataset_id)
+    if not db_dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    template_schema = db_dataset.template.schema_
+
+    def event_stream():
+        # Генератор выполняется уже после выхода из эндпоинта,
+        # поэтому ему нужна своя сессия БД (как и фоновым задачам)
+        stream_db = database.SessionLocal()
+        rows_saved = 0
+        try:
+            rows = ai_services.stream_rows_for_schema(
+                schema=template_schema,
+                instruction=request.instruction,
+                count=request.count
+            )
+            try:
+                for row_data in rows:
+                    try:
+                        row_to_create = schemas.DatasetRowCreate(row_data=row_data)
+                    except ValidationError as e:
+                        yield _sse_event("invalid", {"row_data": row_data, "detail": e.errors()})
+                        continue
+
+                    try:
+                        db_row = crud.create_dataset_row(db=stream_db, row=row_to_create, dataset_id=dataset_id)
+                    except row_storage.RowValidationError as e:
+                        yield _sse_event("invalid", {"row_data": row_data, "detail": str(e)})
+                        continue
+                    rows_saved += 1
+                    yield _sse_event("row", {"id": db_row.id, "row_data": db_row.row_data})
+
+                    if rows_saved >= request.count:
+                        break
+            except AIRateLimitError as e:
+                # Заголовки уже отправлены, поэтому о 429 сообщаем событием
+                yield _sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+            else:
+                if rows_saved == 0:
+                    yield _sse_event("error", {"detail": "AI failed to generate data or returned an invalid format."})
+            yield _sse_event("done", {"count": rows_saved})
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/datasets/{dataset_id}/clean", response_model=AICleaningResponse)
 def clean_data_in_dataset(
     dataset_id: uuid.UUID,
@@ -85,10 +158,19 @@ def clean_data_in_dataset(
         raise HTTPException(status_code=404, detail="Dataset not found")
     template_schema = db_dataset.template.schema_
 
-    # 2. Получаем строки, которые нужно очистить
-    rows_to_clean = crud.get_rows_by_ids(db, row_ids=request.row_ids)
-    if len(rows_to_clean) != len(request.row_ids):
-        raise HTTPException(status_code=404, detail="One or more rows not found")
+    # 2. Получаем строки, которые нужно очистить (или репрезентативную выборку из датасета)
+    if request.row_ids is not None:
+        rows_to_clean = crud.get_rows_by_ids(db, row_ids=request.row_ids, dataset_id=dataset_id)
+        if len(rows_to_clean) != len(request.row_ids):
+            raise HTTPException(status_code=404, detail="One or more rows not found")
+    else:
+        row_ids = sampling.sample_row_ids(
+            db, dataset_id, request.sample_size,
+            strategy="stratified" if request.sample_by else "random", by=request.sample_by
+        )
+        rows_to_clean = crud.get_rows_by_ids(db, row_ids=row_ids, dataset_id=dataset_id)
+        if not rows_to_clean:
+            raise HTTPException(status_code=400, detail="The dataset has no rows to clean.")
 
     # 3. Готовим "грязные" данные для отправки в ИИ-сервис
     dirty_data = [row.row_data for row in rows_to_clean]
@@ -129,8 +211,9 @@ def get_schema_suggestion(
 
     current_schema = db_dataset.template.schema_
 
-    # 2. Получаем выборку данных для анализа (например, первые 20 строк)
-    data_sample_rows = crud.get_dataset_rows(db, dataset_id=dataset_id, limit=20)
+    # 2. Получаем случайную выборку данных для анализа (поиском по индексу, без полного прохода)
+    data_sample_rows = crud.get_rows_by_ids(db, row_ids=sampling.sample_row_ids(db, dataset_id, 20),
+                                            dataset_id=dataset_id)
     if not data_sample_rows:
         raise HTTPException(status_code=400, detail="Not enough data in the dataset to provide a suggestion.")
 
@@ -146,3 +229,12 @@ def get_schema_suggestion(
          raise HTTPException(status_code=500, detail="AI failed to return a valid suggestion.")
 
     return {"suggestion": suggestion_data["suggestion"]}
+
+
+@router.get("/scheduler/metrics")
+def get_scheduler_metrics():
+    """
+    Returns LLM request scheduler state: queue depth (total and per priority),
+    in-flight requests, remaining request/token budgets and rate-limit counters.
+    """
+    return get_scheduler().metrics()
@@ -1,21 +1,44 @@
 # app/routers/datasets.py
 from fastapi.responses import StreamingResponse
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, Dict, List, Optional
+import os
 import uuid
 import csv
 import io
+import json
+import orjson
+import time
+import shutil
+import tempfile
 from urllib.parse import quote
-from .. import schemas, crud, auth, models, database
-from fastapi import BackgroundTasks, UploadFile, File
-from fastapi.responses import StreamingResponse, JSONResponse
-import pandas as pd
+from .. import schemas, crud, auth, models, database, sampling, metrics, job_queue, row_storage
+from ..startup import lazy_import
+from fastapi import UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, JSONResponse, ORJSONResponse
+
+# Колоночные снимки (numpy) нужны только аналитике и экспорту
+snapshots = lazy_import("app.snapshots")
 
 router = APIRouter(
     dependencies=[Depends(auth.get_current_user)]
 )
 
+# Сколько строк импорта сохранять одной транзакцией
+IMPORT_BATCH_ROWS = int(os.getenv("IMPORT_BATCH_ROWS", "1000"))
+# Сколько строк CSV разбирать и приводить к типам за один блок
+IMPORT_CSV_CHUNK_ROWS = int(os.getenv("IMPORT_CSV_CHUNK_ROWS", "20000"))
+# Сколько ошибок приведения типов перечислять в результате задачи импорта
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100"))
+# Типы полей, значения которых импорт CSV приводит к типу (остальные остаются строками)
+_CSV_TYPED_FIELDS = ("integer", "number", "boolean", "date")
+# Куда сохранять загруженные файлы до обработки очередью (должен быть общим для всех воркеров)
+IMPORT_SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR") or None
+# Сколько строк отдаёт экспорт в CSV/XLSX/JSON
+EXPORT_MAX_ROWS = 10000
+
 @router.post("", response_model=schemas.Dataset, status_code=201, tags=["Datasets"])
 def create_new_dataset(dataset: schemas.DatasetCreate, db: Session = Depends(database.get_db),
                        current_user: models.User = Depends(auth.get_current_user)):
@@ -23,7 +46,10 @@ def create_new_dataset(dataset: schemas.DatasetCreate, db: Session = Depends(dat
     template = crud.get_template(db, template_id=dataset.template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
-    return crud.create_dataset(db=db, dataset=dataset, user_id=current_user.id)
+    try:
+        return crud.create_dataset(db=db, dataset=dataset, user_id=current_user.id)
+    except row_storage.RowStorageError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 
 @router.get("", response_model=List[schemas.Dataset], tags=["Datasets"])
@@ -40,77 +66,358 @@ def read_dataset(dataset_id: uuid.UUID, db: Session = Depends(database.get_db)):
     return db_dataset
 
 
+@router.delete("/{dataset_id}", status_code=204, tags=["Datasets"])
+def delete_dataset(dataset_id: uuid.UUID, db: Session = Depends(database.get_db),
+                   current_user: models.User = Depends(auth.get_current_user)):
+    """
+    Удаляет датасет со всеми строками, состоянием признаков Veritas и колоночным снимком.
+    Удалить датасет может его владелец или администратор.
+    """
+    db_dataset = crud.get_dataset(db, dataset_id=dataset_id)
+    if db_dataset is None:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    if db_dataset.owner_id != current_user.id and current_user.role != models.UserRole.admin:
+        raise HTTPException(status_code=403, detail="Only the owner can delete a dataset")
+    crud.delete_dataset(db, db_dataset)
+    if snapshots.SNAPSHOTS_ENABLED:
+        snapshots.delete_snapshot(dataset_id)
+
+
 @router.post("/{dataset_id}/rows", response_model=schemas.DatasetRow, status_code=201, tags=["Datasets"])
 def create_row_for_dataset(dataset_id: uuid.UUID, row: schemas.DatasetRowCreate,
                            db: Session = Depends(database.get_db)):
-    return crud.create_dataset_row(db=db, row=row, dataset_id=dataset_id)
+    try:
+        return crud.create_dataset_row(db=db, row=row, dataset_id=dataset_id)
+    except row_storage.RowValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _row_data_json(raw: Any):
+    """
+    Отдаёт row_data в ответ как есть, без json.loads/json.dumps.
+    NaN/Infinity (их может записать импорт XLSX) не являются валидным JSON,
+    поэтому такие строки разбираются и сериализуются обычным путём (в null).
+    """
+    if not isinstance(raw, str):
+        # Драйвер уже разобрал JSON (например, PostgreSQL)
+        return raw
+    if "NaN" in raw or "Infinity" in raw:
+        return json.loads(raw)
+    return orjson.Fragment(raw)
 
 
 @router.get("/{dataset_id}/rows", response_model=List[schemas.DatasetRow], tags=["Datasets"])
 def read_rows_for_dataset(dataset_id: uuid.UUID, db: Session = Depends(database.get_db), skip: int = 0,
                           limit: int = 100):
-    return crud.get_dataset_rows(db=db, dataset_id=dataset_id, skip=skip, limit=limit)
+    # Быстрый путь: только нужные колонки кортежами и сразу в байты через orjson.
+    # response_model остаётся для схемы OpenAPI, а форма ответа совпадает с schemas.DatasetRow
+    rows = crud.get_dataset_rows_raw(db=db, dataset_id=dataset_id, skip=skip, limit=limit)
+    return ORJSONResponse([
+        {"row_data": _row_data_json(row_data), "id": row_id, "dataset_id": row_dataset_id, "created_at": created_at}
+        for row_id, row_dataset_id, created_at, row_data in rows
+    ])
+
+@router.get("/{dataset_id}/sample", response_model=List[schemas.DatasetRow], tags=["Datasets"])
+def sample_rows_for_dataset(dataset_id: uuid.UUID, db: Session = Depends(database.get_db),
+                            n: int = Query(20, gt=0, le=10000),
+                            strategy: str = Query("random", pattern="^(random|stratified)$"),
+                            by: Optional[str] = Query(None, description="Field to stratify by"),
+                            seed: Optional[int] = None):
+    """
+    Возвращает случайную (strategy=random) или стратифицированную по полю `by`
+    (strategy=stratified) выборку из n строк датасета. Строки находятся по случайным
+    rowid поиском по первичному ключу, без чтения всех строк датасета (см. app/sampling.py).
+    """
+    if not crud.get_dataset(db, dataset_id=dataset_id):
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    try:
+        row_ids = sampling.sample_row_ids(db, dataset_id, n, strategy=strategy, by=by, seed=seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rows = sampling.get_raw_rows(db, row_ids, dataset_id=dataset_id)
+    return ORJSONResponse([
+        {"row_data": _row_data_json(row_data), "id": row_id, "dataset_id": row_dataset_id, "created_at": created_at}
+        for row_id, row_dataset_id, created_at, row_data in rows
+    ])
+
+@router.get("/{dataset_id}/stats", response_model=schemas.DatasetStats, response_model_exclude_none=True,
+            tags=["Datasets"])
+def read_dataset_stats(dataset_id: uuid.UUID, db: Session = Depends(database.get_db)):
+    """
+    Сводная статистика по колонкам датасета: пропуски, диапазон и среднее чисел,
+    частые значения строк. Считается полным проходом по колоночному снимку
+    (если он отстал от БД, запрос дожидается его дописывания).
+    """
+    db_dataset = crud.get_dataset(db, dataset_id=dataset_id)
+    if not db_dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    snapshot = snapshots.get_snapshot(db, db_dataset, fresh=True)
+    if snapshot is None:
+        raise HTTPException(status_code=501, detail="Dataset statistics require column snapshots (SQLite only)")
+    return {"dataset_id": dataset_id, "row_count": snapshot.row_count, "columns": snapshot.describe()}
 
 # --- Функция для фоновой обработки ---
-def process_csv_import(file_contents: str, dataset_id: uuid.UUID):
+
+def _coerce_csv_column(values, field_type: str):
+    """
+    Приводит колонку CSV (строки) к типу поля шаблона целиком, без цикла по строкам.
+    Возвращает (значения — object с None вместо пропусков, маска значений, которые привести нельзя).
+    """
+    import numpy as np
+    import pandas as pd
+
+    missing = values.isna()
+    if field_type not in _CSV_TYPED_FIELDS:
+        # Строки, email и прочие поля остаются как в файле
+        return values.astype(object).where(~missing, None), pd.Series(False, index=values.index)
+
+    stripped = values.str.strip()
+    empty = missing | stripped.eq("")
+    result = pd.Series([None] * len(values), index=values.index, dtype=object)
+
+    if field_type in ("integer", "number"):
+        numeric = pd.to_numeric(stripped.where(~empty), errors="coerce")
+        valid = numeric.notna() & np.isfinite(numeric)
+        if field_type == "integer":
+            # Через float64 точны только целые до 2**53; длинные целые разбираются по одному
+            exact = valid & (numeric % 1 == 0) & (numeric.abs() <= 2 ** 53)
+            long_ints = ~empty & ~exact
+            long_ints &= stripped.str.fullmatch(r"[+-]?\d+", na=False)
+            result[exact] = numeric[exact].astype("int64").astype(object)
+            result[long_ints] = stripped[long_ints].map(int).astype(object)
+            valid = exact | long_ints
+        else:
+            # Целые в записи файла остаются целыми (5, а не 5.0), остальное — float
+            ints = valid & (numeric.abs() <= 2 ** 53) & stripped.str.fullmatch(r"[+-]?\d+", na=False)
+            result[valid & ~ints] = numeric[valid & ~ints].astype(object)
+            result[ints] = numeric[ints].astype("int64").astype(object)
+        return result, ~empty & ~valid
+
+    if field_type == "boolean":
+        mapping = {**{word: True for word in row_storage.TRUE_STRINGS},
+                   **{word: False for word in row_storage.FALSE_STRINGS}}
+        parsed = stripped.str.lower().map(mapping)
+        valid = parsed.notna()
+        result[valid] = parsed[valid].astype(object)
+        return result, ~empty & ~valid
+
+    # date: ISO 8601 (и ДД.ММ.ГГГГ) приводится к "ГГГГ-ММ-ДД" или "ГГГГ-ММ-ДДTЧЧ:ММ:СС";
+    # значения с часовым поясом только проверяются и остаются как в файле
+    parsed = pd.to_datetime(stripped.where(~empty), errors="coerce", format="ISO8601", utc=True)
+    retry = ~empty & parsed.isna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(stripped[retry], errors="coerce", format="%d.%m.%Y", utc=True)
+    valid = parsed.notna()
+    with_zone = valid & stripped.str.contains(r"(?:Z|[+-]\d{2}:?\d{2})$", na=False)
+    moments = parsed.dt.tz_localize(None).to_numpy()
+    # np.datetime_as_string форматирует весь массив в C, а не по одному значению, как dt.strftime
+    midnight = (valid & ~with_zone & parsed.dt.normalize().eq(parsed)).to_numpy()
+    timed = (valid & ~with_zone).to_numpy() & ~midnight
+    result[midnight] = np.datetime_as_string(moments[midnight], unit="D")
+    result[timed] = np.datetime_as_string(moments[timed], unit="s")
+    result[with_zone] = stripped[with_zone]
+    return result, ~empty & ~valid
+
+
+def _coerce_csv_chunk(chunk, fields: List[Dict[str, Any]], errors: List[Dict[str, Any]], reject: bool):
     """
-    Парсит CSV и добавляет строки в БД. Эту функцию мы запустим в фоне.
+    Приводит колонки блока CSV к типам полей и возвращает row_data строк и число
+    отклонённых строк. Значения, которые не приводятся, попадают в errors; с reject
+    (типизированный шаблон: строку в колонке нужного типа не сохранить) строка
+    отклоняется, иначе значение сохраняется строкой, как в файле.
     """
+    import pandas as pd
+
+    columns, rejected = {}, pd.Series(False, index=chunk.index)
+    # Колонки блока называются по позиции (c0, c1, ...): имена полей могут повторяться
+    for position, field in enumerate(fields):
+        name, values = field.get("field_name", ""), chunk[f"c{position}"]
+        columns[name], bad = _coerce_csv_column(values, field.get("type", "string"))
+        if bad.any():
+            if reject:
+                rejected |= bad
+            else:
+                columns[name][bad] = values[bad]
+            outcome = "row rejected" if reject else "stored as text"
+            for index in bad[bad].index[:max(0, IMPORT_MAX_ERRORS - len(errors))]:
+                # index — номер строки данных с нуля; +1 — номер строки файла без заголовка
+                errors.append({"row": int(index) + 1, "field": name, "value": values[index],
+                               "error": f"expected {field.get('type')}, {outcome}"})
+    keep = ~rejected.to_numpy()
+    names = list(columns)
+    # Строки собираются из списков колонок: DataFrame.to_dict("records") заметно медленнее
+    values = [columns[name].to_numpy()[keep].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)], int(rejected.sum())
+
+
+def _count_lines(path: str) -> int:
+    count = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            count += block.count(b"\n")
+    return count
+
+
+def _read_csv_chunks(path: str, names: List[str], count: int):
+    """
+    Блоки CSV-файла (без заголовка) с первыми count колонками из names.
+
+    С usecols лишние поля строки отбрасываются, как раньше с zip; недостающие читаются
+    как пропуски и, в отличие от zip, сохраняются ключами со значением null. Но на
+    блоке, где все строки короче count полей, парсер на C падает ("Too many columns
+    specified") — тогда файл дочитывается парсером на Python с той же строки.
+    """
+    import pandas as pd
+
+    options = dict(header=None, skiprows=1, names=names, usecols=names[:count], dtype=str,
+                   keep_default_na=False, encoding="utf-8", chunksize=IMPORT_CSV_CHUNK_ROWS)
+    done = 0
+    try:
+        with pd.read_csv(path, **options) as reader:
+            for chunk in reader:
+                done += len(chunk)
+                yield chunk
+        return
+    except pd.errors.ParserError as e:
+        if "Too many columns specified" not in str(e):
+            raise
+    print(f"--- Импорт {path}: блок из коротких строк, дочитываем парсером на Python со строки {done + 1} ---")
+    with pd.read_csv(path, engine="python", **options) as reader:
+        for chunk in reader:
+            if done >= len(chunk):
+                done -= len(chunk)
+                continue
+            # Индекс блока — сквозной номер строки, поэтому номера строк в ошибках не сдвигаются
+            yield chunk.iloc[done:]
+            done = 0
+
+
+def process_csv_import(path: str, dataset_id: uuid.UUID) -> Dict[str, Any]:
+    """
+    Импортирует CSV-файл в датасет (запускается очередью задач).
+
+    Файл читается блоками через pd.read_csv (парсер на C); колонки сопоставляются
+    с полями шаблона по порядку, заголовок пропускается. Значения integer,
+    number, boolean и date приводятся к типам полей сразу для всего блока, так что
+    в row_data попадают числа и булевы значения, а не строки. Значение, которое
+    привести нельзя, в JSON-шаблоне сохраняется строкой, как раньше, а в
+    типизированном шаблоне отклоняет всю строку; такие значения перечисляются в
+    результате задачи (первые IMPORT_MAX_ERRORS). Поля, которых нет в короткой
+    строке файла, сохраняются со значением null.
+    """
+    import pandas as pd
+
     print(f"--- Начало фонового импорта для датасета {dataset_id} ---")
+    started = time.perf_counter()
 
     # Для фоновой задачи нужно создать свою собственную сессию БД
     db = database.SessionLocal()
 
     try:
-        # Находим датасет и его схему
+        # 1. Находим датасет и его схему
         db_dataset = crud.get_dataset(db, dataset_id=dataset_id)
         if not db_dataset:
             print(f"Ошибка импорта: датасет {dataset_id} не найден.")
-            return
+            return {"rows_added": 0, "rows_rejected": 0, "errors": []}
+        fields = db_dataset.template.schema_.get("fields", [])
+
+        # 2. По заголовку узнаём число колонок: как и раньше, колонки файла сопоставляются с полями по порядку
+        with open(path, newline="", encoding="utf-8") as f:
+            header = next(csv.reader(f), None)
+        if not header or not fields:
+            return {"rows_added": 0, "rows_rejected": 0, "errors": []}
+        fields = fields[:len(header)]
+        names = [f"c{position}" for position in range(len(header))]
+
+        # Большой импорт сразу пишется в отдельный файл датасета (число строк оценивается по переводам строк)
+        row_storage.isolate_if_large(db, dataset_id, _count_lines(path))
+        reject = row_storage.get_store(db, dataset_id).typed
+
+        # 3. Читаем блоками, приводим типы и добавляем в БД пачками
+        rows_added, rows_rejected, errors = 0, 0, []
+        for chunk in _read_csv_chunks(path, names, len(fields)):
+            rows, rejected = _coerce_csv_chunk(chunk, fields, errors, reject)
+            rows_rejected += rejected
+            for start in range(0, len(rows), IMPORT_BATCH_ROWS):
+                rows_added += crud.create_dataset_rows(
+                    db=db, rows=rows[start:start + IMPORT_BATCH_ROWS], dataset_id=dataset_id)
+
+        print(f"--- Фоновый импорт завершен. Добавлено {rows_added} строк, отклонено {rows_rejected}. ---")
+        metrics.import_rows_total.inc(rows_added, format="csv")
+        metrics.import_duration_seconds.observe(time.perf_counter() - started, format="csv")
+        return {"rows_added": rows_added, "rows_rejected": rows_rejected,
+                "errors": sorted(errors, key=lambda error: error["row"])}
+
+    except pd.errors.EmptyDataError:
+        return {"rows_added": 0, "rows_rejected": 0, "errors": []}
+    finally:
+        db.close()
 
-        template_schema = db_dataset.template.schema_
-        field_names = [field.get("field_name", "") for field in template_schema.get("fields", [])]
 
-        # Читаем CSV из строки
-        string_io = io.StringIO(file_contents)
-        reader = csv.reader(string_io)
+def _spool_import(source) -> str:
+    """Сохраняет загруженный файл на диск, чтобы его мог обработать любой воркер."""
+    spool = tempfile.NamedTemporaryFile(delete=False, dir=IMPORT_SPOOL_DIR, prefix="import-")
+    try:
+        shutil.copyfileobj(source, spool)
+    except BaseException:
+        spool.close()
+        os.unlink(spool.name)
+        raise
+    spool.close()
+    return spool.name
 
-        # Пропускаем заголовок
-        header = next(reader, None)
 
-        # Обрабатываем строки и добавляем в БД
-        rows_added = 0
-        for row in reader:
-            row_data = {field_name: value for field_name, value in zip(field_names, row)}
-            row_to_create = schemas.DatasetRowCreate(row_data=row_data)
-            crud.create_dataset_row(db=db, row=row_to_create, dataset_id=dataset_id)
-            rows_added += 1
+async def _enqueue_import(kind: str, dataset_id: uuid.UUID, file: UploadFile, db: Session) -> str:
+    path = await run_in_threadpool(_spool_import, file.file)
+    try:
+        job = await run_in_threadpool(job_queue.enqueue, db, kind, {"path": path, "dataset_id": str(dataset_id)})
+    except BaseException:
+        os.unlink(path)
+        raise
+    return str(job.id)
 
-        print(f"--- Фоновый импорт завершен. Добавлено {rows_added} строк. ---")
 
+@job_queue.handler("snapshot_refresh")
+def _run_snapshot_refresh(payload: dict):
+    """Собирает или дописывает колоночный снимок датасета (см. app/snapshots.py)."""
+    db = database.SessionLocal()
+    try:
+        db_dataset = crud.get_dataset(db, dataset_id=uuid.UUID(payload["dataset_id"]))
+        if db_dataset is None:
+            return None
+        meta = snapshots.refresh(db, db_dataset)
+        return None if meta is None else {"row_count": meta["row_count"], "watermark": meta["watermark"]}
     finally:
         db.close()
 
 
+@job_queue.handler("import_csv")
+def _run_csv_import(payload: dict):
+    try:
+        return process_csv_import(payload["path"], uuid.UUID(payload["dataset_id"]))
+    finally:
+        if os.path.exists(payload["path"]):
+            os.unlink(payload["path"])
+
+
 @router.post("/{dataset_id}/import/csv", tags=["Datasets"])
 async def import_dataset_from_csv(
     dataset_id: uuid.UUID,
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    db: Session = Depends(database.get_db)
 ):
     """
     Импортирует данные из CSV в датасет в фоновом режиме.
+    Ход импорта — GET /api/jobs/{job_id}.
     """
     if file.content_type != "text/csv":
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a CSV file.")
 
-    # Читаем содержимое файла
-    contents = await file.read()
-
-    # Добавляем задачу в фон и сразу возвращаем ответ пользователю
-    background_tasks.add_task(process_csv_import, contents.decode("utf-8"), dataset_id)
+    # Сохраняем файл и ставим задачу в общую очередь; её выполнит любой воркер
+    job_id = await _enqueue_import("import_csv", dataset_id, file, db)
 
-    return {"status": "ok", "message": "File import started in the background."}
+    return {"status": "ok", "message": "File import started in the background.", "job_id": job_id}
 
 @router.get("/{dataset_id}/export/csv", tags=["Datasets"])
 def export_dataset_to_csv(dataset_id: uuid.UUID, db: Session = Depends(database.get_db)):
@@ -137,10 +444,18 @@ def export_dataset_to_csv(dataset_id: uuid.UUID, db: Session = Depends(database.
     writer.writerow(display_names)
 
     # 5. Получаем все строки датасета и записываем их в файл
-    rows = crud.get_dataset_rows(db, dataset_id=dataset_id, limit=10000)  # Ограничим экспорт для безопасности
-    for row in rows:
-        # Извлекаем значения для каждой колонки в правильном порядке
-        writer.writerow([row.row_data.get(field_name) for field_name in field_names])
+    snapshot = snapshots.get_snapshot(db, db_dataset)
+    if snapshot is not None:
+        # Колонки читаются из снимка, без разбора JSON каждой строки; строки, добавленные после него, — из БД
+        columns = [snapshot.columns[field_name].to_list(stop=EXPORT_MAX_ROWS) for field_name in field_names]
+        writer.writerows(zip(*columns))
+        for row_data in snapshot.new_rows(db, limit=EXPORT_MAX_ROWS - snapshot.row_count):
+            writer.writerow([row_data.get(field_name) for field_name in field_names])
+    else:
+        rows = crud.get_dataset_rows(db, dataset_id=dataset_id, limit=EXPORT_MAX_ROWS)  # Ограничим экспорт для безопасности
+        for row in rows:
+            # Извлекаем значения для каждой колонки в правильном порядке
+            writer.writerow([row.row_data.get(field_name) for field_name in field_names])
 
     # 6. Создаем HTTP-ответ, который вернет файл
     response = StreamingResponse(
@@ -170,16 +485,28 @@ def export_dataset_to_xlsx(dataset_id: uuid.UUID, db: Session = Depends(database
     field_names = [field.get("field_name", "") for field in template_schema.get("fields", [])]
     display_names = [field.get("display_name", field_names[i]) for i, field in enumerate(template_schema.get("fields", []))]
 
-    rows = crud.get_dataset_rows(db, dataset_id=dataset_id, limit=10000)
-
-    # 2. Подготавливаем данные для pandas
-    # Создаем список словарей, где каждый словарь - это строка
-    data_for_df = []
-    for row in rows:
-        data_for_df.append({display: row.row_data.get(field) for field, display in zip(field_names, display_names)})
-
-    # 3. Создаем pandas DataFrame
-    df = pd.DataFrame(data_for_df)
+    # 2. Подготавливаем DataFrame: из колоночного снимка или (без снимков) из строк БД
+    snapshot = snapshots.get_snapshot(db, db_dataset)
+    if snapshot is not None:
+        df = snapshot.to_frame(field_names, stop=EXPORT_MAX_ROWS)
+        df.columns = display_names
+        new_rows = snapshot.new_rows(db, limit=EXPORT_MAX_ROWS - snapshot.row_count)
+        if new_rows:
+            import pandas as pd
+            tail = pd.DataFrame([[row_data.get(field) for field in field_names] for row_data in new_rows],
+                                columns=display_names)
+            df = pd.concat([df, tail], ignore_index=True)
+    else:
+        rows = crud.get_dataset_rows(db, dataset_id=dataset_id, limit=EXPORT_MAX_ROWS)
+
+        # Создаем список словарей, где каждый словарь - это строка
+        data_for_df = []
+        for row in rows:
+            data_for_df.append({display: row.row_data.get(field) for field, display in zip(field_names, display_names)})
+
+        # 3. Создаем pandas DataFrame (pandas нужен только для XLSX — импортируем при первом экспорте)
+        import pandas as pd
+        df = pd.DataFrame(data_for_df)
 
     # 4. Создаем Excel-файл в памяти
     # Используем BytesIO, так как XLSX - это бинарный формат
@@ -208,7 +535,7 @@ def export_dataset_to_json(dataset_id: uuid.UUID, db: Session = Depends(database
         raise HTTPException(status_code=404, detail="Dataset not found")
 
     # 2. Получаем все строки и извлекаем из них только данные
-    rows = crud.get_dataset_rows(db, dataset_id=dataset_id, limit=10000)
+    rows = crud.get_dataset_rows(db, dataset_id=dataset_id, limit=EXPORT_MAX_ROWS)
     data = [row.row_data for row in rows]
 
     # 3. Устанавливаем заголовок, чтобы браузер скачал файл
@@ -224,12 +551,13 @@ def process_xlsx_import(file_contents: bytes, dataset_id: uuid.UUID):
     Парсит XLSX и добавляет строки в БД. Запускается в фоне.
     """
     print(f"--- Начало фонового импорта XLSX для датасета {dataset_id} ---")
+    started = time.perf_counter()
     db = database.SessionLocal()
     try:
         db_dataset = crud.get_dataset(db, dataset_id=dataset_id)
         if not db_dataset:
             print(f"Ошибка импорта: датасет {dataset_id} не найден.")
-            return
+            return 0
 
         # Создаем карту сопоставления "Display Name" -> "field_name"
         template_schema = db_dataset.template.schema_
@@ -239,9 +567,12 @@ def process_xlsx_import(file_contents: bytes, dataset_id: uuid.UUID):
         }
 
         # Читаем Excel файл из байтов в pandas DataFrame
+        import pandas as pd
         df = pd.read_excel(io.BytesIO(file_contents))
+        row_storage.isolate_if_large(db, dataset_id, len(df))
 
         rows_added = 0
+        batch = []
         # Итерируемся по строкам DataFrame
         for index, row in df.iterrows():
             # Преобразуем строку DataFrame в словарь, который соответствует схеме БД
@@ -251,21 +582,37 @@ def process_xlsx_import(file_contents: bytes, dataset_id: uuid.UUID):
                     row_data[field_name] = row[display_name]
 
             if row_data:
-                row_to_create = schemas.DatasetRowCreate(row_data=row_data)
-                crud.create_dataset_row(db=db, row=row_to_create, dataset_id=dataset_id)
-                rows_added += 1
+                batch.append(schemas.DatasetRowCreate(row_data=row_data).row_data)
+                if len(batch) >= IMPORT_BATCH_ROWS:
+                    rows_added += crud.create_dataset_rows(db=db, rows=batch, dataset_id=dataset_id)
+                    batch = []
+        rows_added += crud.create_dataset_rows(db=db, rows=batch, dataset_id=dataset_id)
 
         print(f"--- Фоновый импорт XLSX завершен. Добавлено {rows_added} строк. ---")
+        metrics.import_rows_total.inc(rows_added, format="xlsx")
+        metrics.import_duration_seconds.observe(time.perf_counter() - started, format="xlsx")
+        return rows_added
 
     finally:
         db.close()
 
 
+@job_queue.handler("import_xlsx")
+def _run_xlsx_import(payload: dict):
+    try:
+        with open(payload["path"], "rb") as f:
+            contents = f.read()
+        return {"rows_added": process_xlsx_import(contents, uuid.UUID(payload["dataset_id"]))}
+    finally:
+        if os.path.exists(payload["path"]):
+            os.unlink(payload["path"])
+
+
 @router.post("/{dataset_id}/import/xlsx", tags=["Datasets"])
 async def import_dataset_from_xlsx(
     dataset_id: uuid.UUID,
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    db: Session = Depends(database.get_db)
 ):
     """
     Импортирует данные из XLSX в датасет в фоновом режиме.
@@ -278,9 +625,8 @@ async def import_dataset_from_xlsx(
     if file.content_type not in allowed_mimetypes:
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload an XLSX file.")
 
-    contents = await file.read()
-    background_tasks.add_task(process_xlsx_import, contents, dataset_id)
+    job_id = await _enqueue_import("import_xlsx", dataset_id, file, db)
 
-    return {"status": "ok", "message": "XLSX file import started in the background."}
+    return {"status": "ok", "message": "XLSX file import started in the background.", "job_id": job_id}
 
 
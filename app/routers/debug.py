@@ -0,0 +1,20 @@
+# app/routers/debug.py
+
+from typing import Any, Dict, List
+from fastapi import APIRouter, Depends
+from .. import auth, query_stats
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["Debug"],
+    dependencies=[Depends(auth.get_current_admin)]
+)
+
+
+@router.get("/queries")
+def read_query_reports() -> List[Dict[str, Any]]:
+    """
+    Последние HTTP-запросы этого воркера с признаками N+1, медленными SQL-запросами
+    или их избытком (новые первыми).
+    """
+    return query_stats.report_history.list()
@@ -0,0 +1,33 @@
+# app/routers/jobs.py
+
+import uuid
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from .. import schemas, auth, database, job_queue
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"],
+    dependencies=[Depends(auth.get_current_user)]
+)
+
+
+@router.get("/{job_id}", response_model=schemas.QueuedJob)
+def read_job(job_id: uuid.UUID, db: Session = Depends(database.get_db)):
+    """
+    Состояние фоновой задачи (импорт файла, асинхронный анализ) — из любого воркера.
+    """
+    job = job_queue.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 from typing import List
 import uuid
 
-from .. import schemas, crud, auth, models, database
+from .. import schemas, crud, auth, models, database, row_storage
 
 # Создаем роутер и сразу указываем, что все эндпоинты в нем
 # будут зависеть от get_current_user. Это и есть решение проблемы!
@@ -15,7 +15,11 @@ router = APIRouter(
 
 @router.post("", response_model=schemas.Template, status_code=201, tags=["Templates"])
 def create_new_template(template: schemas.TemplateCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    return crud.create_template(db=db, template=template, user_id=current_user.id)
+    try:
+        return crud.create_template(db=db, template=template, user_id=current_user.id)
+    except row_storage.RowStorageError as e:
+        # Например, typed-хранение не на SQLite или повторяющиеся имена полей
+        raise HTTPException(status_code=422, detail=str(e))
 
 @router.get("", response_model=List[schemas.Template], tags=["Templates"])
 def read_templates(db: Session = Depends(database.get_db), skip: int = 0, limit: int = 100):
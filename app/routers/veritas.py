@@ -1,11 +1,25 @@
 # app/routers/veritas.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from sqlalchemy.orm import Session
+from concurrent.futures import Future
+from typing import List, Dict, Any, Callable, Optional, Tuple
+import asyncio
+import json
+import os
+import tempfile
 import uuid
+import zipfile
 
-from .. import schemas, auth
-from ..veritas import feature_calculator, predictor
+from .. import schemas, auth, database, job_queue
+from ..startup import lazy_import
+from ..veritas import cache as veritas_cache
+from ..veritas.cache import result_cache
+from ..veritas.executor import veritas_executor, VeritasQueueFull, VeritasJobTimeout
 
 router = APIRouter(
     prefix="/veritas",
@@ -13,46 +27,533 @@ router = APIRouter(
     dependencies=[Depends(auth.get_current_user)]
 )
 
-@router.post("/analyze/file", response_model=schemas.VeritasResponse)
-async def analyze_dataset_from_file(file: UploadFile = File(...)):
+# Куда сохранять загруженные файлы перед передачей в пул процессов
+VERITAS_SPOOL_DIR = os.getenv("VERITAS_SPOOL_DIR") or None
+# Ограничения пакетного анализа: число файлов и размер одного файла в архиве
+VERITAS_BATCH_MAX_FILES = int(os.getenv("VERITAS_BATCH_MAX_FILES", "1000"))
+VERITAS_BATCH_MAX_MEMBER_BYTES = int(os.getenv("VERITAS_BATCH_MAX_MEMBER_BYTES", str(1024 ** 3)))
+# Пауза перед повторной попыткой, если пул занят другими запросами
+VERITAS_BATCH_RETRY_S = 0.2
+
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+
+# Модули Veritas тянут pandas, numpy и joblib — импортируются при первом запросе к сервису
+jobs = lazy_import("app.veritas.jobs")
+predictor = lazy_import("app.veritas.predictor")
+approximate = lazy_import("app.veritas.approximate")
+dataset_features = lazy_import("app.veritas.dataset_features")
+veritas_evidence = lazy_import("app.veritas.evidence")
+
+
+def _detect_file_type(file: UploadFile) -> str:
+    """Определяет тип файла по content-type."""
+    if file.content_type == "text/csv":
+        return 'csv'
+    if file.content_type == "application/json":
+        return 'json'
+    if file.content_type == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet":
+        return 'xlsx'
+    raise HTTPException(status_code=400, detail="Unsupported file type. Please upload CSV or JSON.")
+
+
+def _copy_and_hash(source, target) -> str:
+    """Копирует файл блоками и по пути считает хеш его содержимого."""
+    hasher = veritas_cache.content_hasher()
+    for block in iter(lambda: source.read(1024 * 1024), b""):
+        hasher.update(block)
+        target.write(block)
+    return hasher.hexdigest()
+
+
+def _spool(source) -> Tuple[str, str]:
+    """Сохраняет поток во временный файл на диске и возвращает путь и хеш содержимого."""
+    spool = tempfile.NamedTemporaryFile(delete=False, dir=VERITAS_SPOOL_DIR, prefix="veritas-")
+    try:
+        digest = _copy_and_hash(source, spool)
+    except BaseException:
+        spool.close()
+        os.unlink(spool.name)
+        raise
+    spool.close()
+    return spool.name, digest
+
+
+async def _spool_upload(file: UploadFile) -> Tuple[str, str]:
     """
-    Анализирует датасет из файла (CSV/JSON) и возвращает оценку подлинности.
+    Сохраняет загруженный файл во временный файл на диске и возвращает путь и хеш содержимого.
+    Воркеру передаётся только путь, а не содержимое файла.
     """
-    # 1. Определяем тип файла и читаем его содержимое
-    file_type = None
-    if file.content_type == "text/csv":
-        file_type = 'csv'
-    elif file.content_type == "application/json":
-        file_type = 'json'
-    elif file.content_type == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet":
-        file_type = 'xlsx'
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported file type. Please upload CSV or JSON.")
+    await file.seek(0)
+    return await run_in_threadpool(_spool, file.file)
 
-    contents = await file.read()
 
-    # 2. Вычисляем статистические признаки
-    features = feature_calculator.calculate_features(contents, file_type=file_type)
-    if "error" in features:
-        raise HTTPException(status_code=422, detail=features["error"])
+def _remove_spool(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
 
-    # 3. Получаем предсказание от ML-модели
-    # Модель возвращает вероятность того, что датасет - СИНТЕТИЧЕСКИЙ (от 0.0 до 1.0)
-    synthetic_probability = predictor.model_predictor.predict(features)
 
-    # 4. Формируем итоговый ответ согласно ТЗ
+def _hand_over(future: Future, path: str) -> Future:
+    """
+    Временный файл принадлежит задаче: удаляется, только когда она завершилась или
+    отменена. Запрос, не дождавшийся результата (таймаут, отключение клиента), файл
+    не трогает — задача из очереди откроет его позже.
+    """
+    future.add_done_callback(lambda _future: _remove_spool(path))
+    return future
+
+
+def _queue_full(detail: str) -> HTTPException:
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": "5"})
+
+
+def _submit(path: str, fn: Callable, *args) -> Future:
+    """Ставит расчёт признаков в пул; если очередь заполнена — 429."""
+    try:
+        return _hand_over(veritas_executor.submit(fn, path, *args), path)
+    except VeritasQueueFull as e:
+        os.unlink(path)
+        raise _queue_full(str(e))
+
+
+def _build_response(features: Dict[str, Any], synthetic_probability: float) -> Dict[str, Any]:
     # Преобразуем вероятность синтетики в "оценку подлинности"
     authenticity_score = int((1 - synthetic_probability) * 100)
 
-    # TODO: В будущем здесь будет логика генерации "доказательств" (evidence)
-    # Пока используем заглушку
-    evidence = [
-        {"feature": "Benford's Law", "description": "Deviation is low", "impact": "low"},
-        {"feature": "Column Correlation", "description": "Correlation matrix appears normal", "impact": "medium"}
-    ]
+    # "Доказательства" строятся из признаков Бенфорда и корреляций (см. veritas/evidence.py)
+    evidence = veritas_evidence.build_evidence(features)
 
     return {
         "request_id": uuid.uuid4(),
         "authenticity_score": authenticity_score,
         "evidence": evidence
-    }
\ No newline at end of file
+    }
+
+
+async def _score(features: Dict[str, Any], cache_key: Optional[Tuple[str, str]] = None) -> Dict[str, Any]:
+    """Получает предсказание для готовых признаков и запоминает результат в кэше (если задан ключ)."""
+    # Версия фиксируется до предсказания: если модель подменят во время запроса,
+    # запись окажется помечена старой версией и при следующем обращении пересчитается
+    model_version = predictor.model_registry.version
+
+    # Получаем предсказание от ML-модели. Одновременные запросы объединяются
+    # в одну пачку predict_proba (см. MicroBatcher)
+    # Модель возвращает вероятность того, что датасет - СИНТЕТИЧЕСКИЙ (от 0.0 до 1.0)
+    synthetic_probability = await predictor.batcher.predict(features)
+
+    if cache_key is not None:
+        result_cache.put(cache_key, features, synthetic_probability, model_version or predictor.model_registry.version)
+    return _build_response(features, synthetic_probability)
+
+
+async def _wait_features(future: Future) -> Dict[str, Any]:
+    """Дожидается результата задачи из пула (временный файл удалит сама задача, см. _hand_over)."""
+    try:
+        result = await veritas_executor.wait(future)
+    except VeritasJobTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+    if "error" in result:
+        raise HTTPException(status_code=422, detail=result["error"])
+    return result
+
+
+async def _finish(future: Future, cache_key: Tuple[str, str]) -> Dict[str, Any]:
+    """Дожидается признаков из пула, получает предсказание и формирует ответ."""
+    features = await _wait_features(future)
+    return await _score(features, cache_key)
+
+
+async def _finish_approx(future: Future) -> Dict[str, Any]:
+    """
+    Дожидается приближённых признаков и бутстреп-реплик, получает предсказания
+    для всех (они уходят в модель одной пачкой) и формирует ответ с интервалами.
+    """
+    result = await _wait_features(future)
+    features = result["features"]
+    probabilities = await asyncio.gather(
+        *(predictor.batcher.predict(sample) for sample in [features] + result["bootstrap"])
+    )
+
+    response = _build_response(features, probabilities[0])
+    replica_scores = [int((1 - probability) * 100) for probability in probabilities[1:]]
+    score_interval = None
+    if replica_scores:
+        import numpy as np
+        low, high = np.percentile(replica_scores, [2.5, 97.5])
+        score_interval = (int(np.floor(low)), int(np.ceil(high)))
+    elif result["complete"]:
+        score_interval = (response["authenticity_score"], response["authenticity_score"])
+
+    response.update({
+        "approximate": not result["complete"] or bool(replica_scores),
+        "score_interval": score_interval,
+        "feature_intervals": result["intervals"],
+        "rows_read": result["rows_read"],
+        "sample_rows": result["sample_rows"],
+        "fraction_read": result["fraction_read"],
+    })
+    return response
+
+
+async def _submit_waiting(path: str, fn: Callable, *args) -> Future:
+    """Ставит расчёт признаков в пул; если пул занят другими запросами — ждёт места, а не отвечает 429."""
+    try:
+        while True:
+            try:
+                return _hand_over(veritas_executor.submit(fn, path, *args), path)
+            except VeritasQueueFull:
+                await asyncio.sleep(VERITAS_BATCH_RETRY_S)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+
+async def _analyze_spooled(path: str, file_type: str, digest: str, mode: str = "exact",
+                           max_rows: Optional[int] = None, time_budget_ms: Optional[int] = None,
+                           queued: bool = False) -> Dict[str, Any]:
+    """
+    Анализирует сохранённый на диск файл: признаки в пуле процессов, затем предсказание.
+    Запрос из API при заполненном пуле получает 429, задача из очереди ждёт места.
+    """
+    if mode == "approx":
+        fn, args = jobs.compute_features_approx, (file_type, max_rows, time_budget_ms)
+    else:
+        fn, args = jobs.compute_features, (file_type,)
+    future = await _submit_waiting(path, fn, *args) if queued else _submit(path, fn, *args)
+    if mode == "approx":
+        return await _finish_approx(future)
+    return await _finish(future, (digest, file_type))
+
+
+@job_queue.handler("veritas_file")
+async def _run_queued_analysis(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Асинхронный анализ из общей очереди: его может выполнить любой воркер."""
+    response = await _analyze_spooled(**payload, queued=True)
+    return jsonable_encoder(response, exclude_none=True)
+
+
+def _record_analysis(payload: Dict[str, Any], result: Optional[Dict[str, Any]] = None) -> str:
+    """Ставит анализ в очередь (или записывает уже готовый результат) и возвращает id задачи."""
+    db = database.SessionLocal()
+    try:
+        if result is not None:
+            job = job_queue.enqueue(db, "veritas_file", payload, status="done", result=result)
+        else:
+            job = job_queue.enqueue(db, "veritas_file", payload)
+        return str(job.id)
+    finally:
+        db.close()
+
+
+# Значения query-параметра, которые FastAPI читает как false
+_FALSE_QUERY_VALUES = {"0", "false", "f", "no", "n", "off"}
+
+
+class _AdmissionRoute(APIRoute):
+    """
+    Маршрут синхронного анализа: при заполненном пуле отвечает 429 до чтения тела
+    запроса, а не после того, как загрузка целиком принята и сохранена на диск.
+    Асинхронные запросы (wait=false) уходят в очередь в БД и не отклоняются.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            waits = request.query_params.get("wait", "true").lower() not in _FALSE_QUERY_VALUES
+            if waits and not veritas_executor.has_capacity():
+                raise _queue_full("Veritas analysis queue is full, please retry later")
+            return await handler(request)
+
+        return route_handler
+
+
+def _post_with_admission(path: str, **kwargs):
+    def decorator(endpoint):
+        router.add_api_route(path, endpoint, methods=["POST"], route_class_override=_AdmissionRoute, **kwargs)
+        return endpoint
+    return decorator
+
+
+@_post_with_admission(
+    "/analyze/file",
+    response_model=schemas.VeritasResponse,
+    response_model_exclude_none=True,
+    responses={202: {"model": schemas.VeritasJob}, 429: {"description": "Analysis queue is full"}}
+)
+async def analyze_dataset_from_file(
+    file: UploadFile = File(...),
+    wait: bool = True,
+    mode: str = Query("exact", pattern="^(exact|approx)$"),
+    max_rows: Optional[int] = Query(None, ge=100, le=1_000_000),
+    time_budget_ms: Optional[int] = Query(None, ge=50, le=60_000),
+):
+    """
+    Анализирует датасет из файла (CSV/JSON) и возвращает оценку подлинности.
+
+    Разбор файла и расчёт признаков выполняются в пуле процессов, поэтому event loop
+    не блокируется. С `wait=false` сразу возвращается job_id (202), а результат
+    можно получить через `GET /veritas/jobs/{job_id}`. Повторная загрузка того же
+    файла отдаётся из кэша без разбора.
+
+    `mode=approx` считает признаки по выборке не больше `max_rows` строк, читая файл
+    не дольше `time_budget_ms`, и возвращает 95% интервалы для признаков и оценки,
+    а также долю прочитанного файла. По умолчанию они берутся из
+    VERITAS_APPROX_MAX_ROWS и VERITAS_APPROX_TIME_BUDGET_MS.
+    """
+    # 1. Определяем тип файла и сохраняем его на диск, по пути считая хеш содержимого
+    file_type = _detect_file_type(file)
+    path, digest = await _spool_upload(file)
+    cache_key = (digest, file_type)
+
+    # 2. Ищем результат в кэше: при той же версии модели ответ готов сразу (точный —
+    #    даже если запрошен приближённый режим), при другой — переиспользуем признаки
+    #    и только заново получаем предсказание
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        os.unlink(path)
+        if cached.model_version is not None and cached.model_version == predictor.model_registry.version:
+            response = _build_response(cached.features, cached.probability)
+        else:
+            response = await _score(cached.features, cache_key)
+        if wait:
+            return response
+        job_id = await run_in_threadpool(
+            _record_analysis, {"file_type": file_type, "digest": digest},
+            jsonable_encoder(response, exclude_none=True)
+        )
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": "done"})
+
+    if mode == "approx":
+        # Приближённый режим: выборка строк в пределах бюджета времени (в кэш не попадает)
+        max_rows = max_rows or approximate.VERITAS_APPROX_MAX_ROWS
+        time_budget_ms = time_budget_ms or approximate.VERITAS_APPROX_TIME_BUDGET_MS
+
+    # 3. Синхронный режим: ставим расчёт признаков в пул процессов (или получаем 429) и ждём результат
+    if wait:
+        return await _analyze_spooled(path, file_type, digest, mode, max_rows, time_budget_ms)
+
+    # 4. Асинхронный режим: задача уходит в общую очередь в БД — её выполнит любой
+    #    свободный воркер, а статус можно спросить у любого воркера
+    payload = {"path": path, "file_type": file_type, "digest": digest, "mode": mode,
+               "max_rows": max_rows, "time_budget_ms": time_budget_ms}
+    try:
+        job_id = await run_in_threadpool(_record_analysis, payload)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "pending"})
+
+
+def _file_type_from_name(name: str) -> Optional[str]:
+    """Определяет тип файла по расширению (для файлов в пакете и архиве)."""
+    extension = os.path.splitext(name.lower())[1]
+    if extension == ".csv":
+        return 'csv'
+    if extension in (".json", ".jsonl", ".ndjson"):
+        return 'json'
+    if extension == ".xlsx":
+        return 'xlsx'
+    return None
+
+
+def _is_zip(file: UploadFile) -> bool:
+    return file.content_type in ZIP_CONTENT_TYPES or (file.filename or "").lower().endswith(".zip")
+
+
+def _batch_items(files: List[UploadFile]):
+    """
+    Раскладывает загрузку на элементы пакета: (имя, тип файла, функция сохранения на диск).
+
+    Загруженные файлы закрываются, как только эндпоинт вернул ответ, поэтому они
+    сохраняются на диск сразу (обычные файлы — целиком, zip — одной копией архива).
+    Члены архива распаковываются по одному, непосредственно перед анализом.
+    Возвращает элементы, открытые архивы и пути временных файлов, которые надо удалить в конце.
+    """
+    items, archives, owned_paths = [], [], []
+    for file in files:
+        if not _is_zip(file):
+            try:
+                file_type = _detect_file_type(file)
+            except HTTPException:
+                file_type = _file_type_from_name(file.filename or "")
+            spooled = _spool(_rewound(file.file))
+            owned_paths.append(spooled[0])
+            items.append((file.filename, file_type, lambda spooled=spooled: spooled))
+            continue
+
+        archive_path, _ = _spool(_rewound(file.file))
+        owned_paths.append(archive_path)
+        try:
+            archive = zipfile.ZipFile(archive_path)
+        except zipfile.BadZipFile:
+            items.append((file.filename, None, None))
+            continue
+        archives.append(archive)
+        for info in archive.infolist():
+            if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                continue
+            if info.file_size > VERITAS_BATCH_MAX_MEMBER_BYTES:
+                items.append((info.filename, "too_large", None))
+                continue
+            items.append((
+                info.filename,
+                _file_type_from_name(info.filename),
+                lambda archive=archive, info=info: _spool_member(archive, info),
+            ))
+    return items, archives, owned_paths
+
+
+def _rewound(source):
+    source.seek(0)
+    return source
+
+
+def _spool_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> Tuple[str, str]:
+    # Член архива распаковывается потоком прямо во временный файл
+    with archive.open(info) as member:
+        return _spool(member)
+
+
+def _cleanup_batch(archives: List[zipfile.ZipFile], owned_paths: List[str]):
+    for archive in archives:
+        archive.close()
+    for path in owned_paths:
+        # Файлы, которые дошли до анализа, из списка уже убраны: их удаляет задача пула
+        _remove_spool(path)
+
+
+async def _analyze_batch_item(name: str, file_type: Optional[str], spool: Optional[Callable],
+                              slots: asyncio.Semaphore, spool_lock: asyncio.Lock,
+                              owned_paths: List[str]) -> Dict[str, Any]:
+    """Анализирует один файл пакета; ошибки возвращаются в строке результата, а не бросаются."""
+    if file_type == "too_large":
+        return {"file": name, "status": "failed", "error": "File is too large"}
+    if file_type is None or spool is None:
+        return {"file": name, "status": "failed", "error": "Unsupported file type"}
+
+    try:
+        async with slots:
+            # 1. Сохраняем файл на диск (члены одного архива — по очереди)
+            async with spool_lock:
+                path, digest = await run_in_threadpool(spool)
+            # Дальше файлом распоряжается этот элемент (или задача пула), а не _cleanup_batch
+            if path in owned_paths:
+                owned_paths.remove(path)
+            cache_key = (digest, file_type)
+
+            # 2. Готовый результат из кэша
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                os.unlink(path)
+                if cached.model_version is not None and cached.model_version == predictor.model_registry.version:
+                    result = _build_response(cached.features, cached.probability)
+                else:
+                    result = await _score(cached.features, cache_key)
+                return {"file": name, "status": "done", "result": result}
+
+            # 3. Расчёт признаков в пуле; если пул занят другими запросами — ждём места
+            future = await _submit_waiting(path, jobs.compute_features, file_type)
+            result = await _finish(future, cache_key)
+        return {"file": name, "status": "done", "result": result}
+    except HTTPException as e:
+        return {"file": name, "status": "failed", "error": str(e.detail)}
+    except Exception as e:
+        print(f"❌ ОШИБКА при пакетном анализе файла {name}: {e}")
+        return {"file": name, "status": "failed", "error": "Analysis failed"}
+
+
+@router.post(
+    "/analyze/batch",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}, "description": "One JSON object per file"}}
+)
+async def analyze_batch(files: List[UploadFile] = File(...)):
+    """
+    Анализирует несколько файлов (CSV/JSON/XLSX) или zip-архивов за один запрос.
+
+    Признаки файлов считаются параллельно в пуле процессов, а предсказания для
+    файлов, готовых одновременно, уходят в модель одной пачкой. Результаты
+    возвращаются потоком NDJSON по мере готовности: одна строка на файл
+    (`{"file", "status", "result" | "error"}`), последняя строка — итог.
+    """
+    items, archives, owned_paths = await run_in_threadpool(_batch_items, files)
+    if len(items) > VERITAS_BATCH_MAX_FILES:
+        _cleanup_batch(archives, owned_paths)
+        raise HTTPException(status_code=413, detail=f"Too many files in one batch (max {VERITAS_BATCH_MAX_FILES})")
+
+    async def result_stream():
+        # Одновременно в работе не больше файлов, чем процессов в пуле
+        slots = asyncio.Semaphore(veritas_executor.workers)
+        spool_lock = asyncio.Lock()
+        tasks = [
+            asyncio.create_task(_analyze_batch_item(name, file_type, spool, slots, spool_lock, owned_paths))
+            for name, file_type, spool in items
+        ]
+        failed = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                line = await finished
+                failed += line["status"] == "failed"
+                yield json.dumps(jsonable_encoder(line), ensure_ascii=False) + "\n"
+            yield json.dumps({"done": True, "count": len(tasks), "failed": failed}) + "\n"
+        finally:
+            # Клиент отключился — остальные файлы не анализируем
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            _cleanup_batch(archives, owned_paths)
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
+@router.post("/analyze/dataset/{dataset_id}", response_model=schemas.VeritasResponse,
+             response_model_exclude_none=True)
+async def analyze_stored_dataset(dataset_id: uuid.UUID):
+    """
+    Анализирует датасет, который уже хранится на платформе, без экспорта в файл.
+
+    Признаки берутся из сохранённого состояния, в которое дочитываются только строки,
+    добавленные после прошлого анализа; полный проход нужен только при первом анализе.
+    """
+    features = await run_in_threadpool(dataset_features.compute_dataset_features, dataset_id)
+    if features is None:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    return await _score(features)
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.VeritasJob)
+def get_analysis_job(job_id: uuid.UUID, db: Session = Depends(database.get_db)):
+    """
+    Возвращает состояние асинхронного анализа и его результат, когда он готов.
+    """
+    job = job_queue.get_job(db, job_id)
+    if job is None or job.kind != "veritas_file":
+        raise HTTPException(status_code=404, detail="Job not found")
+    # В очереди задача "queued", а в API анализа исторически "pending"
+    status_name = "pending" if job.status == "queued" else job.status
+    return {"job_id": job.id, "status": status_name, "result": job.result, "error": job.error}
+
+
+@router.get("/model", response_model=schemas.VeritasModelStatus)
+def get_model_status():
+    """
+    Возвращает активную версию модели, время её загрузки и число признаков.
+    """
+    return predictor.model_registry.status()
+
+
+@router.post("/model/reload", response_model=schemas.VeritasModelStatus,
+             dependencies=[Depends(auth.get_current_admin)])
+async def reload_model():
+    """
+    Загружает модель из файла заново и атомарно подменяет активную версию (только для админов).
+    Если новый файл не загружается, продолжает работать прежняя версия.
+    """
+    try:
+        await run_in_threadpool(predictor.model_registry.reload)
+    except predictor.ModelLoadError as e:
+        raise HTTPException(status_code=422, detail=f"Model reload failed: {e}")
+    return predictor.model_registry.status()
@@ -0,0 +1,601 @@
+# app/row_storage.py
+"""
+Где и в каком виде хранятся строки датасетов.
+
+По умолчанию (storage="json") строки всех датасетов лежат в общей таблице
+dataset_rows, а значения — JSON-объектом в row_data. Шаблон можно создать с
+storage="typed": тогда для него создаётся отдельная таблица rows_<id шаблона>,
+где каждое поле шаблона — своя колонка с типом из схемы:
+
+    integer -> BIGINT, number -> FLOAT, boolean -> BOOLEAN, остальные типы -> TEXT
+
+Значения приводятся к типу при вставке (строка "42" из CSV в integer-поле
+становится числом 42); значение, которое привести нельзя, — RowValidationError.
+Ключи row_data, которых нет в шаблоне, сохраняются в JSON-колонке extra.
+Поле с "indexed": true получает индекс (dataset_id, поле).
+
+Для кода, читающего строки, разница скрыта за RowStore: id, dataset_id,
+created_at и row_data — выражения SQL, причём row_data в типизированной таблице
+собирается самой SQLite (json_object), так что быстрые пути, отдающие JSON-текст
+без разбора, работают для обоих видов хранения. Типизированное хранение
+опирается на JSON-функции SQLite и доступно только с ней.
+
+Строки изолированного датасета (isolated=true или выросшего до
+SHARD_ROW_THRESHOLD строк, см. app/shards.py) лежат в таблице того же вида, но в
+отдельном файле SQLite; get_store привязывает её к движку этого файла в сессии.
+Выбранное хранилище запоминается в сессии (db.info) до конца сессии или до
+переноса датасета.
+Перенести датасет в свой файл вручную: `python -m app.row_storage isolate <dataset_id>`
+(можно при работающем API).
+
+Перевести существующий шаблон (со всеми датасетами) из JSON в типизированные
+колонки: `python -m app.row_storage migrate <template_id>`. Вид хранения шаблона
+читается из БД вместе с датасетом, так что воркеры видят перевод без перезапуска.
+"""
+import os
+import json
+import sys
+import uuid
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, Float, Index, JSON, MetaData, String, Table, UUID,
+                        case, func, literal, literal_column, or_, type_coerce)
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models, shards
+from .database import engine
+
+STORAGE_MODES = ("json", "typed")
+TYPED_STORAGE_AVAILABLE = engine.dialect.name == "sqlite"
+
+# Типы колонок по типу поля шаблона; остальные типы (string, email, date, ...) хранятся текстом
+_COLUMN_TYPES = {"integer": BigInteger, "number": Float, "boolean": Boolean}
+# Имена служебных колонок типизированной таблицы; одноимённое поле шаблона получает префикс
+_RESERVED_NAMES = {"id", "dataset_id", "created_at", "updated_at", "extra"}
+# json_object принимает ограниченное число аргументов — объект собирается частями
+_JSON_OBJECT_FIELDS = 50
+# Строковые записи булевых значений (и для импорта CSV)
+TRUE_STRINGS = {"true", "1", "yes", "y", "да"}
+FALSE_STRINGS = {"false", "0", "no", "n", "нет"}
+
+# Таблицы шаблонов создаются во время работы, поэтому у них свой MetaData
+_metadata = MetaData()
+
+
+class RowStorageError(ValueError):
+    """Шаблон нельзя хранить в выбранном виде (дубликаты полей, не SQLite и т.п.)."""
+
+
+class RowValidationError(ValueError):
+    """Значение строки не приводится к типу поля типизированного шаблона."""
+
+
+def parse_row_data(raw: Any) -> Any:
+    """Разбирает JSON-текст row_data из БД."""
+    if not isinstance(raw, (str, bytes)):
+        return raw
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        # NaN/Infinity, которые может записать импорт XLSX
+        return json.loads(raw)
+
+
+class StoredRow:
+    """Строка типизированного датасета с теми же атрибутами, что у models.DatasetRow."""
+    __slots__ = ("id", "dataset_id", "created_at", "row_data")
+
+    def __init__(self, id: uuid.UUID, dataset_id: uuid.UUID, created_at: datetime, row_data: Dict[str, Any]):
+        self.id = id
+        self.dataset_id = dataset_id
+        self.created_at = created_at
+        self.row_data = row_data
+
+
+# --- Приведение значений ---
+
+def _to_integer(value: Any) -> Optional[int]:
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            return _to_integer(float(value))
+    raise ValueError
+
+
+def _to_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = value.strip()
+        return float(value) if value else None
+    raise ValueError
+
+
+def _to_boolean(value: Any) -> Optional[bool]:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if not value:
+            return None
+        if value in TRUE_STRINGS:
+            return True
+        if value in FALSE_STRINGS:
+            return False
+    raise ValueError
+
+
+def _to_text(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        raise ValueError
+    return value if isinstance(value, str) else str(value)
+
+
+_CONVERTERS = {"integer": _to_integer, "number": _to_number, "boolean": _to_boolean}
+
+
+# --- Хранилища ---
+
+class RowStore:
+    """Строки датасетов в таблице dataset_rows (JSON в row_data): общей или в файле датасета."""
+    typed = False
+
+    def __init__(self, table: Table, shard: Optional[uuid.UUID] = None):
+        self.table = table
+        # id датасета, в файле которого лежит таблица (app/shards.py); None — основная БД
+        self.shard = shard
+        self.id = table.c.id
+        self.dataset_id = table.c.dataset_id
+        self.created_at = table.c.created_at
+        # rowid SQLite: порядок вставки (водяной знак колоночных снимков)
+        self.rowid = literal_column(f"{table.name}.rowid")
+        # Текст JSON строки — отдаётся клиенту без разбора
+        self.row_data = self._row_data_expression()
+
+    def _row_data_expression(self):
+        return type_coerce(self.table.c.row_data, String)
+
+    @property
+    def name(self) -> str:
+        # Снимки сверяют источник строк: после переноса в шард или перевода шаблона снимок собирается заново
+        return self.table.name if self.shard is None else f"dataset_{self.shard.hex}.{self.table.name}"
+
+    def to_params(self, row_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {"row_data": row_data}
+
+    def to_row_data(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return params["row_data"]
+
+    def insert(self, db: Session, dataset_id: uuid.UUID, rows: List[Dict[str, Any]]) -> List[StoredRow]:
+        """Вставляет строки (без коммита). Все строки проверяются до вставки первой."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        params = [self.to_params(row_data) for row_data in rows]
+        for item in params:
+            item.update(id=uuid.uuid4(), dataset_id=dataset_id, created_at=now, updated_at=now)
+        if params:
+            db.execute(self.table.insert(), params)
+        return [StoredRow(item["id"], dataset_id, now, self.to_row_data(item)) for item in params]
+
+
+class TypedRowStore(RowStore):
+    """Строки датасетов одного шаблона в отдельной таблице с колонкой на каждое поле."""
+    typed = True
+
+    def __init__(self, table: Table, fields: List[Tuple[str, str, Column]], shard: Optional[uuid.UUID] = None):
+        self.fields = fields  # (field_name, тип поля, колонка)
+        super().__init__(table, shard)
+
+    def _row_data_expression(self):
+        # Объект склеивается текстом, а не json_patch: тот выбрасывает ключи со значением null
+        bodies = []
+        for start in range(0, len(self.fields), _JSON_OBJECT_FIELDS):
+            pairs = []
+            for field_name, field_type, column in self.fields[start:start + _JSON_OBJECT_FIELDS]:
+                if isinstance(column.type, Boolean):
+                    # Булевы значения SQLite хранит числами; в JSON нужны true/false
+                    value = func.json(case((column == True, "true"), (column == False, "false")))  # noqa: E712
+                elif field_type == "number":
+                    # В таблицах с колонкой NUMERIC целые значения (2.0) лежат как INTEGER
+                    value = func.cast(column, Float)
+                else:
+                    value = column
+                pairs.extend([literal(field_name), value])
+            # Содержимое объекта без фигурных скобок; значения полей — скаляры, так что
+            # последняя "}" всегда закрывает сам объект
+            bodies.append(func.rtrim(func.ltrim(func.json_object(*pairs), "{"), "}"))
+
+        expression = literal("{")
+        for i, body in enumerate(bodies):
+            expression = expression.op("||")(body if i == 0 else literal(",").op("||")(body))
+        # extra (JSON-объект или NULL) дописывается без своей открывающей скобки и замыкает объект
+        extra = type_coerce(self.table.c.extra, String)
+        separator = "," if bodies else ""
+        expression = expression.op("||")(case(
+            (or_(extra.is_(None), extra == "{}"), literal("}")),
+            else_=literal(separator).op("||")(func.substr(extra, 2)),
+        ))
+        return type_coerce(expression, String)
+
+    def to_params(self, row_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Значения строки для INSERT: приведённые к типам полей и extra для остальных ключей."""
+        params = {}
+        for field_name, field_type, column in self.fields:
+            value = row_data.get(field_name)
+            if not isinstance(value, (str, int, float, dict, list)) and hasattr(value, "item"):
+                # Скаляры NumPy (импорт XLSX через pandas)
+                value = value.item()
+            if value is not None:
+                try:
+                    value = _CONVERTERS.get(field_type, _to_text)(value)
+                except (ValueError, TypeError, OverflowError):
+                    raise RowValidationError(f"Field '{field_name}': expected {field_type}, got {value!r}")
+            params[column.key] = value
+        known = {field_name for field_name, _, _ in self.fields}
+        extra = {key: value for key, value in row_data.items() if key not in known}
+        params["extra"] = extra or None
+        return params
+
+    def to_row_data(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        row_data = {field_name: params[column.key] for field_name, _, column in self.fields}
+        row_data.update(params.get("extra") or {})
+        return row_data
+
+
+json_store = RowStore(models.DatasetRow.__table__)
+
+_typed_stores: Dict[uuid.UUID, TypedRowStore] = {}
+_shard_stores: Dict[Tuple[uuid.UUID, str], RowStore] = {}
+_lock = threading.Lock()
+
+
+def _field_columns(schema: Dict[str, Any]) -> List[Tuple[str, str, Column]]:
+    fields = schema.get("fields", [])
+    names = [field.get("field_name", "") for field in fields]
+    if not all(names) or len(set(names)) != len(names):
+        raise RowStorageError("Typed storage requires unique, non-empty field names")
+    columns = []
+    for i, field in enumerate(fields):
+        name, field_type = field["field_name"], field.get("type", "string")
+        physical = f"field_{name}" if name in _RESERVED_NAMES else name
+        columns.append((name, field_type, Column(physical, _COLUMN_TYPES.get(field_type, String)(), key=f"f{i}")))
+    return columns
+
+
+def _build_typed_store(template: models.Template, metadata: MetaData,
+                       shard: Optional[uuid.UUID] = None) -> TypedRowStore:
+    fields = _field_columns(template.schema_)
+    name = f"rows_{template.id.hex}"
+    table = Table(
+        name, metadata,
+        Column("id", UUID(as_uuid=True), primary_key=True),
+        Column("dataset_id", UUID(as_uuid=True), nullable=False),
+        Column("created_at", DateTime, server_default=func.now()),
+        Column("updated_at", DateTime, server_default=func.now()),
+        *[column for _, _, column in fields],
+        # SQL NULL, а не JSON null: json_patch(..., 'null') обнулил бы всю строку
+        Column("extra", JSON(none_as_null=True)),
+        # Как у dataset_rows: строки датасета, подсчёт и случайный доступ по id
+        Index(f"ix_{name}_dataset_id_id", "dataset_id", "id"),
+        *[
+            Index(f"ix_{name}_{column.name}", "dataset_id", column)
+            for field, (_, _, column) in zip(template.schema_.get("fields", []), fields)
+            if field.get("indexed")
+        ],
+    )
+    return TypedRowStore(table, fields, shard)
+
+
+def _build_json_store(metadata: MetaData, shard: uuid.UUID) -> RowStore:
+    # Копия dataset_rows без внешнего ключа: таблицы datasets в файле шарда нет
+    table = Table(
+        "dataset_rows", metadata,
+        Column("id", UUID(as_uuid=True), primary_key=True),
+        Column("row_data", JSON, nullable=False),
+        Column("created_at", DateTime, server_default=func.now()),
+        Column("updated_at", DateTime, server_default=func.now()),
+        Column("dataset_id", UUID(as_uuid=True), nullable=False),
+        Index("ix_dataset_rows_dataset_id_id", "dataset_id", "id"),
+    )
+    return RowStore(table, shard)
+
+
+def _typed_table(template: models.Template) -> TypedRowStore:
+    with _lock:
+        store = _typed_stores.get(template.id)
+        if store is None:
+            store = _typed_stores[template.id] = _build_typed_store(template, _metadata)
+        return store
+
+
+def store_for_template(template: models.Template) -> RowStore:
+    if getattr(template, "storage", "json") != "typed":
+        return json_store
+    return _typed_table(template)
+
+
+def create_table(db: Session, template: models.Template) -> TypedRowStore:
+    """Создаёт таблицу строк для типизированного шаблона (в транзакции сессии)."""
+    if not TYPED_STORAGE_AVAILABLE:
+        raise RowStorageError("Typed storage is only available with SQLite")
+    store = _typed_table(template)
+    store.table.create(bind=db.connection(), checkfirst=True)
+    return store
+
+
+def _template_mode(db: Session, template_id: uuid.UUID) -> str:
+    return db.query(models.Template.storage).filter(models.Template.id == template_id).scalar() or "json"
+
+
+def _shard_store(db: Session, dataset_id: uuid.UUID, template_id: uuid.UUID, mode: str) -> RowStore:
+    """Хранилище строк в файле датасета; его таблица привязывается к движку шарда в сессии db."""
+    store = _shard_stores.get((dataset_id, mode))
+    if store is None:
+        # У каждого шарда свой MetaData: таблицы разных файлов называются одинаково
+        if mode == "typed":
+            store = _build_typed_store(db.get(models.Template, template_id), MetaData(), shard=dataset_id)
+        else:
+            store = _build_json_store(MetaData(), shard=dataset_id)
+        store.table.create(bind=shards.get_engine(dataset_id), checkfirst=True)
+        store = _shard_stores.setdefault((dataset_id, mode), store)
+    db.bind_table(store.table, shards.get_engine(dataset_id))
+    return store
+
+
+def get_store(db: Session, dataset_id: uuid.UUID) -> RowStore:
+    """
+    Хранилище строк датасета. Вид хранения шаблона и перенос датасета в свой файл
+    читаются из БД один раз за сессию: новая сессия видит перевод шаблона и перенос,
+    выполненные другим процессом, а писатели замечают перенос посреди сессии (moved_to_shard).
+    """
+    cached = db.info.get("row_stores", {}).get(dataset_id)
+    if cached is not None:
+        return cached
+    found = (
+        db.query(models.Dataset.template_id, models.Dataset.isolated, models.Template.storage)
+        .join(models.Template, models.Template.id == models.Dataset.template_id)
+        .filter(models.Dataset.id == dataset_id)
+        .first()
+    )
+    if found is None:
+        return json_store
+    template_id, isolated, mode = found
+    mode = mode or "json"
+    if isolated:
+        store = _shard_store(db, dataset_id, template_id, mode)
+    elif mode != "typed":
+        store = json_store
+    else:
+        store = _typed_stores.get(template_id) or _typed_table(db.get(models.Template, template_id))
+    db.info.setdefault("row_stores", {})[dataset_id] = store
+    return store
+
+
+def forget_store(db: Session, dataset_id: uuid.UUID):
+    """Сбрасывает запомненное в сессии хранилище датасета (после переноса или его отмены)."""
+    db.info.get("row_stores", {}).pop(dataset_id, None)
+
+
+def moved_to_shard(db: Session, dataset_id: uuid.UUID) -> bool:
+    """
+    Перенесён ли датасет в свой файл. Вызывается после вставки в основную БД, до
+    коммита: транзакция уже держит блокировку записи и видит последний перенос.
+    Файл шарда создаётся до отметки isolated, поэтому без файла БД не спрашивается.
+    """
+    if not shards.SHARDS_AVAILABLE or not os.path.exists(shards.path(dataset_id)):
+        return False
+    isolated = bool(db.query(models.Dataset.isolated).filter(models.Dataset.id == dataset_id).scalar())
+    if isolated:
+        forget_store(db, dataset_id)
+    return isolated
+
+
+def drop_shard(dataset_id: uuid.UUID):
+    """Удаляет файл строк датасета (после удаления датасета или прерванного переноса)."""
+    for key in [key for key in _shard_stores if key[0] == dataset_id]:
+        _shard_stores.pop(key, None)
+    shards.remove(dataset_id)
+
+
+def ensure_tables(db: Session):
+    """Создаёт отсутствующие таблицы типизированных шаблонов (шаг миграций)."""
+    for template in db.query(models.Template).filter(models.Template.storage == "typed"):
+        _typed_table(template).table.create(bind=db.connection(), checkfirst=True)
+    db.commit()
+
+
+def _copy_rows(db: Session, source: RowStore, target_db: Session, target: RowStore, dataset_id: uuid.UUID,
+               batch_rows: int, after_rowid: int = 0,
+               convert: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None) -> Tuple[int, int]:
+    """
+    Копирует строки датасета с rowid > after_rowid из source в target в порядке
+    вставки (id и время создания сохраняются). Возвращает (число строк, последний rowid).
+    """
+    columns = list(source.table.c)
+    query = (
+        db.query(source.rowid, *columns)
+        .filter(source.dataset_id == dataset_id, source.rowid > after_rowid)
+        .order_by(source.rowid)
+        .execution_options(yield_per=batch_rows)
+    )
+    copied, last_rowid, batch = 0, after_rowid, []
+    for rowid, *values in query:
+        params = {column.key: value for column, value in zip(columns, values)}
+        batch.append(convert(params) if convert is not None else params)
+        last_rowid = rowid
+        if len(batch) >= batch_rows:
+            target_db.execute(target.table.insert(), batch)
+            copied += len(batch)
+            batch = []
+    if batch:
+        target_db.execute(target.table.insert(), batch)
+        copied += len(batch)
+    return copied, last_rowid
+
+
+# --- Перенос датасета в отдельный файл ---
+
+def isolate_dataset(db: Session, dataset_id: uuid.UUID, batch_rows: int = 5000) -> int:
+    """
+    Переносит строки датасета из основной БД в его файл и возвращает число
+    перенесённых строк. Основная часть копируется без блокировки основной БД;
+    затем отметка isolated берёт блокировку записи, докопируются строки,
+    вставленные за это время, и строки удаляются из основной БД. Писатели,
+    выбравшие основную БД до переноса, замечают его (moved_to_shard) и повторяют вставку.
+    """
+    if not shards.SHARDS_AVAILABLE:
+        raise RowStorageError("Isolated datasets are only available with SQLite")
+    dataset = db.get(models.Dataset, dataset_id)
+    if dataset is None:
+        raise RowStorageError(f"Dataset {dataset_id} not found")
+    if dataset.isolated:
+        return 0
+    template_id = dataset.template_id
+    source = get_store(db, dataset_id)
+    # Остатки прерванного переноса
+    drop_shard(dataset_id)
+    shard_db = Session(bind=shards.get_engine(dataset_id))
+    try:
+        # Шаблон читается из основной БД; в сессии шарда таблица и так привязана к его файлу
+        target = _shard_store(db, dataset_id, template_id, _template_mode(db, template_id))
+        # 1. Основная часть строк — без блокировки записи в основной БД
+        moved, last_rowid = _copy_rows(db, source, shard_db, target, dataset_id, batch_rows)
+        db.rollback()
+        # 2. Отметка берёт блокировку записи; докопируем строки, вставленные за время шага 1
+        db.query(models.Dataset).filter(models.Dataset.id == dataset_id).update(
+            {"isolated": True}, synchronize_session=False)
+        tail, _ = _copy_rows(db, source, shard_db, target, dataset_id, batch_rows, after_rowid=last_rowid)
+        db.execute(source.table.delete().where(source.dataset_id == dataset_id))
+        # 3. Сначала файл шарда: если упадёт коммит основной БД, датасет останется в ней целиком
+        shard_db.commit()
+        db.commit()
+    except BaseException:
+        shard_db.rollback()
+        db.rollback()
+        shard_db.close()
+        drop_shard(dataset_id)
+        raise
+    shard_db.close()
+    forget_store(db, dataset_id)
+    db.expire_all()
+    return moved + tail
+
+
+def isolate_if_large(db: Session, dataset_id: uuid.UUID, incoming_rows: int) -> bool:
+    """Переносит датасет в свой файл перед импортом, если с новыми строками он дорастёт до SHARD_ROW_THRESHOLD."""
+    if not shards.SHARDS_AVAILABLE or shards.SHARD_ROW_THRESHOLD <= 0:
+        return False
+    dataset = db.get(models.Dataset, dataset_id)
+    if dataset is None or dataset.isolated:
+        return False
+    if incoming_rows < shards.SHARD_ROW_THRESHOLD:
+        store = get_store(db, dataset_id)
+        existing = db.query(func.count(store.id)).filter(store.dataset_id == dataset_id).scalar()
+        if existing + incoming_rows < shards.SHARD_ROW_THRESHOLD:
+            return False
+    moved = isolate_dataset(db, dataset_id)
+    print(f"--- Датасет {dataset_id} перенесён в отдельный файл ({moved} строк) ---")
+    return True
+
+
+# --- Перевод шаблона из JSON в типизированные колонки ---
+
+def migrate_template(db: Session, template_id: uuid.UUID, batch_rows: int = 5000) -> int:
+    """
+    Переносит строки всех датасетов шаблона из dataset_rows в его типизированные
+    таблицы (в основной БД и в файлах изолированных датасетов) и возвращает число
+    перенесённых строк. Если хотя бы одно значение не приводится к типу поля,
+    ничего не меняется.
+    """
+    template = db.get(models.Template, template_id)
+    if template is None:
+        raise RowStorageError(f"Template {template_id} not found")
+    if template.storage == "typed":
+        return 0
+    datasets = (
+        db.query(models.Dataset.id, models.Dataset.isolated)
+        .filter(models.Dataset.template_id == template_id)
+        .all()
+    )
+    created: List[Tuple[RowStore, Engine]] = []
+
+    moved = 0
+    try:
+        for dataset_id, isolated in datasets:
+            source = get_store(db, dataset_id)
+            if isolated:
+                target = _shard_store(db, dataset_id, template_id, "typed")
+                created.append((target, shards.get_engine(dataset_id)))
+            else:
+                target = create_table(db, template)
+                created.append((target, engine))
+
+            def convert(params: Dict[str, Any]) -> Dict[str, Any]:
+                row_data = params["row_data"]
+                try:
+                    converted = target.to_params(row_data if isinstance(row_data, dict) else {})
+                except RowValidationError as e:
+                    raise RowValidationError(f"Row {params['id']}: {e}")
+                converted.update(id=params["id"], dataset_id=dataset_id,
+                                 created_at=params["created_at"], updated_at=params["updated_at"])
+                return converted
+
+            # Порядок rowid сохраняется: в новой таблице строки идут в том же порядке вставки
+            count, _ = _copy_rows(db, source, db, target, dataset_id, batch_rows, convert=convert)
+            moved += count
+            db.execute(source.table.delete().where(source.dataset_id == dataset_id))
+        template.storage = "typed"
+        db.commit()
+    except BaseException:
+        db.rollback()
+        for store, bind in created:
+            store.table.drop(bind=bind, checkfirst=True)
+            if store.shard is not None:
+                _shard_stores.pop((store.shard, "typed"), None)
+        raise
+    finally:
+        for dataset_id, _ in datasets:
+            forget_store(db, dataset_id)
+    return moved
+
+
+if __name__ == "__main__":
+    commands = ("migrate", "isolate")
+    if len(sys.argv) != 3 or sys.argv[1] not in commands:
+        print("Использование: python -m app.row_storage migrate <template_id>\n"
+              "               python -m app.row_storage isolate <dataset_id>")
+        sys.exit(2)
+    from .database import SessionLocal
+    from .migrations import run_migrations
+
+    run_migrations()
+    session = SessionLocal()
+    try:
+        if sys.argv[1] == "migrate":
+            count = migrate_template(session, uuid.UUID(sys.argv[2]))
+            print(f"Шаблон {sys.argv[2]} переведён в типизированное хранение, перенесено строк: {count}")
+        else:
+            count = isolate_dataset(session, uuid.UUID(sys.argv[2]))
+            print(f"Датасет {sys.argv[2]} перенесён в отдельный файл, перенесено строк: {count}")
+    except (RowStorageError, RowValidationError) as e:
+        print(f"Операция не выполнена: {e}")
+        sys.exit(1)
+    finally:
+        session.close()
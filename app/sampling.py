@@ -0,0 +1,201 @@
+# app/sampling.py
+"""
+Случайная и стратифицированная выборка строк датасета без полного прохода.
+
+Случайные строки выбираются по rowid SQLite: берутся случайные различные числа из
+диапазона rowid всей таблицы строк (min и max rowid таблицы — поиск по первичному
+ключу, O(log N)), и каждое ищется по первичному ключу. Числа, не попавшие на строку
+датасета (удалённые строки или строки других датасетов в общей таблице),
+отбрасываются, поэтому каждая строка выбирается с одинаковой вероятностью
+независимо от того, как распределены дыры. Сколько чисел тянуть за раунд,
+определяется долей попаданий в прошлых раундах. Если строк датасета в таблице мало
+и за _MAX_ROUNDS раундов выборка не набрана, остаток выбирается из всех id
+датасета (их немного) — тоже равномерно. Без SQLite (нет rowid) выборка всегда
+делается по всем id.
+
+Маленькие датасеты (не больше SMALL_DATASET_ROWS) читаются целиком, и выборка из них точная.
+Стратифицированная выборка — двухфазная: случайная пилотная выборка, по ней
+определяются доли страт, и из каждой страты берётся пропорциональное число строк.
+"""
+import json
+import random
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.orm import Session
+
+from . import row_storage
+from .database import engine
+from .row_storage import RowStore, parse_row_data
+
+# Датасеты не больше этого размера читаются целиком (только id)
+SMALL_DATASET_ROWS = 1000
+# Сколько rowid искать одним SQL-запросом
+_ROWIDS_PER_QUERY = 500
+# Сколько раундов поиска по случайным rowid до перехода к выборке из всех id
+_MAX_ROUNDS = 4
+# Во сколько раз больше rowid тянуть сверх ожидаемого по доле попаданий
+_OVERSAMPLE = 1.2
+# Не больше стольких rowid за раунд на каждую недостающую строку (строк датасета в таблице мало)
+_MAX_DRAWS_PER_ROW = 50
+# Размер пилотной выборки для стратификации: pilot_factor * n, но не меньше min_pilot
+_PILOT_FACTOR = 10
+_MIN_PILOT = 1000
+
+_ROWIDS = engine.dialect.name == "sqlite"
+
+
+def _ids_query(db: Session, store: RowStore, dataset_id: uuid.UUID):
+    return db.query(store.id).filter(store.dataset_id == dataset_id)
+
+
+def _rowid_lookup(db: Session, store: RowStore, dataset_id: uuid.UUID, rowids: List[int]) -> Dict[int, uuid.UUID]:
+    """
+    id строк датасета по rowid. dataset_id проверяется уже в Python: условие на него
+    в запросе могло бы увести SQLite с поиска по первичному ключу на проход по индексу датасета.
+    """
+    statement = (
+        db.query(store.rowid, store.id, store.dataset_id)
+        .filter(store.rowid.in_(bindparam("rowids", expanding=True)))
+    )
+    found = {}
+    for start in range(0, len(rowids), _ROWIDS_PER_QUERY):
+        chunk = rowids[start:start + _ROWIDS_PER_QUERY]
+        for rowid, row_id, row_dataset_id in statement.params(rowids=chunk):
+            if row_dataset_id == dataset_id:
+                found[rowid] = row_id
+    return found
+
+
+def random_row_ids(db: Session, dataset_id: uuid.UUID, n: int, rng: Optional[random.Random] = None) -> List[uuid.UUID]:
+    """Возвращает до n различных id случайных строк датасета (каждая строка равновероятна)."""
+    rng = rng or random.Random()
+    if n <= 0:
+        return []
+    store = row_storage.get_store(db, dataset_id)
+
+    # 1. Маленький датасет: читаем все id и выбираем точно
+    limit = max(SMALL_DATASET_ROWS, 2 * n)
+    head = [row_id for (row_id,) in _ids_query(db, store, dataset_id).limit(limit + 1)]
+    if len(head) <= limit:
+        return rng.sample(head, min(n, len(head)))
+
+    # 2. Большой датасет: случайные rowid из диапазона всей таблицы
+    chosen: Dict[uuid.UUID, None] = {}
+    if _ROWIDS:
+        low, high = db.query(
+            select(func.min(store.rowid)).select_from(store.table).scalar_subquery(),
+            select(func.max(store.rowid)).select_from(store.table).scalar_subquery(),
+        ).one()
+        span = high - low + 1
+        drawn, hits = set(), 0
+        for _ in range(_MAX_ROUNDS):
+            missing = n - len(chosen)
+            if missing <= 0 or len(drawn) >= span:
+                break
+            # Доля строк датасета среди rowid таблицы: до первого раунда считаем, что она близка к 1
+            hit_rate = max(hits / len(drawn), 1 / _MAX_DRAWS_PER_ROW) if drawn else 1.0
+            want = min(int(missing / hit_rate * _OVERSAMPLE) + 1, missing * _MAX_DRAWS_PER_ROW, span - len(drawn))
+            rowids = []
+            while len(rowids) < want:
+                rowid = rng.randrange(low, high + 1)
+                if rowid not in drawn:
+                    drawn.add(rowid)
+                    rowids.append(rowid)
+            # Порядок найденных строк — порядок случайных чисел, а не rowid
+            found = _rowid_lookup(db, store, dataset_id, rowids)
+            hits += len(found)
+            for rowid in rowids:
+                if rowid in found:
+                    chosen.setdefault(found[rowid])
+
+    # 3. Не набрали (или нет rowid): остаток — равномерно из всех ещё не выбранных id
+    if len(chosen) < n:
+        rest = [row_id for (row_id,) in _ids_query(db, store, dataset_id) if row_id not in chosen]
+        chosen.update(dict.fromkeys(rng.sample(rest, min(n - len(chosen), len(rest)))))
+    return list(chosen)[:n]
+
+
+def _stratum_key(row_data: Dict[str, Any], field: str) -> str:
+    # Значение поля может быть любым JSON — для группировки приводим его к строке
+    return json.dumps(row_data.get(field), ensure_ascii=False, sort_keys=True)
+
+
+def _allocate(sizes: Dict[str, int], n: int) -> Dict[str, int]:
+    """
+    Пропорциональное распределение n по стратам (метод наибольших остатков).
+    Если n не меньше числа страт, каждая страта получает хотя бы одну строку.
+    """
+    total = sum(sizes.values())
+    guaranteed = 1 if n >= len(sizes) else 0
+    quotas = {key: guaranteed + (n - guaranteed * len(sizes)) * size / total for key, size in sizes.items()}
+    allocation = {key: min(int(quota), sizes[key]) for key, quota in quotas.items()}
+    by_remainder = sorted(sizes, key=lambda key: quotas[key] - int(quotas[key]), reverse=True)
+    while sum(allocation.values()) < min(n, total):
+        progressed = False
+        for key in by_remainder:
+            if sum(allocation.values()) >= min(n, total):
+                break
+            if allocation[key] < sizes[key]:
+                allocation[key] += 1
+                progressed = True
+        if not progressed:
+            break
+    return allocation
+
+
+def stratified_row_ids(db: Session, dataset_id: uuid.UUID, n: int, field: str,
+                       rng: Optional[random.Random] = None) -> List[uuid.UUID]:
+    """Возвращает до n id строк, распределённых по значениям поля field пропорционально их долям."""
+    rng = rng or random.Random()
+    if n <= 0:
+        return []
+
+    # 1. Пилотная выборка и значения поля для её строк
+    pilot_ids = random_row_ids(db, dataset_id, max(_PILOT_FACTOR * n, _MIN_PILOT), rng)
+    strata: Dict[str, List[uuid.UUID]] = defaultdict(list)
+    for row_id, raw in get_raw_rows(db, pilot_ids, columns="data", dataset_id=dataset_id):
+        row_data = parse_row_data(raw)
+        strata[_stratum_key(row_data if isinstance(row_data, dict) else {}, field)].append(row_id)
+    if not strata:
+        return []
+
+    # 2. Распределяем n по стратам и выбираем строки внутри каждой
+    allocation = _allocate({key: len(ids) for key, ids in strata.items()}, n)
+    sample = []
+    for key, ids in strata.items():
+        sample.extend(rng.sample(ids, allocation[key]))
+    rng.shuffle(sample)
+    return sample
+
+
+def get_raw_rows(db: Session, row_ids: List[uuid.UUID], columns: str = "full",
+                 dataset_id: Optional[uuid.UUID] = None):
+    """
+    Читает строки по списку id кортежами, сохраняя порядок списка.
+    columns="full" — (id, dataset_id, created_at, row_data), columns="data" — (id, row_data);
+    row_data — исходный JSON-текст из БД. dataset_id нужен для датасетов типизированных
+    шаблонов и изолированных датасетов.
+    """
+    store = row_storage.get_store(db, dataset_id) if dataset_id is not None else row_storage.json_store
+    selected = (store.id, store.dataset_id, store.created_at) if columns == "full" else (store.id,)
+    found = {}
+    for start in range(0, len(row_ids), 500):
+        chunk = row_ids[start:start + 500]
+        query = db.query(*selected, store.row_data).filter(store.id.in_(chunk))
+        for values in query:
+            found[values[0]] = tuple(values)
+    return [found[row_id] for row_id in row_ids if row_id in found]
+
+
+def sample_row_ids(db: Session, dataset_id: uuid.UUID, n: int, strategy: str = "random",
+                   by: Optional[str] = None, seed: Optional[int] = None) -> List[uuid.UUID]:
+    """Единая точка входа: случайная или стратифицированная (по полю by) выборка id строк."""
+    rng = random.Random(seed)
+    if strategy == "stratified":
+        if not by:
+            raise ValueError("Stratified sampling requires a field to stratify by")
+        return stratified_row_ids(db, dataset_id, n, by, rng)
+    return random_row_ids(db, dataset_id, n, rng)
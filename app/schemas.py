@@ -3,7 +3,7 @@
 import uuid
 from datetime import datetime
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Literal
 
 
 
@@ -18,6 +18,9 @@ class TemplateBase(BaseModel):
 
     ui_hints: Dict[str, Any] | None = None
 
+    # "typed" — строки хранятся в отдельной таблице с колонкой на каждое поле (только SQLite)
+    storage: Literal["json", "typed"] = "json"
+
     model_config = ConfigDict(
         populate_by_name=True,
         json_schema_extra={
@@ -99,17 +102,37 @@ class DatasetBase(BaseModel):
 
 class DatasetCreate(DatasetBase):
     template_id: uuid.UUID
+    isolated: bool = False # строки в отдельном файле SQLite (app/shards.py)
 
 class Dataset(DatasetBase):
     id: uuid.UUID
     owner_id: uuid.UUID
     template_id: uuid.UUID
+    isolated: bool = False
     created_at: datetime
     template: Template
 
     class Config:
         from_attributes = True
 
+class DatasetColumnStats(BaseModel):
+    field_name: str
+    kind: str | None = None # "int64", "float64", "number" (целые и дробные), "bool", "string"; None — в колонке только пропуски
+    count: int
+    nulls: int
+    min: int | float | None = None
+    max: int | float | None = None
+    mean: float | None = None
+    std: float | None = None
+    true_count: int | None = None
+    distinct: int | None = None
+    top: List[Dict[str, Any]] | None = None # самые частые значения строковой колонки
+
+class DatasetStats(BaseModel):
+    dataset_id: uuid.UUID
+    row_count: int
+    columns: List[DatasetColumnStats]
+
 # --- Схемы для сервиса Veritas ---
 
 class VeritasEvidence(BaseModel):
@@ -120,4 +143,38 @@ class VeritasEvidence(BaseModel):
 class VeritasResponse(BaseModel):
     request_id: uuid.UUID
     authenticity_score: int = Field(..., ge=0, le=100)
-    evidence: List[VeritasEvidence]
\ No newline at end of file
+    evidence: List[VeritasEvidence]
+    # Поля приближённого режима (mode=approx)
+    approximate: bool | None = None
+    score_interval: Tuple[int, int] | None = None # 95% бутстреп-интервал оценки
+    feature_intervals: Dict[str, Tuple[float, float]] | None = None
+    rows_read: int | None = None
+    sample_rows: int | None = None
+    fraction_read: float | None = None # доля файла (по байтам), которая была прочитана
+
+class VeritasJob(BaseModel):
+    job_id: uuid.UUID
+    status: str # "pending", "running", "done", "failed"
+    result: VeritasResponse | None = None
+    error: str | None = None
+
+class QueuedJob(BaseModel):
+    job_id: uuid.UUID
+    kind: str # "import_csv", "import_xlsx", "veritas_file"
+    status: str # "queued", "running", "done", "failed"
+    result: Dict[str, Any] | None = None
+    error: str | None = None
+    attempts: int
+    created_at: datetime | None = None
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+class VeritasModelStatus(BaseModel):
+    path: str
+    loaded: bool
+    version: str | None = None
+    loaded_at: datetime | None = None
+    load_seconds: float | None = None
+    feature_count: int | None = None
+    mmap_mode: str | None = None
+    error: str | None = None
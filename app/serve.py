@@ -0,0 +1,219 @@
+# app/serve.py
+"""
+Запуск API в нескольких процессах-воркерах: `python -m app.serve`.
+
+Один процесс упирается в GIL: разбор JSON, pandas-часть импорта и сериализация
+ответов выполняются по очереди. Здесь мастер один раз готовит всё общее —
+схему БД, возврат прерванных задач в очередь, импорт тяжёлых модулей и модели
+Veritas, — затем открывает сокет и форкает WEB_CONCURRENCY воркеров uvicorn,
+которые принимают соединения с этого общего сокета. Модули и модель, загруженные
+до форка, делятся между воркерами через copy-on-write (gc.freeze не даёт сборщику
+мусора «трогать» эти страницы и копировать их в каждый воркер).
+
+Общее состояние воркеров живёт в БД (SQLite в режиме WAL): очередь задач
+(app/job_queue.py), признаки датасетов, пользователи. Кэш результатов и метрики у
+каждого воркера свои.
+
+Мастер перезапускает упавших воркеров и возвращает в очередь их незавершённые
+задачи. SIGTERM/SIGINT передаются воркерам для штатной остановки.
+
+Без os.fork (Windows) запускается обычный однопроцессный uvicorn.
+"""
+import os
+import gc
+import sys
+import signal
+import socket
+import time
+from typing import Dict
+
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "8000"))
+# Сколько ждать штатной остановки воркеров перед SIGKILL
+WEB_GRACEFUL_TIMEOUT_S = float(os.getenv("WEB_GRACEFUL_TIMEOUT_S", "30"))
+
+
+def available_cpus() -> int:
+    """Число ядер, доступных процессу: с учётом привязки к CPU и квоты cgroup (контейнеры)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<квота> <период>" или "max <период>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: квота -1 — без ограничения
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota)))
+    return max(1, cpus)
+
+
+CPUS = available_cpus()
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0")) or CPUS
+
+# Ядра делятся между воркерами: иначе у каждого был бы пул Veritas на все ядра.
+# Выставляется до импорта приложения, потому что executor читает его при импорте
+os.environ.setdefault("VERITAS_WORKERS", str(max(1, CPUS // WEB_CONCURRENCY)))
+
+
+def _prepare():
+    """Общая подготовка в мастере до форка воркеров."""
+    from . import startup, job_queue
+    from .main import app, _warm_up
+    from .migrations import run_migrations, RUN_MIGRATIONS_ON_STARTUP
+    from .database import SessionLocal, engine
+
+    # 1. Схема БД и задачи с истёкшей арендой, прерванные прошлым запуском
+    if RUN_MIGRATIONS_ON_STARTUP:
+        run_migrations()
+    db = SessionLocal()
+    try:
+        requeued = job_queue.requeue_running(db)
+    finally:
+        db.close()
+    if requeued:
+        print(f"--- В очередь возвращено прерванных задач: {requeued} ---")
+
+    # 2. Тяжёлые модули и модель загружаются один раз и делятся с воркерами
+    _warm_up()
+    gc.freeze()
+
+    # 3. Соединения с БД не должны переходить в дочерние процессы
+    engine.dispose()
+    startup.prepared_by_master = True
+    return app
+
+
+def _bind() -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in WEB_HOST else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((WEB_HOST, WEB_PORT))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket):
+    import uvicorn
+
+    # Сигналы мастера сбрасываются: воркер обрабатывает их сам через uvicorn
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app, host=WEB_HOST, port=WEB_PORT, workers=1)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(app, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(app, sock)
+        except BaseException as e:
+            print(f"!!! Воркер {os.getpid()} завершился с ошибкой: {e}")
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+    return pid
+
+
+def _requeue_worker_jobs(pid: int):
+    from . import job_queue
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        requeued = job_queue.requeue_running(db, worker=f"{socket.gethostname()}:{pid}")
+    finally:
+        db.close()
+    if requeued:
+        print(f"--- Задачи упавшего воркера {pid} возвращены в очередь: {requeued} ---")
+
+
+def serve():
+    if not hasattr(os, "fork"):
+        import uvicorn
+        uvicorn.run("app.main:app", host=WEB_HOST, port=WEB_PORT)
+        return
+
+    app = _prepare()
+    sock = _bind()
+    print(f"--- Мастер {os.getpid()}: {WEB_CONCURRENCY} воркеров на http://{WEB_HOST}:{WEB_PORT} "
+          f"(ядер: {CPUS}, VERITAS_WORKERS={os.environ['VERITAS_WORKERS']}) ---")
+
+    workers: Dict[int, int] = {}  # pid -> номер слота
+    for slot in range(WEB_CONCURRENCY):
+        workers[_spawn(app, sock)] = slot
+
+    stopping = {"signal": None}
+
+    def handle_stop(signum, frame):
+        stopping["signal"] = signum
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+
+    # 1. Пока нет сигнала остановки — перезапускаем упавших воркеров
+    while stopping["signal"] is None:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.2)
+            continue
+        slot = workers.pop(pid, None)
+        if slot is None:
+            continue
+        print(f"!!! Воркер {pid} неожиданно завершился (статус {status}), перезапуск")
+        try:
+            _requeue_worker_jobs(pid)
+        except Exception as e:
+            print(f"!!! Не удалось вернуть задачи воркера {pid} в очередь: {e}")
+        workers[_spawn(app, sock)] = slot
+
+    # 2. Штатная остановка: сигнал воркерам, ожидание, затем SIGKILL оставшимся
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + WEB_GRACEFUL_TIMEOUT_S
+    while workers and time.monotonic() < deadline:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.1)
+            continue
+        workers.pop(pid, None)
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    sock.close()
+    print("--- Мастер остановлен ---")
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,79 @@
+# app/shards.py
+"""
+Отдельные файлы SQLite для строк больших датасетов.
+
+Все датасеты в одном файле делят одну блокировку записи и один WAL: импорт
+миллионов строк одной командой тормозит запись у всех, а удалённый большой
+датасет оставляет в файле гигабайты свободных страниц до VACUUM. Поэтому строки
+датасета, созданного с isolated=true или выросшего при импорте до
+SHARD_ROW_THRESHOLD строк, хранятся в собственном файле SHARD_DIR/dataset_<id>.db
+(«шард»). Пользователи, шаблоны, датасеты, очередь задач и признаки Veritas
+остаются в основной БД.
+
+Запись в разные шарды идёт параллельно (у каждого файла своя блокировка), а
+удаление такого датасета — удаление файла.
+
+У каждого шарда свой движок SQLAlchemy; row_storage привязывает таблицу строк
+шарда к этому движку в сессии (Session.bind_table), поэтому запросы к строкам
+пишутся так же, как для основной БД. Соединения с шардом не держатся в пуле:
+файлов может быть много, а открытие файла SQLite дешевле HTTP-запроса.
+"""
+import os
+import uuid
+import threading
+from typing import Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
+
+from . import query_stats
+from .database import engine
+
+# Шарды — отдельные файлы SQLite, поэтому доступны только при SQLite в основной БД
+SHARDS_AVAILABLE = engine.dialect.name == "sqlite"
+SHARD_DIR = os.getenv("SHARD_DIR", "shards")
+# Датасет, который при импорте дорастёт до стольких строк, переносится в свой файл (0 — только isolated=true)
+SHARD_ROW_THRESHOLD = int(os.getenv("SHARD_ROW_THRESHOLD", "1000000"))
+
+_engines: Dict[uuid.UUID, Engine] = {}
+_lock = threading.Lock()
+
+
+def path(dataset_id: uuid.UUID) -> str:
+    return os.path.join(SHARD_DIR, f"dataset_{dataset_id.hex}.db")
+
+
+def get_engine(dataset_id: uuid.UUID) -> Engine:
+    """Движок файла строк датасета (файл создаётся при первом соединении)."""
+    shard_engine = _engines.get(dataset_id)
+    if shard_engine is not None:
+        return shard_engine
+    with _lock:
+        shard_engine = _engines.get(dataset_id)
+        if shard_engine is None:
+            os.makedirs(SHARD_DIR, exist_ok=True)
+            shard_engine = create_engine(f"sqlite:///{path(dataset_id)}",
+                                         connect_args={"check_same_thread": False}, poolclass=NullPool)
+            # Те же PRAGMA, что у основной БД (WAL, busy_timeout), и учёт запросов в статистике HTTP-запроса
+            from .database import _sqlite_pragmas
+            event.listen(shard_engine, "connect", _sqlite_pragmas)
+            query_stats.install(shard_engine)
+            _engines[dataset_id] = shard_engine
+        return shard_engine
+
+
+def remove(dataset_id: uuid.UUID):
+    """
+    Удаляет файл строк датасета. Читатели, уже открывшие файл, дочитают его
+    (в Linux удалённый файл живёт до закрытия последнего дескриптора).
+    """
+    with _lock:
+        shard_engine = _engines.pop(dataset_id, None)
+    if shard_engine is not None:
+        shard_engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.unlink(path(dataset_id) + suffix)
+        except FileNotFoundError:
+            pass
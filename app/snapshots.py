@@ -0,0 +1,713 @@
+# app/snapshots.py
+"""
+Колоночные снимки датасетов на диске для аналитики и экспорта.
+
+Аналитическое чтение (экспорт, статистика, пересборка признаков Veritas) раньше
+разбирало JSON row_data каждой строки. Снимок хранит те же данные по колонкам
+шаблона:
+
+- числа и булевы значения — типизированные массивы NumPy (int64, float64, uint8);
+  колонка, где встречаются и целые, и дробные числа (number), хранится как float64
+  с битовой маской целых, чтобы экспорт отдавал 5, а не 5.0;
+- строки — словарь уникальных значений (UTF-8 подряд + смещения) и коды int32;
+- пропуски — битовая маска (np.packbits) для каждой колонки.
+
+Файлы открываются через np.memmap, поэтому чтение колонки — это чтение страниц
+файла без разбора и копирования, а полный проход по числовой колонке идёт со
+скоростью памяти.
+
+Версия снимка — число строк и водяной знак: максимальный rowid строки SQLite,
+вошедшей в снимок. Строки датасета только добавляются, поэтому снимок, даже
+отставший, — точная копия начала датасета, а строки после водяного знака читаются
+из БД (Snapshot.new_rows).
+
+Снимки собирает и дописывает очередь задач (задача snapshot_refresh, app/job_queue.py):
+get_snapshot не ждёт блокировку и не считает строки в БД, а лишь открывает готовый
+снимок и, если его нет, он устарел или за ним есть новые строки, ставит задачу в
+очередь. Пока снимка нет, вызывающий код читает строки из БД. Задача дописывает в
+конец файлов новые строки. Снимок собирается заново, если строк стало меньше ожидаемого
+(удаление), изменились поля шаблона или таблица строк (перевод шаблона в
+типизированное хранение, app/row_storage.py), или значения не помещаются в тип колонки
+(например, в целочисленной колонке появилась дробь). Новая сборка пишется в
+следующее поколение (каталог g<N>), а meta.json переключается атомарно, так что
+читатели всегда видят согласованный снимок.
+
+Снимки опираются на rowid, поэтому работают только с SQLite; для других БД
+get_snapshot возвращает None, и вызывающий код читает строки из БД как раньше.
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import orjson
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models, job_queue
+from .database import SessionLocal, engine
+from .row_storage import RowStore, get_store, parse_row_data
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса
+    fcntl = None
+
+SNAPSHOTS_ENABLED = (
+    os.getenv("SNAPSHOTS_ENABLED", "true").lower() in ("1", "true", "yes")
+    and engine.dialect.name == "sqlite"
+)
+# Абсолютный путь: воркеры и задачи очереди не зависят от текущего каталога процесса
+SNAPSHOT_DIR = os.path.abspath(os.getenv("SNAPSHOT_DIR", "snapshots"))
+# Сколько строк читать из БД и кодировать за один раз
+SNAPSHOT_BATCH_ROWS = int(os.getenv("SNAPSHOT_BATCH_ROWS", "20000"))
+# Не ставить обновление снимка одного датасета в очередь чаще раза в столько секунд
+SNAPSHOT_REQUEST_INTERVAL_S = float(os.getenv("SNAPSHOT_REQUEST_INTERVAL_S", "60"))
+
+_FORMAT = 2
+# Типы колонок в порядке расширения: None (одни пропуски) -> bool | int64 | float64 -> number -> string
+_NUMPY_TYPES = {"bool": np.uint8, "int64": np.int64, "float64": np.float64, "number": np.float64}
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+# Целые, которые float64 хранит точно: колонка number с целыми больше становится строковой
+_FLOAT_EXACT_INT = 1 << 53
+
+_locks: Dict[uuid.UUID, threading.Lock] = {}
+_locks_guard = threading.Lock()
+_opened: Dict[uuid.UUID, "Snapshot"] = {}
+_requested: Dict[uuid.UUID, float] = {}
+
+
+class _KindChanged(Exception):
+    """Значения не помещаются в тип колонки снимка — нужна сборка с более широким типом."""
+
+    def __init__(self, kinds: Dict[str, Optional[str]]):
+        self.kinds = kinds
+
+
+# --- Типы колонок ---
+
+def _value_kind(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int64" if _INT64_MIN <= value <= _INT64_MAX else "string"
+    if isinstance(value, float):
+        return "float64"
+    return "string"
+
+
+def _merge_kinds(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    if {a, b} <= {"int64", "float64", "number"}:
+        return "number"
+    return "string"
+
+
+def _infer_kind(values: List[Any], kind: Optional[str] = None) -> Optional[str]:
+    long_int = False
+    for value in values:
+        kind = _merge_kinds(kind, _value_kind(value))
+        if kind == "string":
+            break
+        if type(value) is int and abs(value) > _FLOAT_EXACT_INT:
+            long_int = True
+    # В колонке number целые хранятся как float64 и должны остаться точными
+    if kind == "number" and long_int:
+        return "string"
+    return kind
+
+
+def _as_text(value: Any) -> str:
+    # Вложенные объекты и списки храним как JSON-текст (так же их видят признаки Veritas)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return value if isinstance(value, str) else str(value)
+
+
+# --- Пути и метаданные ---
+
+def _dataset_dir(dataset_id: uuid.UUID) -> str:
+    return os.path.join(SNAPSHOT_DIR, str(dataset_id))
+
+
+def _generation_dir(dataset_id: uuid.UUID, generation: int) -> str:
+    return os.path.join(_dataset_dir(dataset_id), f"g{generation}")
+
+
+def _column_path(directory: str, index: int, suffix: str) -> str:
+    return os.path.join(directory, f"c{index}.{suffix}")
+
+
+def _read_meta(dataset_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(_dataset_dir(dataset_id), "meta.json"), "rb") as f:
+            meta = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    return meta if meta.get("format") == _FORMAT else None
+
+
+def _write_meta(dataset_id: uuid.UUID, meta: Dict[str, Any]):
+    path = os.path.join(_dataset_dir(dataset_id), "meta.json")
+    with open(path + ".tmp", "wb") as f:
+        f.write(orjson.dumps(meta))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+class _DatasetLock:
+    """Один писатель снимка датасета: поток внутри процесса и процесс среди воркеров."""
+
+    def __init__(self, dataset_id: uuid.UUID):
+        with _locks_guard:
+            self._thread_lock = _locks.setdefault(dataset_id, threading.Lock())
+        self._path = os.path.join(SNAPSHOT_DIR, f"{dataset_id}.lock")
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            if fcntl is not None:
+                os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+                self._file = open(self._path, "a")
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+        self._thread_lock.release()
+
+
+# --- Запись ---
+
+class _ColumnWriter:
+    """Дописывает значения одной колонки в файлы поколения снимка."""
+
+    def __init__(self, directory: str, index: int, column: Dict[str, Any], row_count: int):
+        self.directory = directory
+        self.index = index
+        self.column = column
+        self.kind = column["kind"]
+        self.row_count = row_count
+        self._masks: List[np.ndarray] = []
+        self._ints: List[np.ndarray] = []
+        self._new_strings: List[str] = []
+        self._codes: Optional[Dict[str, int]] = None
+
+        # Хвост, оставшийся от прерванной записи, отрезается: верны только длины из meta.json
+        if self.kind in _NUMPY_TYPES:
+            self._truncate("values", row_count * np.dtype(_NUMPY_TYPES[self.kind]).itemsize)
+        elif self.kind == "string":
+            self._truncate("codes", row_count * 4)
+            self._truncate("dict", column.get("dict_bytes", 0))
+            self._truncate("offsets", (column.get("dict_size", 0) + 1) * 8)
+
+    def _path(self, suffix: str) -> str:
+        return _column_path(self.directory, self.index, suffix)
+
+    def _truncate(self, suffix: str, size: int):
+        path = self._path(suffix)
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        if os.path.getsize(path) != size:
+            os.truncate(path, size)
+
+    def _append(self, suffix: str, data: bytes):
+        with open(self._path(suffix), "ab") as f:
+            f.write(data)
+
+    def _dictionary_codes(self) -> Dict[str, int]:
+        if self._codes is None:
+            # Код 0 зарезервирован за пропуском, коды значений начинаются с 1
+            dictionary = _read_dictionary(self.directory, self.index, self.column)
+            self._codes = {value: code for code, value in enumerate(dictionary, 1)}
+        return self._codes
+
+    def append(self, values: List[Any]):
+        mask = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+        self._masks.append(mask)
+        if self.kind in _NUMPY_TYPES:
+            array = np.array([0 if value is None else value for value in values], dtype=_NUMPY_TYPES[self.kind])
+            self._append("values", array.tobytes())
+            if self.kind == "number":
+                self._ints.append(np.fromiter((type(value) is int for value in values), dtype=bool, count=len(values)))
+        elif self.kind == "string":
+            codes = self._dictionary_codes()
+            encoded = np.empty(len(values), dtype=np.int32)
+            for i, value in enumerate(values):
+                if value is None:
+                    encoded[i] = 0
+                    continue
+                text = _as_text(value)
+                code = codes.get(text)
+                if code is None:
+                    code = codes[text] = len(codes) + 1
+                    self._new_strings.append(text)
+                encoded[i] = code
+            self._append("codes", encoded.tobytes())
+        self.row_count += len(values)
+
+    def close(self):
+        """Дописывает словарь и маску пропусков; возвращает описание колонки для meta.json."""
+        if self.kind == "string" and self._new_strings:
+            chunks = [text.encode("utf-8") for text in self._new_strings]
+            dict_bytes = self.column.get("dict_bytes", 0)
+            # Файл смещений уже начинается с 0 (см. __init__), дописываются концы новых значений
+            offsets = dict_bytes + np.cumsum([len(chunk) for chunk in chunks], dtype=np.int64)
+            self._append("dict", b"".join(chunks))
+            self._append("offsets", offsets.tobytes())
+            self.column = dict(self.column, dict_size=self.column.get("dict_size", 0) + len(chunks),
+                               dict_bytes=int(offsets[-1]))
+
+        previous_rows = self.row_count - sum(len(mask) for mask in self._masks)
+        self._rewrite_mask("nulls", previous_rows, self._masks)
+        if self.kind == "number":
+            self._rewrite_mask("ints", previous_rows, self._ints)
+        return self.column
+
+    def _rewrite_mask(self, suffix: str, previous_rows: int, masks: List[np.ndarray]):
+        # Маска переписывается целиком: упакованные биты нельзя просто дописать
+        masks = [_read_mask(self.directory, self.index, previous_rows, suffix)] + masks
+        path = self._path(suffix)
+        with open(path + ".tmp", "wb") as f:
+            f.write(np.packbits(np.concatenate(masks)).tobytes())
+        os.replace(path + ".tmp", path)
+
+
+def _iter_new_rows(db: Session, store: RowStore, dataset_id: uuid.UUID,
+                   after_rowid: int) -> Iterator[List[Tuple[int, Any]]]:
+    """Строки датасета с rowid больше after_rowid в порядке rowid, пачками (rowid, row_data)."""
+    query = (
+        db.query(store.rowid, store.row_data)
+        .filter(store.dataset_id == dataset_id, store.rowid > after_rowid)
+        .order_by(store.rowid)
+        .execution_options(yield_per=SNAPSHOT_BATCH_ROWS)
+    )
+    batch = []
+    for rowid, raw in query:
+        batch.append((rowid, parse_row_data(raw)))
+        if len(batch) >= SNAPSHOT_BATCH_ROWS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _write_rows(db: Session, store: RowStore, dataset_id: uuid.UUID, meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Дописывает в поколение meta все строки после водяного знака и возвращает новые метаданные."""
+    directory = _generation_dir(dataset_id, meta["generation"])
+    columns = meta["columns"]
+    writers = None
+    row_count, watermark = meta["row_count"], meta["watermark"]
+
+    for batch in _iter_new_rows(db, store, dataset_id, watermark):
+        records = [data if isinstance(data, dict) else {} for _, data in batch]
+        values = [[record.get(column["name"]) for record in records] for column in columns]
+
+        # Значения не помещаются в тип колонки — снимок собирается заново с расширенными типами
+        kinds = {column["name"]: _infer_kind(column_values, column["kind"])
+                 for column, column_values in zip(columns, values)}
+        if any(kinds[column["name"]] != column["kind"] for column in columns):
+            if writers is not None or row_count > 0:
+                raise _KindChanged(kinds)
+            # В пустое поколение ещё ничего не записано — тип можно просто расширить
+            columns = [dict(column, kind=kinds[column["name"]]) for column in columns]
+
+        if writers is None:
+            writers = [_ColumnWriter(directory, i, column, row_count) for i, column in enumerate(columns)]
+        for writer, column_values in zip(writers, values):
+            writer.append(column_values)
+        row_count += len(batch)
+        watermark = batch[-1][0]
+
+    if writers is None:
+        return meta
+    return dict(meta, row_count=row_count, watermark=watermark,
+                columns=[writer.close() for writer in writers])
+
+
+def _build(db: Session, store: RowStore, dataset_id: uuid.UUID, field_names: List[str],
+           previous: Optional[Dict[str, Any]], kinds: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+    """Собирает снимок заново в новом поколении; типы колонок расширяются по мере чтения строк."""
+    generation = (previous or {}).get("generation", 0) + 1
+    kinds = dict(kinds or {})
+    while True:
+        directory = _generation_dir(dataset_id, generation)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        meta = {
+            "format": _FORMAT,
+            "generation": generation,
+            # Таблица, чьи rowid служат водяным знаком (меняется при переводе шаблона в типизированный вид)
+            "table": store.name,
+            "field_names": field_names,
+            "row_count": 0,
+            "watermark": 0,
+            # Без подсказки колонка начинается с самого узкого типа и расширяется при пересборке
+            "columns": [{"name": name, "kind": kinds.get(name)} for name in field_names],
+        }
+        try:
+            return _write_rows(db, store, dataset_id, meta)
+        except _KindChanged as e:
+            kinds = {name: _merge_kinds(kinds.get(name), kind) for name, kind in e.kinds.items()}
+            generation += 1
+
+
+def _remove_old_generations(dataset_id: uuid.UUID, generation: int):
+    root = _dataset_dir(dataset_id)
+    for name in os.listdir(root):
+        if name.startswith("g") and name[1:].isdigit() and int(name[1:]) != generation:
+            # Открытые читателями memmap продолжают работать (в Windows каталог удалится в следующий раз)
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def _row_stats(db: Session, store: RowStore, dataset_id: uuid.UUID,
+               after_rowid: Optional[int] = None) -> Tuple[int, int]:
+    query = db.query(func.count(), func.coalesce(func.max(store.rowid), 0)).filter(store.dataset_id == dataset_id)
+    if after_rowid is not None:
+        query = query.filter(store.rowid > after_rowid)
+    count, max_rowid = query.one()
+    return count, max_rowid
+
+
+def refresh(db: Session, dataset: models.Dataset) -> Optional[Dict[str, Any]]:
+    """
+    Приводит снимок датасета в соответствие с БД: ничего не делает, если он актуален,
+    дописывает новые строки или собирает заново. Возвращает метаданные снимка.
+    """
+    if not SNAPSHOTS_ENABLED:
+        return None
+    field_names = _field_names(dataset)
+
+    with _DatasetLock(dataset.id):
+        os.makedirs(_dataset_dir(dataset.id), exist_ok=True)
+        meta = _read_meta(dataset.id)
+        store = get_store(db, dataset.id)
+        count, max_rowid = _row_stats(db, store, dataset.id)
+
+        # 1. Снимок актуален
+        if meta is not None and meta["field_names"] == field_names and meta.get("table") == store.name:
+            if meta["row_count"] == count and meta["watermark"] == max_rowid:
+                return meta
+            # 2. Только добавленные строки: дописываем их в текущее поколение
+            new_count, _ = _row_stats(db, store, dataset.id, after_rowid=meta["watermark"])
+            if meta["row_count"] + new_count == count:
+                try:
+                    updated = _write_rows(db, store, dataset.id, meta)
+                    _write_meta(dataset.id, updated)
+                    return updated
+                except _KindChanged as e:
+                    kinds = {column["name"]: _merge_kinds(column["kind"], e.kinds.get(column["name"]))
+                             for column in meta["columns"]}
+                    print(f"--- Снимок датасета {dataset.id}: тип колонки расширен, пересборка ---")
+                    updated = _build(db, store, dataset.id, field_names, meta, kinds)
+                    _write_meta(dataset.id, updated)
+                    _remove_old_generations(dataset.id, updated["generation"])
+                    return updated
+
+        # 3. Первая сборка, удалённые строки или изменённый шаблон
+        print(f"--- Сборка колоночного снимка датасета {dataset.id} ---")
+        updated = _build(db, store, dataset.id, field_names, meta)
+        _write_meta(dataset.id, updated)
+        _remove_old_generations(dataset.id, updated["generation"])
+        return updated
+
+
+def _field_names(dataset: models.Dataset) -> List[str]:
+    return [field.get("field_name", "") for field in dataset.template.schema_.get("fields", [])]
+
+
+def request_refresh(dataset_id: uuid.UUID):
+    """Ставит сборку или дописывание снимка в очередь задач (не чаще раза в SNAPSHOT_REQUEST_INTERVAL_S)."""
+    now = time.monotonic()
+    with _locks_guard:
+        requested = _requested.get(dataset_id)
+        if requested is not None and now - requested < SNAPSHOT_REQUEST_INTERVAL_S:
+            return
+        _requested[dataset_id] = now
+    # Своя сессия: коммит задачи не должен сбрасывать объекты сессии запроса
+    db = SessionLocal()
+    try:
+        job_queue.enqueue(db, "snapshot_refresh", {"dataset_id": str(dataset_id)})
+    finally:
+        db.close()
+
+
+def delete_snapshot(dataset_id: uuid.UUID):
+    """Удаляет снимок датасета (например, вместе с самим датасетом)."""
+    lock = _DatasetLock(dataset_id)
+    with lock:
+        _opened.pop(dataset_id, None)
+        shutil.rmtree(_dataset_dir(dataset_id), ignore_errors=True)
+        # Файл блокировки удалённого датасета больше не нужен
+        if lock._file is not None:
+            os.unlink(lock._path)
+    with _locks_guard:
+        _locks.pop(dataset_id, None)
+        _requested.pop(dataset_id, None)
+
+
+# --- Чтение ---
+
+def _memmap(path: str, dtype, count: int) -> np.ndarray:
+    # np.memmap не открывает пустые файлы
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+def _read_mask(directory: str, index: int, row_count: int, suffix: str = "nulls") -> np.ndarray:
+    if row_count == 0:
+        return np.zeros(0, dtype=bool)
+    packed = _memmap(_column_path(directory, index, suffix), np.uint8, (row_count + 7) // 8)
+    return np.unpackbits(packed, count=row_count).astype(bool)
+
+
+def _read_dictionary(directory: str, index: int, column: Dict[str, Any]) -> List[str]:
+    size = column.get("dict_size", 0)
+    if size == 0:
+        return []
+    offsets = _memmap(_column_path(directory, index, "offsets"), np.int64, size + 1)
+    with open(_column_path(directory, index, "dict"), "rb") as f:
+        data = f.read(column["dict_bytes"])
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(size)]
+
+
+class SnapshotColumn:
+    """Колонка снимка: значения (или коды словаря) и маска пропусков как memmap."""
+
+    def __init__(self, directory: str, index: int, column: Dict[str, Any], row_count: int):
+        self.name = column["name"]
+        self.kind = column["kind"]
+        self.row_count = row_count
+        self._directory = directory
+        self._index = index
+        self._column = column
+        self._nulls: Optional[np.ndarray] = None
+        self._ints: Optional[np.ndarray] = None
+        self._dictionary: Optional[np.ndarray] = None
+        self.raw: Optional[np.ndarray] = None
+        if self.kind in _NUMPY_TYPES:
+            self.raw = _memmap(_column_path(directory, index, "values"), _NUMPY_TYPES[self.kind], row_count)
+            if self.kind == "bool":
+                self.raw = self.raw.view(bool)
+        elif self.kind == "string":
+            self.raw = _memmap(_column_path(directory, index, "codes"), np.int32, row_count)
+
+    @property
+    def nulls(self) -> np.ndarray:
+        """Маска пропусков (True — значения нет)."""
+        if self._nulls is None:
+            if self.kind is None:
+                self._nulls = np.ones(self.row_count, dtype=bool)
+            else:
+                self._nulls = _read_mask(self._directory, self._index, self.row_count)
+        return self._nulls
+
+    @property
+    def ints(self) -> np.ndarray:
+        """Маска целых в колонке number (True — значение было целым)."""
+        if self._ints is None:
+            if self.kind == "number":
+                self._ints = _read_mask(self._directory, self._index, self.row_count, "ints")
+            else:
+                self._ints = np.full(self.row_count, self.kind == "int64")
+        return self._ints
+
+    @property
+    def dictionary(self) -> np.ndarray:
+        """Значения строковой колонки по кодам; элемент 0 — пропуск (None)."""
+        if self._dictionary is None:
+            values = _read_dictionary(self._directory, self._index, self._column)
+            dictionary = np.empty(len(values) + 1, dtype=object)
+            dictionary[1:] = values
+            self._dictionary = dictionary
+        return self._dictionary
+
+    def to_numpy(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        Значения колонки так же, как их дал бы DataFrame из row_data: без пропусков —
+        срез memmap без копирования; с пропусками — float64 с NaN или object с None.
+        """
+        stop = self.row_count if stop is None else min(stop, self.row_count)
+        if self.kind is None:
+            return np.full(max(0, stop - start), None, dtype=object)
+        if self.kind == "string":
+            return self.dictionary[self.raw[start:stop]]
+        values = self.raw[start:stop]
+        nulls = self.nulls[start:stop]
+        if not nulls.any():
+            return values
+        if self.kind == "bool":
+            result = values.astype(object)
+            result[nulls] = None
+            return result
+        result = values.astype(np.float64)
+        result[nulls] = np.nan
+        return result
+
+    def to_list(self, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        """Значения как объекты Python, пропуски — None (для экспорта)."""
+        stop = self.row_count if stop is None else min(stop, self.row_count)
+        if self.kind is None:
+            return [None] * max(0, stop - start)
+        if self.kind == "string":
+            return self.dictionary[self.raw[start:stop]].tolist()
+        values = self.raw[start:stop].tolist()
+        if self.kind == "number":
+            for i in np.flatnonzero(self.ints[start:stop]).tolist():
+                values[i] = int(values[i])
+        for i in np.flatnonzero(self.nulls[start:stop]).tolist():
+            values[i] = None
+        return values
+
+    def decode(self, codes: List[int]) -> List[Optional[str]]:
+        """Значения строковой колонки по отдельным кодам, не декодируя весь словарь."""
+        if self._dictionary is not None:
+            return self._dictionary[codes].tolist()
+        size = self._column.get("dict_size", 0)
+        offsets = _memmap(_column_path(self._directory, self._index, "offsets"), np.int64, size + 1)
+        data = _memmap(_column_path(self._directory, self._index, "dict"), np.uint8, self._column.get("dict_bytes", 0))
+        return [None if code == 0 else bytes(data[offsets[code - 1]:offsets[code]]).decode("utf-8") for code in codes]
+
+    def describe(self, top: int = 5) -> Dict[str, Any]:
+        """Сводка по колонке полным проходом по memmap: пропуски, диапазон, частые значения."""
+        nulls = int(self.nulls.sum())
+        stats: Dict[str, Any] = {"field_name": self.name, "kind": self.kind,
+                                 "count": self.row_count - nulls, "nulls": nulls}
+        if self.kind in ("int64", "float64", "number"):
+            values = self.raw if nulls == 0 else self.raw[~self.nulls]
+            if self.kind != "int64":
+                values = values[~np.isnan(values)]
+            if len(values):
+                stats.update(min=values.min().item(), max=values.max().item(),
+                             mean=float(values.mean()), std=float(values.std()))
+        elif self.kind == "bool":
+            stats["true_count"] = int(self.raw[~self.nulls].sum())
+        elif self.kind == "string":
+            # Частоты по кодам словаря: строки не декодируются, декодируются только самые частые
+            counts = np.bincount(self.raw, minlength=self._column.get("dict_size", 0) + 1)
+            counts[0] = 0
+            stats["distinct"] = int(np.count_nonzero(counts))
+            best = np.argsort(-counts, kind="stable")[:top]
+            best = [int(code) for code in best if counts[code] > 0]
+            stats["top"] = [{"value": value, "count": int(counts[code])}
+                            for code, value in zip(best, self.decode(best))]
+        return stats
+
+    def to_categorical(self, start: int = 0, stop: Optional[int] = None):
+        """Строковая колонка как pandas.Categorical: коды без декодирования каждой строки."""
+        import pandas as pd
+
+        stop = self.row_count if stop is None else min(stop, self.row_count)
+        return pd.Categorical.from_codes(self.raw[start:stop].astype(np.int64) - 1, categories=self.dictionary[1:])
+
+
+class Snapshot:
+    """Открытый снимок датасета."""
+
+    def __init__(self, dataset_id: uuid.UUID, meta: Dict[str, Any]):
+        self.dataset_id = dataset_id
+        self.meta = meta
+        self.row_count: int = meta["row_count"]
+        self.watermark: int = meta["watermark"]
+        self.field_names: List[str] = meta["field_names"]
+        directory = _generation_dir(dataset_id, meta["generation"])
+        self.columns: Dict[str, SnapshotColumn] = {
+            column["name"]: SnapshotColumn(directory, i, column, self.row_count)
+            for i, column in enumerate(meta["columns"])
+        }
+
+    def to_frame(self, columns: Optional[List[str]] = None, start: int = 0, stop: Optional[int] = None,
+                 categorical: bool = False):
+        """DataFrame со строками [start, stop); categorical=True — строки как pandas.Categorical."""
+        import pandas as pd
+
+        names = columns or self.field_names
+        data = {}
+        for name in names:
+            column = self.columns[name]
+            if categorical and column.kind == "string":
+                data[name] = column.to_categorical(start, stop)
+            else:
+                data[name] = column.to_numpy(start, stop)
+        return pd.DataFrame(data, columns=names, copy=False)
+
+    def describe(self, top: int = 5) -> List[Dict[str, Any]]:
+        return [self.columns[name].describe(top) for name in self.field_names]
+
+    def new_rows(self, db: Session, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        row_data строк, добавленных после снимка (rowid больше водяного знака), в порядке
+        rowid. Если такие строки есть, дописывание снимка ставится в очередь.
+        """
+        if limit is not None and limit <= 0:
+            return []
+        store = get_store(db, self.dataset_id)
+        query = (
+            db.query(store.row_data)
+            .filter(store.dataset_id == self.dataset_id, store.rowid > self.watermark)
+            .order_by(store.rowid)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        rows = [parse_row_data(raw) for (raw,) in query]
+        if rows:
+            request_refresh(self.dataset_id)
+        return [data if isinstance(data, dict) else {} for data in rows]
+
+    def iter_frames(self, batch_rows: int = SNAPSHOT_BATCH_ROWS, columns: Optional[List[str]] = None):
+        """DataFrame по частям, чтобы не держать в памяти декодированные строки всего датасета."""
+        for start in range(0, self.row_count, batch_rows):
+            yield self.to_frame(columns, start, start + batch_rows)
+
+
+def _open(dataset_id: uuid.UUID, meta: Dict[str, Any]) -> Snapshot:
+    opened = _opened.get(dataset_id)
+    if opened is not None and opened.meta == meta:
+        return opened
+    snapshot = Snapshot(dataset_id, meta)
+    _opened[dataset_id] = snapshot
+    return snapshot
+
+
+def get_snapshot(db: Session, dataset: models.Dataset, fresh: bool = False) -> Optional[Snapshot]:
+    """
+    Готовый снимок датасета или None, если снимков нет (не SQLite или выключены) или
+    снимок ещё не собран — тогда сборка ставится в очередь, а строки читаются из БД.
+    Снимок может не содержать последних строк (см. Snapshot.new_rows).
+    fresh=True — сразу привести снимок в соответствие с БД, дождавшись сборки.
+    """
+    if not SNAPSHOTS_ENABLED:
+        return None
+    if fresh:
+        return _open(dataset.id, refresh(db, dataset))
+
+    for _ in range(2):
+        meta = _read_meta(dataset.id)
+        if (meta is None or meta["field_names"] != _field_names(dataset)
+                or meta.get("table") != get_store(db, dataset.id).name):
+            request_refresh(dataset.id)
+            return None
+        try:
+            return _open(dataset.id, meta)
+        except FileNotFoundError:
+            # Поколение удалили сразу после чтения meta.json — перечитываем
+            continue
+    return None
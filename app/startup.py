@@ -0,0 +1,119 @@
+# app/startup.py
+"""
+Измерение старта API-процесса и отложенный импорт тяжёлых подсистем.
+
+StartupProfiler записывает длительность фаз старта (импорт роутеров, миграции,
+прогрев) и отложенных импортов, которые случились уже после старта. Отчёт
+печатается в лог после прогрева и доступен через GET /ready.
+
+lazy_import возвращает заместитель модуля: настоящий импорт (pandas, numpy,
+joblib и модули Veritas, которые их тянут) происходит при первом обращении к
+атрибуту, то есть при первом запросе к соответствующей подсистеме.
+"""
+import os
+import sys
+import time
+import types
+import importlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# Модули, которые прогрев импортирует заранее (через запятую; пусто — не прогревать)
+STARTUP_PRELOAD = [
+    name.strip()
+    for name in os.getenv(
+        "STARTUP_PRELOAD", "app.veritas.jobs,app.veritas.predictor,app.veritas.dataset_features"
+    ).split(",")
+    if name.strip()
+]
+
+
+class StartupProfiler:
+    """Длительности фаз старта процесса и признак готовности к работе."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: List[Dict[str, Any]] = []
+        self.ready_after: Optional[float] = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.phases.append({"phase": name, "seconds": round(seconds, 4)})
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_after is not None
+
+    def mark_ready(self):
+        self.ready_after = time.perf_counter() - self.started_at
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            phases = list(self.phases)
+        return {
+            "ready": self.ready,
+            "ready_after_seconds": round(self.ready_after, 4) if self.ready_after is not None else None,
+            "error": self.error,
+            "phases": phases,
+        }
+
+    def print_report(self):
+        print("--- Старт API ---")
+        for item in self.report()["phases"]:
+            print(f"    {item['phase']:<45} {item['seconds'] * 1000:8.1f} мс")
+        if self.ready_after is not None:
+            print(f"    Готов к работе через {self.ready_after:.2f} с после импорта app.main")
+
+
+# Один профилировщик на процесс; создаётся при первом импорте app.main
+startup_profiler = StartupProfiler()
+
+# app.serve выставляет в воркерах: схема, восстановление очереди и прогрев уже выполнены мастером
+prepared_by_master = False
+
+
+class _LazyModule(types.ModuleType):
+    """Заместитель модуля, который импортирует настоящий модуль при первом обращении к атрибуту."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_target = name
+        self._lazy_module = None
+
+    def _load(self):
+        if self._lazy_module is None:
+            imported = self._lazy_target in sys.modules
+            started = time.perf_counter()
+            # Импорт в Python сам защищён блокировкой, повторный вызов вернёт тот же модуль
+            module = importlib.import_module(self._lazy_target)
+            if not imported:
+                # Модуль не был прогрет заранее — за импорт заплатил первый запрос
+                startup_profiler.record(f"lazy import {self._lazy_target}", time.perf_counter() - started)
+            self._lazy_module = module
+        return self._lazy_module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name: str):
+    """Модуль name, если он уже импортирован, иначе заместитель, импортирующий его при первом использовании."""
+    return sys.modules.get(name) or _LazyModule(name)
+
+
+def preload(names: List[str] = STARTUP_PRELOAD):
+    """Импортирует тяжёлые модули заранее, чтобы первый запрос не платил за импорт."""
+    for name in names:
+        with startup_profiler.phase(f"preload {name}"):
+            importlib.import_module(name)
@@ -0,0 +1,251 @@
+# app/veritas/approximate.py
+"""
+Приближённый режим Veritas для больших файлов.
+
+Файл читается блоками, пока не исчерпан бюджет времени, и из прочитанных строк
+поддерживается равномерная выборка (reservoir sampling, алгоритм R) не больше
+max_rows строк. Признаки считаются по выборке, а их разброс оценивается
+бутстрепом: по B повторным выборкам с возвращением получаются B наборов признаков,
+из которых строятся 95% интервалы (и интервал оценки подлинности после предсказания).
+
+Интервалы отражают только случайность выборки. Если бюджет кончился раньше, чем
+файл был прочитан, выборка взята из начала файла — поэтому в ответе всегда
+сообщается, какая доля файла прочитана.
+"""
+import io
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union, BinaryIO
+
+import numpy as np
+import pandas as pd
+
+from .feature_calculator import calculate_features, clean_features
+from .evidence import EvidenceAccumulator
+from .streaming_features import (
+    FeatureAccumulator, MomentAccumulator, VERITAS_CHUNK_ROWS, _iter_chunks, _starts_with, _to_numeric
+)
+
+# Параметры по умолчанию для приближённого режима
+VERITAS_APPROX_MAX_ROWS = int(os.getenv("VERITAS_APPROX_MAX_ROWS", "10000"))
+VERITAS_APPROX_TIME_BUDGET_MS = int(os.getenv("VERITAS_APPROX_TIME_BUDGET_MS", "1000"))
+# Число бутстреп-повторов для доверительных интервалов
+VERITAS_APPROX_BOOTSTRAP = int(os.getenv("VERITAS_APPROX_BOOTSTRAP", "30"))
+# Блоки в приближённом режиме меньше, чтобы бюджет времени проверялся чаще
+_APPROX_CHUNK_ROWS = 10000
+# Доля бюджета времени на чтение файла; остальное — на бутстреп
+_READ_SHARE = 0.75
+# Столько бутстреп-повторов выполняется даже после исчерпания бюджета
+_MIN_BOOTSTRAP = 10
+
+
+class ReservoirSampler:
+    """Равномерная выборка фиксированного размера из потока блоков строк."""
+
+    def __init__(self, capacity: int, seed: Optional[int] = None):
+        self.capacity = capacity
+        self.seen = 0
+        self._frame: Optional[pd.DataFrame] = None
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, chunk: pd.DataFrame):
+        chunk = chunk.reset_index(drop=True).astype(object)
+        if self._frame is None:
+            self._frame = chunk.iloc[:0]
+        elif not chunk.columns.equals(self._frame.columns):
+            # В JSON lines колонки могут появляться не в первом блоке
+            columns = self._frame.columns.union(chunk.columns, sort=False)
+            self._frame = self._frame.reindex(columns=columns)
+            chunk = chunk.reindex(columns=columns)
+
+        position = self.seen
+        self.seen += len(chunk)
+
+        # 1. Пока выборка не заполнена, строки берутся целиком
+        free = self.capacity - len(self._frame)
+        if free > 0:
+            head = chunk.iloc[:free]
+            self._frame = pd.concat([self._frame, head], ignore_index=True)
+            chunk = chunk.iloc[free:]
+            position += len(head)
+        if chunk.empty:
+            return
+
+        # 2. Строка с номером i попадает в выборку с вероятностью capacity / (i + 1)
+        #    и занимает случайный слот; при совпадении слотов побеждает более поздняя строка
+        indices = position + np.arange(len(chunk))
+        slots = (self._rng.random(len(chunk)) * (indices + 1)).astype(np.int64)
+        taken = np.flatnonzero(slots < self.capacity)
+        if taken.size == 0:
+            return
+        slots = slots[taken]
+        _, last_in_reversed = np.unique(slots[::-1], return_index=True)
+        winners = taken.size - 1 - last_in_reversed
+        self._frame.iloc[slots[winners]] = chunk.iloc[taken[winners]].to_numpy()
+
+    def sample(self) -> pd.DataFrame:
+        return self._frame if self._frame is not None else pd.DataFrame()
+
+
+def _typed(sample: pd.DataFrame, file_type: str) -> pd.DataFrame:
+    """Один раз приводит числовые колонки выборки к float, чтобы бутстреп не разбирал строки заново."""
+    if file_type == 'json':
+        sample = sample.infer_objects()
+    typed = {}
+    for col in sample.columns:
+        numeric = _to_numeric(sample[col]) if len(sample) else None
+        typed[col] = numeric if numeric is not None else sample[col]
+    return pd.DataFrame(typed, columns=sample.columns)
+
+
+def _uniqueness_ratio(values: pd.Series, population: float) -> float:
+    """
+    Доля уникальных значений во всём файле по выборке (оценка Duj1, Haas et al.).
+    Точна в обоих крайних случаях: для колонки-ключа и для колонки с несколькими категориями.
+    """
+    counts = values.dropna().astype(str).value_counts()
+    n = int(counts.sum())
+    if n == 0 or population <= 0:
+        return 0.0
+    singletons = int((counts == 1).sum())
+    q = min(1.0, n / population)
+    distinct = len(counts) / (1 - (1 - q) * singletons / n)
+    return min(distinct, population) / population
+
+
+def _features(frame: pd.DataFrame, row_count: float) -> Tuple[Dict[str, Any], List[str]]:
+    """Признаки по выборке и список числовых колонок."""
+    accumulator = FeatureAccumulator()
+    accumulator.update(frame)
+    features = accumulator.features()
+    numeric_cols = [col for col, column in accumulator.columns.items() if column.numeric and len(frame) > 0]
+
+    # Число строк и доля уникальных значений — оценки для всего файла, а не для выборки
+    features['row_count'] = float(row_count)
+    for col in frame.columns:
+        if col not in numeric_cols:
+            features[f'{col}_uniqueness_ratio'] = _uniqueness_ratio(frame[col], row_count)
+    return features, numeric_cols
+
+
+def _replica(point: Dict[str, Any], numeric_cols: List[str], matrix: np.ndarray) -> Dict[str, Any]:
+    """
+    Признаки одной бутстреп-выборки. Пересчитываются только признаки числовых
+    колонок; размеры и доли уникальных значений берутся из точечной оценки
+    (повторы при выборке с возвращением делают их оценку по реплике смещённой).
+    """
+    features = dict(point)
+    for j, col in enumerate(numeric_cols):
+        moments = MomentAccumulator()
+        moments.update(matrix[:, j])
+        features[f'{col}_mean'] = moments.mean_value()
+        features[f'{col}_std'] = moments.std()
+        features[f'{col}_skew'] = moments.skew()
+        features[f'{col}_kurtosis'] = moments.kurtosis()
+    evidence = EvidenceAccumulator()
+    evidence.update(numeric_cols, matrix)
+    features.update(evidence.features(numeric_cols))
+    return clean_features(features)
+
+
+# Признаки, которые в репликах не пересчитываются (см. _replica), — для них интервал не строится
+_POINT_ONLY = ('row_count', 'column_count')
+
+
+def feature_intervals(samples: List[Dict[str, Any]], level: float = 0.95) -> Dict[str, Tuple[float, float]]:
+    """Перцентильные интервалы для числовых признаков по бутстреп-наборам."""
+    intervals = {}
+    if not samples:
+        return intervals
+    tail = (1 - level) / 2 * 100
+    for key in samples[0]:
+        if key in _POINT_ONLY or key.endswith('_uniqueness_ratio'):
+            continue
+        values = np.array([s.get(key) for s in samples if isinstance(s.get(key), (int, float))], dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if values.size:
+            low, high = np.percentile(values, [tail, 100 - tail])
+            intervals[key] = (float(low), float(high))
+    return intervals
+
+
+def calculate_features_approx(
+    source: Union[bytes, BinaryIO],
+    file_type: str = 'csv',
+    max_rows: int = VERITAS_APPROX_MAX_ROWS,
+    time_budget_ms: int = VERITAS_APPROX_TIME_BUDGET_MS,
+    bootstrap: int = VERITAS_APPROX_BOOTSTRAP,
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Вычисляет признаки по выборке строк в пределах бюджета времени.
+
+    :return: Словарь с ключами features (точечная оценка), bootstrap (наборы
+             признаков бутстрепа), intervals, rows_read, sample_rows, fraction_read, complete.
+    """
+    started = time.perf_counter()
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    if file_type == 'xlsx' or (file_type == 'json' and _starts_with(source, b"[")):
+        # Эти форматы блоками не читаются — считаем точно
+        features = calculate_features(source.read(), file_type=file_type)
+        if "error" in features:
+            return {"error": features["error"]}
+        rows = int(features.get('row_count') or 0)
+        return {"features": features, "bootstrap": [], "intervals": {}, "rows_read": rows,
+                "sample_rows": rows, "fraction_read": 1.0, "complete": True}
+
+    source.seek(0, os.SEEK_END)
+    size = source.tell()
+    source.seek(0)
+
+    # 1. Читаем файл блоками, пока не кончится файл или бюджет времени
+    sampler = ReservoirSampler(max_rows, seed=seed)
+    deadline = started + time_budget_ms / 1000
+    read_deadline = started + _READ_SHARE * time_budget_ms / 1000
+    complete = True
+    position = 0
+    try:
+        for chunk in _iter_chunks(source, file_type, min(VERITAS_CHUNK_ROWS, _APPROX_CHUNK_ROWS)):
+            sampler.update(chunk)
+            # Позиция в файле учитывает буфер парсера, поэтому это оценка сверху
+            position = source.tell()
+            if time.perf_counter() >= read_deadline:
+                complete = False
+                break
+    except Exception as e:
+        print(f"Ошибка при чтении файла: {e}")
+        return {"error": "Failed to parse the file."}
+
+    fraction_read = 1.0 if complete or size == 0 else min(1.0, position / size)
+    rows_read = sampler.seen
+    row_count = rows_read if complete else rows_read / max(fraction_read, 1e-9)
+
+    # 2. Точечная оценка по выборке
+    sample = _typed(sampler.sample(), file_type)
+    features, numeric_cols = _features(sample, row_count)
+    if complete and rows_read <= max_rows:
+        # Прочитан весь файл без прореживания — результат точный
+        return {"features": features, "bootstrap": [], "intervals": {}, "rows_read": rows_read,
+                "sample_rows": len(sample), "fraction_read": 1.0, "complete": True}
+
+    # 3. Бутстреп: повторные выборки с возвращением из той же выборки (в пределах остатка бюджета)
+    rng = np.random.default_rng(seed)
+    replicas = []
+    n = len(sample)
+    matrix = sample[numeric_cols].to_numpy(dtype=np.float64) if numeric_cols else np.empty((n, 0))
+    while n and len(replicas) < bootstrap:
+        if len(replicas) >= _MIN_BOOTSTRAP and time.perf_counter() >= deadline:
+            break
+        replicas.append(_replica(features, numeric_cols, matrix[rng.integers(0, n, n)]))
+
+    return {
+        "features": features,
+        "bootstrap": replicas,
+        "intervals": feature_intervals(replicas),
+        "rows_read": rows_read,
+        "sample_rows": n,
+        "fraction_read": fraction_read,
+        "complete": complete,
+    }
@@ -0,0 +1,86 @@
+# app/veritas/cache.py
+"""
+Кэш результатов анализа Veritas, адресуемый содержимым файла.
+
+Ключ — blake2b-хеш байтов загруженного файла (считается во время сохранения
+загрузки на диск) и тип файла. В записи хранятся признаки и предсказание вместе с
+версией модели, которая его дала: если активная версия модели сменилась,
+предсказание считается устаревшим, но признаки переиспользуются без повторного разбора файла.
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .. import metrics
+
+# Сколько последних результатов хранить (0 — кэш выключен)
+VERITAS_CACHE_SIZE = int(os.getenv("VERITAS_CACHE_SIZE", "1024"))
+
+
+def content_hasher():
+    """Потоковый хешер для содержимого загрузки."""
+    return hashlib.blake2b(digest_size=32)
+
+
+class CachedAnalysis:
+    """Признаки файла и предсказание модели определённой версии."""
+
+    def __init__(self, features: Dict[str, Any], probability: float, model_version: Optional[str]):
+        self.features = features
+        self.probability = probability
+        self.model_version = model_version
+
+
+class ResultCache:
+    """LRU-кэш результатов анализа с ограниченным числом записей."""
+
+    def __init__(self, max_entries: int = VERITAS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], CachedAnalysis]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[CachedAnalysis]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Tuple[str, str], features: Dict[str, Any], probability: float,
+            model_version: Optional[str]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = CachedAnalysis(features, probability, model_version)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Общий кэш для всего приложения
+result_cache = ResultCache()
+
+
+def _collect_metrics():
+    return [
+        ("veritas_cache_hits_total", "counter", "Veritas result cache hits", [({}, result_cache.hits)]),
+        ("veritas_cache_misses_total", "counter", "Veritas result cache misses", [({}, result_cache.misses)]),
+        ("veritas_cache_entries", "gauge", "Entries in the Veritas result cache", [({}, len(result_cache))]),
+    ]
+
+
+metrics.registry.register_collector("veritas_cache", _collect_metrics)
@@ -0,0 +1,203 @@
+# app/veritas/dataset_features.py
+"""
+Признаки Veritas для датасетов, которые уже хранятся на платформе.
+
+Для каждого проанализированного датасета в таблице dataset_feature_states хранится
+состояние FeatureAccumulator (моменты, скетчи уникальности, счётчики цифр и суммы
+для корреляций) в формате npz без pickle, число учтённых строк и водяной знак —
+максимальный rowid SQLite учтённой строки. Вставка строк состояние не трогает:
+при анализе в него дочитываются только строки с rowid больше водяного знака, после
+чего состояние сохраняется заново. Поэтому повторный анализ выросшего датасета не
+перечитывает старые строки, а сбой между вставкой и обновлением состояния ничего
+не ломает — строки просто дочитаются при следующем анализе.
+
+Состояние собирается заново полным проходом — по колоночному снимку датасета
+(app/snapshots.py), если он готов, а не по JSON строк, — если строк стало меньше
+учтённых (удаление), изменились поля шаблона, таблица строк (перевод шаблона в
+типизированный вид, перенос в отдельный файл) или версия формата состояния.
+Без SQLite водяного знака нет, и состояние пересобирается при любом изменении числа строк.
+"""
+import io
+import os
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .. import models, snapshots, row_storage
+from ..database import SessionLocal, engine
+from .streaming_features import FeatureAccumulator
+
+# Сколько строк читать из БД за один раз при пересборке состояния
+VERITAS_DB_BATCH_ROWS = int(os.getenv("VERITAS_DB_BATCH_ROWS", "5000"))
+
+# Водяной знак — rowid SQLite
+_WATERMARKS = engine.dialect.name == "sqlite"
+
+
+def _template_fields(dataset: models.Dataset) -> List[str]:
+    return [field.get("field_name", "") for field in dataset.template.schema_.get("fields", [])]
+
+
+def _scalar(value: Any) -> Any:
+    # Вложенные объекты и списки учитываем как текст (так же они попадают в экспорт)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return value
+
+
+def rows_to_frame(rows: List[Dict[str, Any]], field_names: List[str]) -> pd.DataFrame:
+    """Превращает row_data строк в DataFrame с колонками шаблона."""
+    records = [{name: _scalar(row.get(name)) for name in field_names} for row in rows]
+    return pd.DataFrame.from_records(records, columns=field_names)
+
+
+def iter_row_batches(db: Session, dataset_id: uuid.UUID, batch_size: int = VERITAS_DB_BATCH_ROWS,
+                     after_rowid: int = 0, upto_rowid: Optional[int] = None):
+    """
+    Отдаёт row_data строк датасета пачками, не загружая весь датасет в память.
+    С SQLite — только строки с after_rowid < rowid <= upto_rowid, в порядке rowid.
+    """
+    store = row_storage.get_store(db, dataset_id)
+    query = db.query(store.row_data).filter(store.dataset_id == dataset_id)
+    if _WATERMARKS:
+        query = query.filter(store.rowid > after_rowid).order_by(store.rowid)
+        if upto_rowid is not None:
+            query = query.filter(store.rowid <= upto_rowid)
+    batch = []
+    for (row_data,) in query.execution_options(yield_per=batch_size):
+        batch.append(row_storage.parse_row_data(row_data))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _row_stats(db: Session, store: row_storage.RowStore, dataset_id: uuid.UUID) -> Tuple[int, Optional[int]]:
+    """Число строк датасета и максимальный rowid (None без SQLite)."""
+    if not _WATERMARKS:
+        return db.query(func.count(store.id)).filter(store.dataset_id == dataset_id).scalar(), None
+    count, max_rowid = (
+        db.query(func.count(), func.coalesce(func.max(store.rowid), 0))
+        .filter(store.dataset_id == dataset_id)
+        .one()
+    )
+    return count, max_rowid
+
+
+def _dump(accumulator: FeatureAccumulator, table: str, watermark: Optional[int]) -> bytes:
+    meta, arrays = accumulator.to_state()
+    meta.update(table=table, watermark=watermark)
+    buffer = io.BytesIO()
+    np.savez(buffer, meta=np.array(json.dumps(meta)), **arrays)
+    return buffer.getvalue()
+
+
+def _load(blob: bytes) -> Optional[Tuple[FeatureAccumulator, Dict[str, Any]]]:
+    """Состояние из БД или None, если оно в другом формате (например, старый pickle) или повреждено."""
+    try:
+        with np.load(io.BytesIO(blob), allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            arrays = {name: data[name] for name in data.files if name != "meta"}
+        return FeatureAccumulator.from_state(meta, arrays), meta
+    except Exception as e:
+        print(f"--- Сохранённое состояние признаков не прочитано ({e}) ---")
+        return None
+
+
+def _save(db: Session, dataset_id: uuid.UUID, field_names: List[str], accumulator: FeatureAccumulator,
+          table: str, watermark: Optional[int]):
+    state = db.get(models.DatasetFeatureState, dataset_id)
+    if state is None:
+        state = models.DatasetFeatureState(dataset_id=dataset_id)
+        db.add(state)
+    state.field_names = field_names
+    state.row_count = accumulator.row_count
+    state.state = _dump(accumulator, table, watermark)
+    db.commit()
+
+
+def _rebuild(db: Session, dataset: models.Dataset, store: row_storage.RowStore) -> FeatureAccumulator:
+    """Собирает состояние заново по всем строкам датасета."""
+    field_names = _template_fields(dataset)
+    accumulator = FeatureAccumulator()
+    # Пустой блок задаёт колонки, даже если строк в датасете нет
+    accumulator.update(rows_to_frame([], field_names))
+
+    # 1. Снимок читается по колонкам; строки, добавленные после него, — из БД
+    snapshot = snapshots.get_snapshot(db, dataset)
+    watermark = 0
+    if snapshot is not None:
+        for frame in snapshot.iter_frames(VERITAS_DB_BATCH_ROWS):
+            accumulator.update(frame)
+        watermark = snapshot.watermark
+
+    # 2. Остальные строки из БД (до водяного знака, посчитанного заранее: строки,
+    #    вставленные во время чтения, дочитаются при следующем анализе)
+    _, max_rowid = _row_stats(db, store, dataset.id)
+    for batch in iter_row_batches(db, dataset.id, after_rowid=watermark, upto_rowid=max_rowid):
+        accumulator.update(rows_to_frame(batch, field_names))
+
+    _save(db, dataset.id, field_names, accumulator, store.name, max_rowid)
+    return accumulator
+
+
+def _catch_up(db: Session, dataset: models.Dataset, store: row_storage.RowStore,
+              state: models.DatasetFeatureState) -> Optional[FeatureAccumulator]:
+    """
+    Сохранённое состояние, дополненное строками после водяного знака, или None,
+    если его нельзя использовать и нужна пересборка.
+    """
+    field_names = _template_fields(dataset)
+    if state.field_names != field_names:
+        return None
+    loaded = _load(state.state)
+    if loaded is None:
+        return None
+    accumulator, meta = loaded
+    if meta.get("table") != store.name:
+        return None
+
+    count, max_rowid = _row_stats(db, store, dataset.id)
+    if accumulator.row_count == count and meta.get("watermark") == max_rowid:
+        return accumulator
+    if max_rowid is None or meta.get("watermark") is None:
+        return None
+
+    # Дочитываем только новые строки; если после этого число строк не сходится,
+    # часть старых удалена — состояние пересобирается
+    counted = accumulator.row_count
+    for batch in iter_row_batches(db, dataset.id, after_rowid=meta["watermark"], upto_rowid=max_rowid):
+        accumulator.update(rows_to_frame(batch, field_names))
+    if accumulator.row_count != count:
+        return None
+    if accumulator.row_count != counted:
+        _save(db, dataset.id, field_names, accumulator, store.name, max_rowid)
+    return accumulator
+
+
+def compute_dataset_features(dataset_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+    """
+    Возвращает признаки датасета из БД или None, если датасета нет.
+    Если сохранённое состояние актуально, строки не читаются вовсе.
+    """
+    db = SessionLocal()
+    try:
+        dataset = db.get(models.Dataset, dataset_id)
+        if dataset is None:
+            return None
+
+        store = row_storage.get_store(db, dataset_id)
+        state = db.get(models.DatasetFeatureState, dataset_id)
+        accumulator = _catch_up(db, dataset, store, state) if state is not None else None
+        if accumulator is None:
+            print(f"--- Пересборка признаков Veritas для датасета {dataset_id} ---")
+            accumulator = _rebuild(db, dataset, store)
+        return accumulator.features()
+    finally:
+        db.close()
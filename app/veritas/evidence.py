@@ -0,0 +1,374 @@
+# app/veritas/evidence.py
+"""
+Векторизованный расчёт "доказательств" Veritas.
+
+- Закон Бенфорда: распределения первой и второй значащей цифры, хи-квадрат и MAD
+  считаются сразу для всех числовых колонок (одна матрица, один bincount).
+- Корреляции: полная матрица Пирсона по парам непустых значений (как df.corr()),
+  собранная из сливаемых сумм, поэтому её можно копить и по блокам файла.
+
+Результаты добавляются в словарь признаков (дополнительные признаки для модели),
+а build_evidence() превращает их в пункты evidence для ответа API.
+"""
+import warnings
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Ожидаемые по Бенфорду вероятности первой (1..9) и второй (0..9) значащей цифры
+BENFORD_FIRST = np.log10(1 + 1 / np.arange(1, 10))
+BENFORD_SECOND = np.log10(1 + 1 / (10 * np.arange(1, 10)[:, None] + np.arange(0, 10)[None, :])).sum(axis=0)
+
+# Пороги MAD по Nigrini: близкое соответствие / допустимое / пограничное / несоответствие
+MAD_THRESHOLDS_FIRST = (0.006, 0.012, 0.015)
+MAD_THRESHOLDS_SECOND = (0.008, 0.010, 0.012)
+
+# Колонка пригодна для теста Бенфорда, если значений достаточно и они покрывают
+# несколько порядков величины
+BENFORD_MIN_VALUES = 100
+BENFORD_MIN_MAGNITUDES = 2.0
+
+# Пороги для флагов корреляционной структуры
+NEAR_PERFECT_CORRELATION = 0.98
+NEAR_ZERO_CORRELATION = 0.02
+MIN_COLUMNS_FOR_INDEPENDENCE_FLAG = 3
+
+
+def significant_digits(matrix: np.ndarray):
+    """
+    Первая и вторая значащие цифры для каждого элемента матрицы.
+
+    :return: (first, second, valid_first, valid_second); first/second — int-массивы той же формы.
+    """
+    x = np.abs(matrix)
+    valid = np.isfinite(x) & (x > 0)
+    x = np.where(valid, x, 1.0)
+
+    exponent = np.floor(np.log10(x))
+    # Небольшой сдвиг компенсирует ошибки округления (0.3 / 0.1 = 2.9999999999999996)
+    scaled = x / np.power(10.0, exponent) + 1e-9
+    scaled = np.where(scaled >= 10, scaled / 10, scaled)
+
+    first = np.clip(np.floor(scaled).astype(np.int64), 1, 9)
+    second = np.floor(scaled * 10 + 1e-8).astype(np.int64) % 10
+
+    # Второй цифры нет только у значений меньше 10 с одной значащей цифрой (5, 0.3, 0.02);
+    # у 1.5 она есть (5), а у 50 или 700 это записанный ноль
+    single_digit = np.abs(scaled - np.round(scaled)) < 1e-7
+    has_second = ~single_digit | (exponent >= 1)
+    return first, second, valid, valid & has_second
+
+
+def digit_counts(matrix: np.ndarray):
+    """Счётчики первой (k x 9) и второй (k x 10) цифры для каждой из k колонок."""
+    n_cols = matrix.shape[1]
+    first, second, valid_first, valid_second = significant_digits(matrix)
+    cols = np.broadcast_to(np.arange(n_cols), matrix.shape)
+
+    first_counts = np.bincount(
+        (cols * 9 + first - 1)[valid_first], minlength=n_cols * 9
+    ).reshape(n_cols, 9)
+    second_counts = np.bincount(
+        (cols * 10 + second)[valid_second], minlength=n_cols * 10
+    ).reshape(n_cols, 10)
+    return first_counts, second_counts
+
+
+def benford_deviation(counts: np.ndarray, expected: np.ndarray):
+    """
+    Хи-квадрат и MAD (среднее абсолютное отклонение долей) для каждой строки counts.
+    Для строк без значений возвращается NaN.
+    """
+    counts = np.atleast_2d(counts).astype(np.float64)
+    totals = counts.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        observed = counts / totals
+        expected_counts = totals * expected
+        chi2 = ((counts - expected_counts) ** 2 / expected_counts).sum(axis=1)
+        mad = np.abs(observed - expected).mean(axis=1)
+    empty = totals[:, 0] == 0
+    chi2[empty] = np.nan
+    mad[empty] = np.nan
+    return chi2, mad
+
+
+def conformity(mad: float, thresholds: Sequence[float]) -> str:
+    """Уровень соответствия закону Бенфорда по порогам Nigrini."""
+    if mad <= thresholds[0]:
+        return "close"
+    if mad <= thresholds[1]:
+        return "acceptable"
+    if mad <= thresholds[2]:
+        return "marginal"
+    return "nonconformity"
+
+
+class EvidenceAccumulator:
+    """
+    Сливаемое состояние для доказательств по числовым колонкам:
+    счётчики цифр, диапазон модулей значений и парные суммы для корреляций.
+    Суммы хранятся относительно сдвига (средних первого блока) для численной устойчивости.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.first_counts = np.zeros((0, 9), dtype=np.int64)
+        self.second_counts = np.zeros((0, 10), dtype=np.int64)
+        self.abs_min = np.zeros(0)
+        self.abs_max = np.zeros(0)
+        self.shift = np.zeros(0)
+        self.n = np.zeros((0, 0))
+        self.sx = np.zeros((0, 0))
+        self.sxx = np.zeros((0, 0))
+        self.sxy = np.zeros((0, 0))
+
+    def update(self, names: Sequence[str], matrix: np.ndarray):
+        """Добавляет блок: matrix (строки x колонки), NaN — пропуски."""
+        if matrix.size == 0:
+            return
+        index = self._ensure_columns(names, matrix)
+
+        first, second = digit_counts(matrix)
+        self.first_counts[index] += first
+        self.second_counts[index] += second
+
+        magnitudes = np.abs(matrix)
+        magnitudes = np.where(np.isfinite(magnitudes) & (magnitudes > 0), magnitudes, np.nan)
+        with np.errstate(invalid="ignore"), _ignore_all_nan():
+            self.abs_min[index] = np.fmin(self.abs_min[index], np.nanmin(magnitudes, axis=0))
+            self.abs_max[index] = np.fmax(self.abs_max[index], np.nanmax(magnitudes, axis=0))
+
+        # Парные суммы по строкам, где обе колонки непустые
+        present = np.isfinite(matrix)
+        z = np.where(present, matrix - self.shift[index], 0.0)
+        m = present.astype(np.float64)
+        grid = np.ix_(index, index)
+        self.n[grid] += m.T @ m
+        self.sx[grid] += z.T @ m
+        self.sxx[grid] += (z * z).T @ m
+        self.sxy[grid] += z.T @ z
+
+    def merge(self, other: "EvidenceAccumulator"):
+        if not other.names:
+            return
+        index = self._ensure_columns(other.names, None, shift=other.shift)
+        grid = np.ix_(index, index)
+
+        self.first_counts[index] += other.first_counts
+        self.second_counts[index] += other.second_counts
+        self.abs_min[index] = np.fmin(self.abs_min[index], other.abs_min)
+        self.abs_max[index] = np.fmax(self.abs_max[index], other.abs_max)
+
+        # Переносим суммы другого аккумулятора на наш сдвиг
+        d = other.shift - self.shift[index]
+        n, sx, sxx, sxy = other.n, other.sx, other.sxx, other.sxy
+        self.n[grid] += n
+        self.sx[grid] += sx + d[:, None] * n
+        self.sxx[grid] += sxx + 2 * d[:, None] * sx + (d ** 2)[:, None] * n
+        self.sxy[grid] += sxy + d[None, :] * sx + d[:, None] * sx.T + np.outer(d, d) * n
+
+    def correlation(self, names: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Матрица корреляций Пирсона (по парам непустых значений) для выбранных колонок."""
+        index = self._select(names)
+        grid = np.ix_(index, index)
+        n, sx, sxx, sxy = self.n[grid], self.sx[grid], self.sxx[grid], self.sxy[grid]
+        sy, syy = sx.T, sxx.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = n * sxy - sx * sy
+            var_x = n * sxx - sx * sx
+            var_y = n * syy - sy * sy
+            corr = cov / np.sqrt(var_x * var_y)
+        return np.clip(corr, -1.0, 1.0)
+
+    def features(self, names: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Дополнительные признаки для модели по выбранным (числовым) колонкам."""
+        index = self._select(names)
+        selected = [self.names[i] for i in index]
+        features: Dict[str, Any] = {}
+
+        first_counts = self.first_counts[index]
+        second_counts = self.second_counts[index]
+
+        # Закон Бенфорда применим только к колонкам, где значений достаточно
+        # и они покрывают несколько порядков величины
+        with np.errstate(divide="ignore", invalid="ignore"):
+            magnitudes = np.log10(self.abs_max[index] / self.abs_min[index])
+        applicable = (first_counts.sum(axis=1) >= BENFORD_MIN_VALUES) & (magnitudes >= BENFORD_MIN_MAGNITUDES)
+
+        _, first_mad = benford_deviation(first_counts, BENFORD_FIRST)
+        for name, mad, is_applicable in zip(selected, first_mad, applicable):
+            features[f'{name}_benford_mad'] = mad if is_applicable else np.nan
+
+        pooled_first = first_counts[applicable].sum(axis=0)
+        pooled_second = second_counts[applicable].sum(axis=0)
+        chi2_first, mad_first = benford_deviation(pooled_first, BENFORD_FIRST)
+        chi2_second, mad_second = benford_deviation(pooled_second, BENFORD_SECOND)
+        features['benford_columns'] = int(applicable.sum())
+        features['benford_values'] = int(pooled_first.sum())
+        features['benford_first_digit_chi2'] = chi2_first[0]
+        features['benford_first_digit_mad'] = mad_first[0]
+        features['benford_second_digit_chi2'] = chi2_second[0]
+        features['benford_second_digit_mad'] = mad_second[0]
+
+        # Сводка по матрице корреляций (только значения вне диагонали)
+        corr = self.correlation(selected)
+        off_diagonal = np.abs(corr[~np.eye(len(selected), dtype=bool)])
+        off_diagonal = off_diagonal[np.isfinite(off_diagonal)]
+        features['correlation_columns'] = len(selected)
+        if off_diagonal.size:
+            features['correlation_max_abs'] = float(off_diagonal.max())
+            features['correlation_mean_abs'] = float(off_diagonal.mean())
+            # Каждая пара встречается в матрице дважды
+            features['correlation_near_perfect_pairs'] = int((off_diagonal >= NEAR_PERFECT_CORRELATION).sum() // 2)
+        else:
+            features['correlation_max_abs'] = np.nan
+            features['correlation_mean_abs'] = np.nan
+            features['correlation_near_perfect_pairs'] = 0
+        return features
+
+    # --- Сохранение состояния ---
+
+    _STATE_ARRAYS = ("first_counts", "second_counts", "abs_min", "abs_max", "shift", "n", "sx", "sxx", "sxy")
+
+    def to_state(self) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """Состояние без pickle: имена колонок (для JSON) и массивы счётчиков и сумм."""
+        return {"names": list(self.names)}, {name: getattr(self, name) for name in self._STATE_ARRAYS}
+
+    @classmethod
+    def from_state(cls, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> "EvidenceAccumulator":
+        accumulator = cls()
+        accumulator.names = list(meta["names"])
+        for name in cls._STATE_ARRAYS:
+            setattr(accumulator, name, arrays[name])
+        return accumulator
+
+    # --- Внутренние методы ---
+
+    def _select(self, names: Optional[Sequence[str]]) -> np.ndarray:
+        if names is None:
+            return np.arange(len(self.names))
+        positions = {name: i for i, name in enumerate(self.names)}
+        return np.array([positions[name] for name in names if name in positions], dtype=np.int64)
+
+    def _ensure_columns(self, names: Sequence[str], matrix: Optional[np.ndarray], shift: Optional[np.ndarray] = None):
+        """Добавляет новые колонки (с нулевыми суммами) и возвращает индексы names."""
+        positions = {name: i for i, name in enumerate(self.names)}
+        new = [name for name in names if name not in positions]
+        if new:
+            if shift is not None:
+                new_shift = np.array([shift[list(names).index(name)] for name in new])
+            else:
+                with _ignore_all_nan():
+                    new_shift = np.nan_to_num(np.nanmean(matrix[:, [list(names).index(name) for name in new]], axis=0))
+            k, extra = len(self.names), len(new)
+            self.names.extend(new)
+            self.first_counts = np.vstack([self.first_counts, np.zeros((extra, 9), dtype=np.int64)])
+            self.second_counts = np.vstack([self.second_counts, np.zeros((extra, 10), dtype=np.int64)])
+            self.abs_min = np.concatenate([self.abs_min, np.full(extra, np.nan)])
+            self.abs_max = np.concatenate([self.abs_max, np.full(extra, np.nan)])
+            self.shift = np.concatenate([self.shift, new_shift])
+            self.n, self.sx, self.sxx, self.sxy = (
+                np.pad(a, ((0, extra), (0, extra))) for a in (self.n, self.sx, self.sxx, self.sxy)
+            )
+            positions.update({name: k + i for i, name in enumerate(new)})
+        return np.array([positions[name] for name in names], dtype=np.int64)
+
+
+@contextmanager
+def _ignore_all_nan():
+    """Глушит предупреждение numpy о колонках, целиком состоящих из NaN."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        yield
+
+
+def evidence_features(matrix: np.ndarray, names: Sequence[str]) -> Dict[str, Any]:
+    """Признаки доказательств для уже загруженной числовой матрицы (один проход)."""
+    accumulator = EvidenceAccumulator()
+    accumulator.update(list(names), matrix)
+    return accumulator.features()
+
+
+def build_evidence(features: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Формирует пункты evidence для ответа API из словаря признаков."""
+    evidence = []
+
+    values = features.get('benford_values') or 0
+    columns = features.get('benford_columns') or 0
+    if columns == 0:
+        evidence.append({
+            "feature": "Benford's Law",
+            "description": "Not enough numeric data spanning several orders of magnitude to apply the test",
+            "impact": "low",
+        })
+    else:
+        impacts = {"close": "low", "acceptable": "low", "marginal": "medium", "nonconformity": "high"}
+        for label, key, thresholds in (
+            ("first digit", "benford_first_digit", MAD_THRESHOLDS_FIRST),
+            ("second digit", "benford_second_digit", MAD_THRESHOLDS_SECOND),
+        ):
+            mad = features.get(f'{key}_mad')
+            chi2 = features.get(f'{key}_chi2')
+            if mad is None or not np.isfinite(mad):
+                continue
+            level = conformity(mad, thresholds)
+            verdict = "nonconformity" if level == "nonconformity" else f"{level} conformity"
+            evidence.append({
+                "feature": f"Benford's Law ({label})",
+                "description": (
+                    f"MAD {mad:.4f}, chi-square {chi2:.1f} over {int(values)} values "
+                    f"in {int(columns)} column(s): {verdict}"
+                ),
+                "impact": impacts[level],
+            })
+
+        # Колонка с наибольшим отклонением по первой цифре
+        per_column = {
+            key[:-len('_benford_mad')]: value for key, value in features.items()
+            if key.endswith('_benford_mad') and value is not None and np.isfinite(value)
+        }
+        if per_column:
+            worst = max(per_column, key=per_column.get)
+            if conformity(per_column[worst], MAD_THRESHOLDS_FIRST) == "nonconformity":
+                evidence.append({
+                    "feature": f"Benford's Law ({worst})",
+                    "description": f"Column '{worst}' deviates the most from Benford's Law (MAD {per_column[worst]:.4f})",
+                    "impact": "medium",
+                })
+
+    corr_columns = features.get('correlation_columns') or 0
+    max_abs = features.get('correlation_max_abs')
+    mean_abs = features.get('correlation_mean_abs')
+    if corr_columns < 2 or max_abs is None or not np.isfinite(max_abs):
+        evidence.append({
+            "feature": "Column Correlation",
+            "description": "Fewer than two numeric columns; correlation structure was not analyzed",
+            "impact": "low",
+        })
+    elif features.get('correlation_near_perfect_pairs'):
+        evidence.append({
+            "feature": "Column Correlation",
+            "description": (
+                f"{int(features['correlation_near_perfect_pairs'])} column pair(s) are almost perfectly "
+                f"correlated (|r| >= {NEAR_PERFECT_CORRELATION}); columns may be duplicated or derived"
+            ),
+            "impact": "medium",
+        })
+    elif corr_columns >= MIN_COLUMNS_FOR_INDEPENDENCE_FLAG and max_abs < NEAR_ZERO_CORRELATION:
+        evidence.append({
+            "feature": "Column Correlation",
+            "description": (
+                f"All {int(corr_columns)} numeric columns are mutually uncorrelated (max |r| {max_abs:.3f}); "
+                "independently generated columns are typical of synthetic data"
+            ),
+            "impact": "high",
+        })
+    else:
+        evidence.append({
+            "feature": "Column Correlation",
+            "description": f"Correlation matrix appears normal (mean |r| {mean_abs:.3f}, max |r| {max_abs:.3f})",
+            "impact": "low",
+        })
+
+    return evidence
@@ -0,0 +1,128 @@
+# app/veritas/executor.py
+"""
+Выполнение тяжёлых задач Veritas вне event loop.
+
+Разбор файла и расчёт признаков выполняются в отдельном пуле процессов, размер
+которого равен числу ядер. Очередь ограничена: если все места заняты, задача не
+принимается (API отвечает 429), а у каждой задачи есть таймаут ожидания результата.
+"""
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Any, Callable, Optional
+
+from .. import metrics
+
+# Число процессов-воркеров (по умолчанию — число ядер; app/serve.py делит ядра между воркерами API)
+VERITAS_WORKERS = int(os.getenv("VERITAS_WORKERS", "0")) or os.cpu_count() or 1
+# Сколько задач может ждать в очереди сверх выполняющихся
+VERITAS_QUEUE_SIZE = int(os.getenv("VERITAS_QUEUE_SIZE", str(VERITAS_WORKERS * 4)))
+# Сколько секунд ждать результат одной задачи
+VERITAS_JOB_TIMEOUT_S = float(os.getenv("VERITAS_JOB_TIMEOUT_S", "300"))
+
+
+class VeritasQueueFull(Exception):
+    """Очередь анализа заполнена — новая задача не принята."""
+
+
+class VeritasJobTimeout(Exception):
+    """Задача не уложилась в отведённое время."""
+
+
+class VeritasExecutor:
+    """Пул процессов с ограниченной очередью (admission control) и таймаутами."""
+
+    def __init__(self, workers: int = VERITAS_WORKERS, queue_size: int = VERITAS_QUEUE_SIZE,
+                 timeout: float = VERITAS_JOB_TIMEOUT_S):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.timeout = timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Число принятых, но ещё не завершённых задач (включая выполняющиеся)."""
+        return self._pending
+
+    def has_capacity(self) -> bool:
+        """Есть ли место для новой задачи (проверка до приёма загрузки; submit всё равно может отказать)."""
+        return self._pending < self.capacity
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: воркеры не наследуют потоки и сокеты сервера (и работает на Windows)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Ставит задачу в пул или бросает VeritasQueueFull, если мест нет."""
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise VeritasQueueFull("Veritas analysis queue is full, please retry later")
+            self._pending += 1
+            try:
+                future = self._get_pool().submit(fn, *args)
+            except Exception:
+                self._pending -= 1
+                raise
+        # Место освобождается, только когда задача реально завершилась (даже после таймаута)
+        future.add_done_callback(self._release)
+        future.add_done_callback(self._observer(getattr(fn, "__name__", "job")))
+        return future
+
+    async def wait(self, future: Future, timeout: Optional[float] = None) -> Any:
+        """Ждёт результат задачи, не блокируя event loop."""
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            # Ещё не начатую задачу отменяем; уже выполняющаяся доработает и освободит место
+            future.cancel()
+            raise VeritasJobTimeout("Veritas analysis timed out")
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """Выполняет задачу в пуле и ждёт результат."""
+        return await self.wait(self.submit(fn, *args), timeout)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _release(self, _future: Future):
+        with self._lock:
+            self._pending -= 1
+
+    @staticmethod
+    def _observer(phase: str) -> Callable[[Future], None]:
+        # Длительность от постановки в очередь до результата: ожидание свободного воркера + разбор и признаки
+        started = time.perf_counter()
+
+        def observe(future: Future):
+            if not future.cancelled():
+                metrics.veritas_phase_duration_seconds.observe(time.perf_counter() - started, phase=phase)
+        return observe
+
+
+# Общий пул для всего приложения (у каждого воркера API — свой)
+veritas_executor = VeritasExecutor()
+
+
+def _collect_metrics():
+    return [
+        ("veritas_pool_pending_jobs", "gauge", "Accepted Veritas jobs not finished yet (running and queued)",
+         [({}, veritas_executor.pending)]),
+        ("veritas_pool_capacity", "gauge", "Veritas worker pool capacity (workers + queue slots)",
+         [({}, veritas_executor.capacity)]),
+    ]
+
+
+metrics.registry.register_collector("veritas_executor", _collect_metrics)
@@ -5,6 +5,8 @@ import io
 from typing import Dict, Any, Union
 import numpy as np
 
+from . import evidence
+
 def calculate_features(file_contents: bytes, file_type: str = 'csv') -> Dict[str, Any]:
     """
     Вычисляет набор статистических признаков из содержимого файла.
@@ -28,25 +30,40 @@ def calculate_features(file_contents: bytes, file_type: str = 'csv') -> Dict[str
         print(f"Ошибка при чтении файла: {e}")
         return {"error": "Failed to parse the file."}
 
-    #Example
-
     features['row_count'] = len(df)
     features['column_count'] = len(df.columns)
 
+    # Признаки для числовых колонок считаем одним проходом df.agg,
+    # а для текстовых/категориальных — одним вызовом nunique
+    numeric_cols = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+    object_cols = [col for col in df.columns if pd.api.types.is_object_dtype(df[col])]
+
+    stats = df[numeric_cols].agg(['mean', 'std', 'skew', 'kurt']) if numeric_cols else None
+    # Коэффициент уникальности (отношение уникальных значений ко всем)
+    uniques = df[object_cols].nunique() if object_cols else None
+
     for col in df.columns:
-        # Признаки для числовых колонок
-        if pd.api.types.is_numeric_dtype(df[col]):
-            features[f'{col}_mean'] = df[col].mean()
-            features[f'{col}_std'] = df[col].std()
-            features[f'{col}_skew'] = df[col].skew()
-            features[f'{col}_kurtosis'] = df[col].kurt()
-
-        # Признаки для текстовых/категориальных колонок
-        elif pd.api.types.is_object_dtype(df[col]):
-            # Коэффициент уникальности (отношение уникальных значений ко всем)
-            features[f'{col}_uniqueness_ratio'] = df[col].nunique() / len(df) if len(df) > 0 else 0
-
-    # Удаляем NaN/inf значения, которые не сериализуются в JSON
+        if col in numeric_cols:
+            column_stats = stats[col]
+            features[f'{col}_mean'] = column_stats['mean']
+            features[f'{col}_std'] = column_stats['std']
+            features[f'{col}_skew'] = column_stats['skew']
+            features[f'{col}_kurtosis'] = column_stats['kurt']
+        elif col in object_cols:
+            features[f'{col}_uniqueness_ratio'] = uniques[col] / len(df) if len(df) > 0 else 0
+
+    # Дополнительные признаки: закон Бенфорда и структура корреляций (см. evidence.py)
+    if numeric_cols:
+        matrix = df[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        features.update(evidence.evidence_features(matrix, numeric_cols))
+
+    return clean_features(features)
+
+
+def clean_features(features: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Удаляет NaN/inf значения, которые не сериализуются в JSON.
+    """
     cleaned_features = {}
     for key, value in features.items():
         # Проверяем, является ли значение числом и конечным (не NaN/inf)
@@ -0,0 +1,23 @@
+# app/veritas/jobs.py
+"""
+Функции, которые выполняются в процессах пула Veritas.
+
+Модуль намеренно импортирует только код расчёта признаков: воркеру не нужны
+ни FastAPI, ни БД, ни ML-модель.
+"""
+from typing import Dict, Any
+
+from .streaming_features import calculate_features_streaming
+from .approximate import calculate_features_approx
+
+
+def compute_features(path: str, file_type: str) -> Dict[str, Any]:
+    """Считает признаки для файла, сохранённого на диск."""
+    with open(path, "rb") as f:
+        return calculate_features_streaming(f, file_type=file_type)
+
+
+def compute_features_approx(path: str, file_type: str, max_rows: int, time_budget_ms: int) -> Dict[str, Any]:
+    """Считает признаки по выборке строк в пределах бюджета времени."""
+    with open(path, "rb") as f:
+        return calculate_features_approx(f, file_type=file_type, max_rows=max_rows, time_budget_ms=time_budget_ms)
@@ -1,42 +1,300 @@
 # app/veritas/predictor.py
 
+import os
+import time
+import asyncio
+import hashlib
+import threading
 import joblib
+import numpy as np
 import pandas as pd
-from typing import Dict, Any
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from .. import metrics
+
+# Путь к файлу модели
+VERITAS_MODEL_PATH = os.getenv("VERITAS_MODEL_PATH", "app/ml_models/authenticity_model.pkl")
+# Режим memory-map для массивов модели ("r" — общие страницы для всех воркеров; пусто — загрузка в память)
+VERITAS_MODEL_MMAP = os.getenv("VERITAS_MODEL_MMAP", "r") or None
+# Как часто (в секундах) проверять, не изменился ли файл модели (0 — не проверять)
+VERITAS_MODEL_WATCH_S = float(os.getenv("VERITAS_MODEL_WATCH_S", "0"))
+# Загружать модель при старте приложения, а не при первом запросе
+VERITAS_MODEL_WARMUP = os.getenv("VERITAS_MODEL_WARMUP", "false").lower() in ("1", "true", "yes")
+
+# Параметры микро-батчинга: максимальный размер пачки и максимальное ожидание её наполнения
+VERITAS_BATCH_MAX_SIZE = int(os.getenv("VERITAS_BATCH_MAX_SIZE", "64"))
+VERITAS_BATCH_MAX_WAIT_MS = float(os.getenv("VERITAS_BATCH_MAX_WAIT_MS", "5"))
+
+
+class ModelLoadError(Exception):
+    """Новую версию модели не удалось загрузить — активная версия не менялась."""
+
 
 class ModelPredictor:
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, fill_value: float = 0.0, mmap_mode: Optional[str] = None):
         print(f"--- Загрузка ML-модели из файла: {model_path} ---")
+        self.load_error: Optional[str] = None
+        started = time.perf_counter()
         try:
-            self.model = joblib.load(model_path)
+            # С mmap_mode numpy-массивы модели отображаются из файла, а не копируются:
+            # процессы, загрузившие один и тот же файл, делят эти страницы памяти
+            self.model = joblib.load(model_path, mmap_mode=mmap_mode)
             print("--- Модель успешно загружена ---")
         except Exception as e:
             self.model = None
+            self.load_error = str(e)
             print(f" ОШИБКА: Не удалось загрузить модель. {e}")
+        self.load_seconds = time.perf_counter() - started
 
-    def predict(self, features: Dict[str, Any]) -> float:
+        # Порядок признаков, на котором обучалась модель, вычисляется один раз.
+        # Словарь признаков превращается в вектор через этот индекс, поэтому
+        # порядок ключей в словаре (и порядок колонок в файле) больше не важен.
+        self.fill_value = fill_value
+        self.feature_names: List[str] = self._expected_feature_names()
+        self._index: Dict[str, int] = {name: i for i, name in enumerate(self.feature_names)}
+
+    def _expected_feature_names(self) -> List[str]:
+        names = getattr(self.model, "feature_names_in_", None)
+        return [str(name) for name in names] if names is not None else []
+
+    def vectorize(self, features: Dict[str, Any]) -> np.ndarray:
         """
-        Принимает на вход словарь со статистическими признаками
-        и возвращает предсказание модели.
+        Превращает словарь признаков в вектор в порядке признаков модели.
+        Отсутствующие и нечисловые (NaN/None) значения заменяются на fill_value.
+        """
+        vector = np.full(len(self.feature_names), self.fill_value, dtype=np.float64)
+        index = self._index
+        for key, value in features.items():
+            position = index.get(key)
+            if position is not None and isinstance(value, (int, float)) and np.isfinite(value):
+                vector[position] = value
+        return vector
+
+    def predict_batch(self, features_batch: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Принимает список словарей признаков и возвращает вероятности
+        класса "синтетика" для всех одним вызовом predict_proba.
         """
         if not self.model:
             print("⚠️ ВНИМАНИЕ: Модель не загружена, возвращается значение по умолчанию.")
-            return 0.5 # Возвращаем нейтральное значение, если модель не работает
+            return np.full(len(features_batch), 0.5) # Нейтральное значение, если модель не работает
 
         try:
-            # Преобразуем входные данные в DataFrame, который ожидает модель
-            # Убедитесь, что порядок колонок совпадает с тем, на котором обучалась модель
-            df = pd.DataFrame([features])
+            if self.feature_names:
+                matrix = np.vstack([self.vectorize(features) for features in features_batch])
+                # DataFrame создаётся один раз на пачку, чтобы модель получила имена колонок
+                X = pd.DataFrame(matrix, columns=self.feature_names)
+            else:
+                # Модель обучена без имён признаков — порядок берём из словарей, как раньше
+                X = pd.DataFrame(features_batch)
 
             # Получаем вероятность класса "1" (синтетика)
-            # Индекс [0, 1] может отличаться в зависимости от вашей модели
-            probability = self.model.predict_proba(df)[0, 1]
-
-            return float(probability)
+            # Индекс [:, 1] может отличаться в зависимости от вашей модели
+            return self.model.predict_proba(X)[:, 1].astype(np.float64)
         except Exception as e:
             print(f" ОШИБКА: Не удалось выполнить предсказание. {e}")
-            return 0.5
+            return np.full(len(features_batch), 0.5)
+
+    def predict(self, features: Dict[str, Any]) -> float:
+        """
+        Принимает на вход словарь со статистическими признаками
+        и возвращает предсказание модели.
+        """
+        return float(self.predict_batch([features])[0])
+
+
+class MicroBatcher:
+    """
+    Объединяет одновременные запросы на предсказание в пачки.
+
+    Пачка отправляется в модель, как только набралось max_batch_size запросов
+    или прошло max_wait_ms с момента поступления первого из них. Сам predict_proba
+    выполняется в потоке, чтобы не блокировать event loop.
+    """
+
+    def __init__(self, get_predictor: Callable[[], ModelPredictor], max_batch_size: int = VERITAS_BATCH_MAX_SIZE,
+                 max_wait_ms: float = VERITAS_BATCH_MAX_WAIT_MS):
+        # Предсказатель запрашивается заново для каждой пачки, поэтому подмена
+        # модели в реестре подхватывается без перезапуска
+        self.get_predictor = get_predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.items = 0
+
+    async def predict(self, features: Dict[str, Any]) -> float:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((features, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            probabilities = await loop.run_in_executor(
+                None, self._predict, [features for features, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), probability in zip(batch, probabilities):
+            if not future.done():
+                future.set_result(float(probability))
+
+    def _predict(self, features_batch: List[Dict[str, Any]]) -> np.ndarray:
+        # Выполняется в потоке: первая загрузка модели тоже не блокирует event loop
+        predictor = self.get_predictor()
+        metrics.veritas_batch_size.observe(len(features_batch))
+        with metrics.veritas_phase_duration_seconds.time(phase="predict"):
+            return predictor.predict_batch(features_batch)
+
+
+def _file_version(path: str) -> str:
+    """Версия модели — короткий хеш содержимого файла."""
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Реестр активной версии модели Veritas.
+
+    Модель загружается лениво — при первом запросе или явном warm_up(), а не при
+    импорте модуля. Новая версия сначала полностью загружается и только потом
+    атомарно подменяет активную; запросы, уже получившие старый предсказатель,
+    спокойно дорабатывают на нём.
+    """
+
+    def __init__(self, path: str = VERITAS_MODEL_PATH, mmap_mode: Optional[str] = VERITAS_MODEL_MMAP,
+                 watch_interval: float = VERITAS_MODEL_WATCH_S):
+        self.path = path
+        self.mmap_mode = mmap_mode
+        self.watch_interval = watch_interval
+        self._active: Optional[ModelPredictor] = None
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self.version: Optional[str] = None
+        self.loaded_at: Optional[datetime] = None
+
+    def get(self) -> ModelPredictor:
+        """Возвращает активный предсказатель, при необходимости загружая модель."""
+        active = self._active
+        if active is None:
+            with self._lock:
+                if self._active is None:
+                    self._load_locked(self.path, keep_previous_on_error=False)
+                return self._active
+        if self.watch_interval > 0:
+            self._check_for_update()
+        return self._active
+
+    def warm_up(self) -> ModelPredictor:
+        """Явная загрузка модели (например, при старте приложения)."""
+        return self.get()
+
+    def reload(self) -> ModelPredictor:
+        """
+        Загружает модель из файла заново и подменяет активную версию.
+        Если файл не загружается, бросает ModelLoadError, а активная версия остаётся прежней.
+        """
+        with self._lock:
+            return self._load_locked(self.path, keep_previous_on_error=True)
+
+    def status(self) -> Dict[str, Any]:
+        active = self._active
+        return {
+            "path": self.path,
+            "loaded": active is not None and active.model is not None,
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "load_seconds": active.load_seconds if active is not None else None,
+            "feature_count": len(active.feature_names) if active is not None else None,
+            "mmap_mode": self.mmap_mode,
+            "error": active.load_error if active is not None else None,
+        }
+
+    def _check_for_update(self):
+        # Файл проверяется не чаще раза в watch_interval секунд
+        now = time.monotonic()
+        if now - self._last_check < self.watch_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime or not self._lock.acquire(blocking=False):
+            return
+        try:
+            print(f"--- Файл модели {self.path} изменился, загружаем новую версию ---")
+            self._load_locked(self.path, keep_previous_on_error=True)
+        except ModelLoadError as e:
+            # Не пытаемся загружать тот же битый файл на каждой проверке
+            self._mtime = mtime
+            print(f" ОШИБКА: Новая версия модели не загружена, остаётся {self.version}. {e}")
+        finally:
+            self._lock.release()
+
+    def _load_locked(self, path: str, keep_previous_on_error: bool) -> ModelPredictor:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            mtime = None
+        candidate = ModelPredictor(path, mmap_mode=self.mmap_mode)
+        if candidate.model is None and keep_previous_on_error and self._active is not None:
+            raise ModelLoadError(candidate.load_error or "Model could not be loaded")
+
+        version = _file_version(path) if candidate.model is not None else None
+        # Подмена одной ссылкой — атомарна для всех потоков
+        self._active = candidate
+        self._mtime = mtime
+        self.version = version
+        self.loaded_at = datetime.now(timezone.utc)
+        print(f"--- Активная версия модели: {version} (загрузка {candidate.load_seconds:.3f} с) ---")
+        return candidate
+
 
 # --- ГЛАВНАЯ ЧАСТЬ ---
-# Создаем единственный экземпляр нашего предсказателя, который будет использоваться во всем приложении
-model_predictor = ModelPredictor("app/ml_models/authenticity_model.pkl")
\ No newline at end of file
+# Единственный реестр модели для всего приложения; сама модель загружается при первом использовании
+model_registry = ModelRegistry()
+# Все предсказания из API проходят через общий микро-батчер
+batcher = MicroBatcher(model_registry.get)
+
+
+def _collect_metrics():
+    return [
+        ("veritas_batcher_batches_total", "counter", "Model calls made by the micro-batcher",
+         [({}, batcher.batches)]),
+        ("veritas_batcher_items_total", "counter", "Predictions served by the micro-batcher",
+         [({}, batcher.items)]),
+        ("veritas_model_loaded", "gauge", "1 if a Veritas model version is active",
+         [({"version": model_registry.version or ""}, 1 if model_registry.version else 0)]),
+    ]
+
+
+metrics.registry.register_collector("veritas_predictor", _collect_metrics)
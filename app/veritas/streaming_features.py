@@ -0,0 +1,448 @@
+# app/veritas/streaming_features.py
+"""
+Потоковый расчёт признаков Veritas.
+
+Файл читается блоками (chunks), и для каждой колонки поддерживаются сливаемые
+аккумуляторы: моменты (count, mean, M2, M3, M4) для числовых признаков и скетч
+уникальности для текстовых. Память ограничена размером блока, а не файла, при этом
+результат совпадает с calculate_features() в пределах численной погрешности.
+"""
+import io
+import os
+from typing import Dict, Any, Union, BinaryIO, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .feature_calculator import calculate_features, clean_features
+from .evidence import EvidenceAccumulator
+
+# Сколько строк читать за один раз
+VERITAS_CHUNK_ROWS = int(os.getenv("VERITAS_CHUNK_ROWS", "50000"))
+# Версия формата сохранённого состояния (FeatureAccumulator.to_state); другая версия — пересборка
+STATE_VERSION = 1
+
+# Значения, которые pandas распознаёт как bool при обычном чтении CSV (только в колонке без пропусков:
+# с пропусками колонка остаётся текстовой)
+_BOOL_VALUES = {"True": 1.0, "TRUE": 1.0, "true": 1.0, "False": 0.0, "FALSE": 0.0, "false": 0.0}
+
+
+class MomentAccumulator:
+    """
+    Сливаемые центральные моменты до 4-го порядка (формулы Pébay).
+    Итоговые std/skew/kurtosis считаются так же, как в pandas (несмещённые оценки).
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.m4 = 0.0
+
+    def update(self, values: np.ndarray):
+        """Добавляет блок значений (NaN пропускаются)."""
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        chunk = MomentAccumulator()
+        chunk.n = int(values.size)
+        chunk.mean = float(values.mean())
+        d = values - chunk.mean
+        d2 = d * d
+        chunk.m2 = float(d2.sum())
+        chunk.m3 = float((d2 * d).sum())
+        chunk.m4 = float((d2 * d2).sum())
+        self.merge(chunk)
+
+    def merge(self, other: "MomentAccumulator"):
+        """Сливает другой аккумулятор в текущий."""
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n, self.mean, self.m2, self.m3, self.m4 = other.n, other.mean, other.m2, other.m3, other.m4
+            return
+
+        na, nb = self.n, other.n
+        n = na + nb
+        delta = other.mean - self.mean
+        delta2 = delta * delta
+
+        mean = self.mean + delta * nb / n
+        m2 = self.m2 + other.m2 + delta2 * na * nb / n
+        m3 = (self.m3 + other.m3
+              + delta * delta2 * na * nb * (na - nb) / (n * n)
+              + 3.0 * delta * (na * other.m2 - nb * self.m2) / n)
+        m4 = (self.m4 + other.m4
+              + delta2 * delta2 * na * nb * (na * na - na * nb + nb * nb) / (n ** 3)
+              + 6.0 * delta2 * (na * na * other.m2 + nb * nb * self.m2) / (n * n)
+              + 4.0 * delta * (na * other.m3 - nb * self.m3) / n)
+
+        self.n, self.mean, self.m2, self.m3, self.m4 = n, mean, m2, m3, m4
+
+    # --- Итоговые статистики (как в pandas) ---
+
+    def mean_value(self) -> float:
+        return self.mean if self.n > 0 else np.nan
+
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else np.nan
+
+    def skew(self) -> float:
+        n = self.n
+        if n < 3:
+            return np.nan
+        m2, m3 = _zero_fperr(self.m2), _zero_fperr(self.m3)
+        if m2 == 0:
+            return 0.0
+        return (n * (n - 1) ** 0.5 / (n - 2)) * (m3 / m2 ** 1.5)
+
+    def kurtosis(self) -> float:
+        n = self.n
+        if n < 4:
+            return np.nan
+        m2, m4 = _zero_fperr(self.m2), _zero_fperr(self.m4)
+        denominator = (n - 2) * (n - 3) * m2 ** 2
+        if denominator == 0:
+            return 0.0
+        adj = 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+        return n * (n + 1) * (n - 1) * m4 / denominator - adj
+
+
+def _zero_fperr(value: float) -> float:
+    # pandas обнуляет моменты, неотличимые от ошибки округления
+    return 0.0 if abs(value) < 1e-14 else value
+
+
+class UniquenessSketch:
+    """
+    Оценка числа уникальных значений.
+
+    Пока различных значений немного, хранятся их 64-битные хеши (точный подсчёт).
+    После порога exact_limit скетч переключается на HyperLogLog с 2^precision
+    регистрами (~0.8% погрешности при precision=14), и память больше не растёт.
+    """
+
+    def __init__(self, exact_limit: int = 1 << 16, precision: int = 14):
+        self.exact_limit = exact_limit
+        self.precision = precision
+        self._hashes: Optional[np.ndarray] = np.empty(0, dtype=np.uint64)
+        self._registers: Optional[np.ndarray] = None
+
+    @property
+    def is_exact(self) -> bool:
+        return self._registers is None
+
+    def update(self, values: pd.Series):
+        """Добавляет блок значений (NaN пропускаются)."""
+        values = values.dropna()
+        if values.empty:
+            return
+        self.update_hashes(pd.util.hash_pandas_object(values.astype(str), index=False).to_numpy())
+
+    def update_hashes(self, hashes: np.ndarray):
+        if self.is_exact:
+            self._hashes = np.union1d(self._hashes, hashes)
+            if self._hashes.size > self.exact_limit:
+                self._to_hll()
+        else:
+            self._add_to_registers(hashes)
+
+    def merge(self, other: "UniquenessSketch"):
+        if other.is_exact:
+            self.update_hashes(other._hashes)
+            return
+        if self.is_exact:
+            hashes = self._hashes
+            self._registers = other._registers.copy()
+            self._hashes = None
+            self._add_to_registers(hashes)
+        else:
+            np.maximum(self._registers, other._registers, out=self._registers)
+
+    def count(self) -> float:
+        if self.is_exact:
+            return float(self._hashes.size)
+
+        m = self._registers.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self._registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self._registers == 0))
+        if estimate <= 2.5 * m and zeros > 0:
+            # Коррекция для малых кардинальностей (linear counting)
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+    def _to_hll(self):
+        hashes = self._hashes
+        self._registers = np.zeros(1 << self.precision, dtype=np.uint8)
+        self._hashes = None
+        self._add_to_registers(hashes)
+
+    def _add_to_registers(self, hashes: np.ndarray):
+        p = self.precision
+        hashes = hashes.astype(np.uint64, copy=False)
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest = hashes << np.uint64(p)
+
+        # Число ведущих нулей в оставшихся (64 - p) битах; считаем по 32-битным половинам,
+        # чтобы log2 вычислялся точно
+        hi = (rest >> np.uint64(32)).astype(np.float64)
+        lo = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        with np.errstate(divide="ignore"):
+            lz_hi = 31 - np.floor(np.log2(hi))
+            lz_lo = 63 - np.floor(np.log2(lo))
+        leading_zeros = np.where(hi > 0, lz_hi, np.where(lo > 0, lz_lo, 64 - p))
+        rank = np.minimum(leading_zeros, 64 - p) + 1
+
+        np.maximum.at(self._registers, index, rank.astype(np.uint8))
+
+
+class ColumnAccumulator:
+    """
+    Состояние одной колонки: числовые моменты и скетч уникальности.
+
+    kind — вид значений в уже прочитанных блоках ("number" или "bool" для записей
+    True/False в CSV). Как и pandas, колонка из чисел вперемешку с True/False или
+    колонка True/False с пропусками считается текстовой.
+    """
+
+    def __init__(self):
+        self.numeric = True
+        self.kind: Optional[str] = None
+        self.has_missing = False
+        self.moments = MomentAccumulator()
+        self.sketch = UniquenessSketch()
+
+    def update(self, values: pd.Series) -> Optional[np.ndarray]:
+        """Добавляет блок значений; возвращает их числовое представление (или None)."""
+        self.sketch.update(values)
+        if not self.numeric:
+            return None
+
+        numeric, kind = _numeric_kind(values)
+        if numeric is not None:
+            self._observe(kind, bool(values.isna().any()))
+        if numeric is None or not self.numeric:
+            # Колонка оказалась текстовой: моменты больше не нужны
+            self._to_text()
+            return None
+        self.moments.update(numeric)
+        return numeric
+
+    def merge(self, other: "ColumnAccumulator"):
+        self.sketch.merge(other.sketch)
+        self.numeric = self.numeric and other.numeric
+        if self.numeric:
+            self._observe(other.kind, other.has_missing)
+        if self.numeric:
+            self.moments.merge(other.moments)
+        else:
+            self._to_text()
+
+    def _observe(self, kind: Optional[str], has_missing: bool):
+        self.has_missing = self.has_missing or has_missing
+        if kind is not None:
+            if self.kind is not None and self.kind != kind:
+                self.numeric = False
+            self.kind = kind
+        if self.kind == "bool" and self.has_missing:
+            self.numeric = False
+
+    def _to_text(self):
+        self.numeric = False
+        self.moments = MomentAccumulator()
+
+
+def _numeric_kind(values: pd.Series) -> Tuple[Optional[np.ndarray], Optional[str]]:
+    """
+    Приводит блок к float64, если все непустые значения — числа (или bool).
+    Возвращает массив и вид значений ("number", "bool" или None для блока из одних
+    пропусков); массив None, если блок текстовый.
+    """
+    present = values.notna()
+    kind = "number" if present.any() else None
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=np.float64, na_value=np.nan), kind
+
+    converted = pd.to_numeric(values, errors="coerce")
+    if not converted[present].isna().any():
+        return converted.to_numpy(dtype=np.float64, na_value=np.nan), kind
+
+    as_bool = values[present].map(_BOOL_VALUES)
+    if not as_bool.isna().any():
+        return values.map(_BOOL_VALUES).to_numpy(dtype=np.float64, na_value=np.nan), "bool"
+    return None, None
+
+
+def _to_numeric(values: pd.Series) -> Optional[np.ndarray]:
+    """
+    Числовое представление отдельного блока (None, если pandas при чтении такого
+    блока посчитал бы колонку текстовой).
+    """
+    numeric, kind = _numeric_kind(values)
+    if kind == "bool" and values.isna().any():
+        return None
+    return numeric
+
+
+class FeatureAccumulator:
+    """Сливаемое состояние признаков для всего файла (или датасета)."""
+
+    def __init__(self):
+        self.row_count = 0
+        self.columns: Dict[str, ColumnAccumulator] = {}
+        self.evidence = EvidenceAccumulator()
+
+    def update(self, chunk: pd.DataFrame):
+        """Добавляет блок строк."""
+        self.row_count += len(chunk)
+        numeric_names, numeric_values = [], []
+        for col in chunk.columns:
+            accumulator = self.columns.get(col)
+            if accumulator is None:
+                # Колонка может появиться не в первом блоке (JSON lines):
+                # в предыдущих строках она считается пустой, как и в pandas
+                accumulator = self.columns[col] = ColumnAccumulator()
+            numeric = accumulator.update(chunk[col])
+            if numeric is not None:
+                numeric_names.append(col)
+                numeric_values.append(numeric)
+
+        if numeric_values:
+            self.evidence.update(numeric_names, np.column_stack(numeric_values))
+
+    def merge(self, other: "FeatureAccumulator"):
+        self.row_count += other.row_count
+        for col, accumulator in other.columns.items():
+            if col in self.columns:
+                self.columns[col].merge(accumulator)
+            else:
+                self.columns[col] = accumulator
+        self.evidence.merge(other.evidence)
+
+    def to_state(self) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """
+        Состояние без pickle: скаляры (моменты, виды колонок) для JSON и массивы NumPy
+        (хеши или регистры скетчей, счётчики цифр и суммы для корреляций).
+        """
+        columns, arrays = [], {}
+        for i, (name, column) in enumerate(self.columns.items()):
+            moments, sketch = column.moments, column.sketch
+            columns.append({
+                "name": name,
+                "numeric": column.numeric,
+                "kind": column.kind,
+                "has_missing": column.has_missing,
+                "moments": [moments.n, moments.mean, moments.m2, moments.m3, moments.m4],
+                "exact_limit": sketch.exact_limit,
+                "precision": sketch.precision,
+                "exact": sketch.is_exact,
+            })
+            arrays[f"sketch_{i}"] = sketch._hashes if sketch.is_exact else sketch._registers
+        evidence_meta, evidence_arrays = self.evidence.to_state()
+        arrays.update({f"evidence_{name}": array for name, array in evidence_arrays.items()})
+        meta = {"version": STATE_VERSION, "row_count": self.row_count, "columns": columns, "evidence": evidence_meta}
+        return meta, arrays
+
+    @classmethod
+    def from_state(cls, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> "FeatureAccumulator":
+        """Восстанавливает аккумулятор из to_state(); ValueError, если формат другой версии."""
+        if meta.get("version") != STATE_VERSION:
+            raise ValueError(f"Unsupported feature state version: {meta.get('version')}")
+        accumulator = cls()
+        accumulator.row_count = meta["row_count"]
+        for i, item in enumerate(meta["columns"]):
+            column = ColumnAccumulator()
+            column.numeric, column.kind, column.has_missing = item["numeric"], item["kind"], item["has_missing"]
+            moments = column.moments
+            moments.n, moments.mean, moments.m2, moments.m3, moments.m4 = item["moments"]
+            sketch = column.sketch = UniquenessSketch(item["exact_limit"], item["precision"])
+            if item["exact"]:
+                sketch._hashes = arrays[f"sketch_{i}"].astype(np.uint64)
+            else:
+                sketch._hashes, sketch._registers = None, arrays[f"sketch_{i}"].astype(np.uint8)
+            accumulator.columns[item["name"]] = column
+        prefix = "evidence_"
+        accumulator.evidence = EvidenceAccumulator.from_state(
+            meta["evidence"], {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+        )
+        return accumulator
+
+    def features(self) -> Dict[str, Any]:
+        """Возвращает словарь признаков в том же формате, что и calculate_features()."""
+        features = {
+            'row_count': self.row_count,
+            'column_count': len(self.columns),
+        }
+        # В пустом файле pandas считает все колонки текстовыми
+        numeric_cols = [
+            col for col, accumulator in self.columns.items()
+            if accumulator.numeric and self.row_count > 0
+        ]
+        for col, accumulator in self.columns.items():
+            if col in numeric_cols:
+                moments = accumulator.moments
+                features[f'{col}_mean'] = moments.mean_value()
+                features[f'{col}_std'] = moments.std()
+                features[f'{col}_skew'] = moments.skew()
+                features[f'{col}_kurtosis'] = moments.kurtosis()
+            else:
+                features[f'{col}_uniqueness_ratio'] = (
+                    accumulator.sketch.count() / self.row_count if self.row_count > 0 else 0
+                )
+
+        # Дополнительные признаки: закон Бенфорда и структура корреляций
+        if numeric_cols:
+            features.update(self.evidence.features(numeric_cols))
+        return clean_features(features)
+
+
+def _iter_chunks(source: BinaryIO, file_type: str, chunksize: int):
+    if file_type == 'csv':
+        # Читаем всё как строки: тип колонки определяется по всему файлу, а не по блоку
+        return pd.read_csv(source, dtype=str, chunksize=chunksize)
+    if file_type == 'json':
+        return pd.read_json(source, lines=True, chunksize=chunksize)
+    raise ValueError("Unsupported file type")
+
+
+def calculate_features_streaming(
+    source: Union[bytes, BinaryIO],
+    file_type: str = 'csv',
+    chunksize: int = VERITAS_CHUNK_ROWS
+) -> Dict[str, Any]:
+    """
+    Вычисляет признаки, читая файл блоками.
+
+    :param source: Содержимое файла (bytes) или бинарный файловый объект.
+    :param file_type: Тип файла ('csv', 'json' или 'xlsx').
+    :param chunksize: Размер блока в строках.
+    :return: Словарь с вычисленными признаками.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    if file_type == 'json' and _starts_with(source, b"["):
+        # Обычный JSON-массив блоками не читается — считаем признаки по-старому
+        return calculate_features(source.read(), file_type='json')
+    if file_type == 'xlsx':
+        return calculate_features(source.read(), file_type='xlsx')
+
+    accumulator = FeatureAccumulator()
+    try:
+        for chunk in _iter_chunks(source, file_type, chunksize):
+            accumulator.update(chunk)
+    except Exception as e:
+        print(f"Ошибка при чтении файла: {e}")
+        return {"error": "Failed to parse the file."}
+
+    return accumulator.features()
+
+
+def _starts_with(source: BinaryIO, prefix: bytes) -> bool:
+    """Проверяет первый непробельный байт файла, не сдвигая позицию чтения."""
+    position = source.tell()
+    head = source.read(64).lstrip()
+    source.seek(position)
+    return head.startswith(prefix)
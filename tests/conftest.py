@@ -0,0 +1,71 @@
+# tests/conftest.py
+"""
+Общие фикстуры: временная БД SQLite, файлы шардов и снимков в tmp_path.
+
+Движок БД создаётся при импорте app.database, поэтому DATABASE_URL задаётся до
+первого импорта приложения; остальные каталоги подменяются для каждого теста.
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+_DB_DIR = tempfile.mkdtemp(prefix="dp_tests_")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_DB_DIR, "test.db")
+os.environ.setdefault("SECRET_KEY", "tests")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app import crud, models, schemas, shards, snapshots
+from app.database import SessionLocal
+from app.migrations import run_migrations
+
+run_migrations()
+
+
+@pytest.fixture(autouse=True)
+def data_dirs(tmp_path, monkeypatch):
+    """Файлы шардов и снимков — в каталоге теста."""
+    monkeypatch.setattr(shards, "SHARD_DIR", str(tmp_path / "shards"))
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    os.makedirs(shards.SHARD_DIR)
+    return tmp_path
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    db_user = models.User(email=f"{uuid.uuid4().hex}@example.com", password_hash="-", name="Tests")
+    db.add(db_user)
+    db.commit()
+    return db_user
+
+
+FIELDS = [
+    {"field_name": "name", "display_name": "Name", "type": "string"},
+    {"field_name": "age", "display_name": "Age", "type": "integer"},
+    {"field_name": "score", "display_name": "Score", "type": "number"},
+    {"field_name": "active", "display_name": "Active", "type": "boolean"},
+]
+
+
+@pytest.fixture
+def make_dataset(db, user):
+    """Создаёт шаблон с полями FIELDS (или своими) и датасет на нём."""
+
+    def make(storage: str = "json", isolated: bool = False, fields=None) -> models.Dataset:
+        template = crud.create_template(db, schemas.TemplateCreate(
+            name="t", schema={"fields": fields or FIELDS}, storage=storage), user.id)
+        return crud.create_dataset(db, schemas.DatasetCreate(
+            name="ds", template_id=template.id, isolated=isolated), user.id)
+
+    return make
@@ -0,0 +1,64 @@
+# tests/test_csv_import.py
+import pytest
+
+from app import crud
+from app.routers import datasets
+
+# Лишнее поле в строке a отбрасывается; последний блок (e, f) — только короткие строки
+CSV = "name,age,score,active\na,1,2.5,yes,extra\nb,abc,3,no\nc,4,x,maybe\nd,,,\ne,5\nf,zz\n"
+
+
+def _errors(outcome):
+    return [
+        {"row": 2, "field": "age", "value": "abc", "error": f"expected integer, {outcome}"},
+        {"row": 3, "field": "score", "value": "x", "error": f"expected number, {outcome}"},
+        {"row": 3, "field": "active", "value": "maybe", "error": f"expected boolean, {outcome}"},
+        {"row": 6, "field": "age", "value": "zz", "error": f"expected integer, {outcome}"},
+    ]
+
+
+def _import(db, dataset, tmp_path, monkeypatch):
+    # Блоки по две строки: номера строк в ошибках сквозные между блоками
+    monkeypatch.setattr(datasets, "IMPORT_CSV_CHUNK_ROWS", 2)
+    path = tmp_path / "import.csv"
+    path.write_text(CSV, encoding="utf-8")
+    result = datasets.process_csv_import(str(path), dataset.id)
+    rows = [row.row_data for row in crud.get_dataset_rows(db, dataset.id, limit=100)]
+    return result, sorted(rows, key=lambda row: row["name"])
+
+
+def test_json_template_keeps_bad_values_as_text(db, make_dataset, tmp_path, monkeypatch):
+    dataset = make_dataset("json")
+    result, rows = _import(db, dataset, tmp_path, monkeypatch)
+
+    assert result == {"rows_added": 6, "rows_rejected": 0, "errors": _errors("stored as text")}
+    assert rows == [
+        {"name": "a", "age": 1, "score": 2.5, "active": True},
+        {"name": "b", "age": "abc", "score": 3, "active": False},
+        {"name": "c", "age": 4, "score": "x", "active": "maybe"},
+        {"name": "d", "age": None, "score": None, "active": None},
+        {"name": "e", "age": 5, "score": None, "active": None},
+        {"name": "f", "age": "zz", "score": None, "active": None},
+    ]
+
+
+@pytest.mark.parametrize("isolated", [False, True])
+def test_typed_template_rejects_rows_with_bad_values(db, make_dataset, tmp_path, monkeypatch, isolated):
+    dataset = make_dataset("typed", isolated)
+    result, rows = _import(db, dataset, tmp_path, monkeypatch)
+
+    assert result == {"rows_added": 3, "rows_rejected": 3, "errors": _errors("row rejected")}
+    assert rows == [
+        {"name": "a", "age": 1, "score": 2.5, "active": True},
+        {"name": "d", "age": None, "score": None, "active": None},
+        {"name": "e", "age": 5, "score": None, "active": None},
+    ]
+
+
+def test_error_list_is_capped(db, make_dataset, tmp_path, monkeypatch):
+    monkeypatch.setattr(datasets, "IMPORT_MAX_ERRORS", 2)
+    dataset = make_dataset("typed")
+    result, _ = _import(db, dataset, tmp_path, monkeypatch)
+
+    assert result["rows_rejected"] == 3
+    assert result["errors"] == _errors("row rejected")[:2]
@@ -0,0 +1,77 @@
+# tests/test_row_migration.py
+import os
+
+import pytest
+
+from app import crud, models, row_storage, schemas, shards
+
+# 50 строк при batch_rows=7: перенос идёт несколькими пачками с неполной последней
+ROWS = [{"name": f"r{i:02d}", "age": i, "score": i + 0.5, "active": i % 2 == 0} for i in range(50)]
+
+
+def _rows(db, dataset_id):
+    # Порядок выдачи зависит от индекса хранилища, поэтому строки сравниваются по имени
+    rows = [row.row_data for row in crud.get_dataset_rows(db, dataset_id, limit=1000)]
+    return sorted(rows, key=lambda row: row["name"])
+
+
+def _row_ids(db, dataset_id):
+    return {row_id for row_id, *_ in crud.get_dataset_rows_raw(db, dataset_id, limit=1000)}
+
+
+@pytest.mark.parametrize("storage", ["json", "typed"])
+def test_isolate_dataset_keeps_every_row(db, make_dataset, storage):
+    dataset, neighbour = make_dataset(storage), make_dataset(storage)
+    crud.create_dataset_rows(db, ROWS, dataset.id)
+    crud.create_dataset_rows(db, ROWS[:3], neighbour.id)
+    ids = _row_ids(db, dataset.id)
+
+    assert row_storage.isolate_dataset(db, dataset.id, batch_rows=7) == len(ROWS)
+
+    store = row_storage.get_store(db, dataset.id)
+    assert store.shard == dataset.id and os.path.exists(shards.path(dataset.id))
+    assert _rows(db, dataset.id) == ROWS
+    assert _row_ids(db, dataset.id) == ids
+    # В основной БД строк датасета не осталось, соседний датасет не тронут
+    main = row_storage.store_for_template(dataset.template)
+    assert db.query(main.id).filter(main.dataset_id == dataset.id).count() == 0
+    assert _rows(db, neighbour.id) == ROWS[:3]
+
+    # Вставка после переноса идёт в файл датасета
+    crud.create_dataset_rows(db, [{"name": "new", "age": 1}], dataset.id)
+    assert len(_rows(db, dataset.id)) == len(ROWS) + 1
+    assert row_storage.isolate_dataset(db, dataset.id) == 0
+
+
+def test_migrate_template_keeps_every_row(db, make_dataset):
+    dataset = make_dataset("json")
+    template_id = dataset.template_id
+    isolated = crud.create_dataset(db, schemas.DatasetCreate(
+        name="isolated", template_id=template_id, isolated=True), dataset.owner_id)
+    crud.create_dataset_rows(db, ROWS, dataset.id)
+    crud.create_dataset_rows(db, ROWS[:20], isolated.id)
+    ids = {dataset.id: _row_ids(db, dataset.id), isolated.id: _row_ids(db, isolated.id)}
+
+    assert row_storage.migrate_template(db, template_id, batch_rows=7) == len(ROWS) + 20
+
+    assert db.get(models.Template, template_id).storage == "typed"
+    for dataset_id, expected in ((dataset.id, ROWS), (isolated.id, ROWS[:20])):
+        store = row_storage.get_store(db, dataset_id)
+        assert store.typed
+        assert _rows(db, dataset_id) == expected
+        assert _row_ids(db, dataset_id) == ids[dataset_id]
+    json_rows = row_storage.json_store
+    assert db.query(json_rows.id).filter(json_rows.dataset_id == dataset.id).count() == 0
+
+
+def test_migrate_template_with_bad_value_changes_nothing(db, make_dataset):
+    dataset = make_dataset("json")
+    crud.create_dataset_rows(db, ROWS + [{"name": "bad", "age": "many"}], dataset.id)
+
+    with pytest.raises(row_storage.RowValidationError):
+        row_storage.migrate_template(db, dataset.template_id, batch_rows=7)
+
+    db.expire_all()
+    row_storage.forget_store(db, dataset.id)
+    assert db.get(models.Template, dataset.template_id).storage == "json"
+    assert len(_rows(db, dataset.id)) == len(ROWS) + 1
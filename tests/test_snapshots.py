@@ -0,0 +1,70 @@
+# tests/test_snapshots.py
+import pytest
+
+from app import crud, snapshots
+
+
+def _snapshot(db, dataset):
+    return snapshots.get_snapshot(db, dataset, fresh=True)
+
+
+def _contents(snapshot):
+    return {name: column.to_list() for name, column in snapshot.columns.items()}
+
+
+@pytest.mark.parametrize("storage", ["json", "typed"])
+def test_append_and_kind_change_match_fresh_build(db, make_dataset, storage):
+    dataset = make_dataset(storage)
+    # В JSON-хранилище score сначала целый (int64), в типизированном — всегда float64
+    first = [{"name": f"n{i % 3}", "age": i, "score": i, "active": i % 2 == 0} for i in range(10)]
+    crud.create_dataset_rows(db, first, dataset.id)
+    built = _snapshot(db, dataset)
+    assert built.row_count == 10
+    generation = built.meta["generation"]
+
+    # 1. Дописывание без смены типов: то же поколение, новые значения словаря
+    crud.create_dataset_rows(db, [{"name": "extra", "age": 10, "score": 10, "active": None}], dataset.id)
+    appended = _snapshot(db, dataset)
+    assert appended.row_count == 11
+    assert appended.meta["generation"] == generation
+
+    # 2. Дробь в целой колонке и строка в числовой: снимок пересобирается с более широкими типами
+    crud.create_dataset_rows(db, [{"name": None, "age": None, "score": 2.5, "active": True}], dataset.id)
+    if storage == "json":
+        crud.create_dataset_rows(db, [{"name": "x", "age": "unknown", "score": None, "active": False}], dataset.id)
+    rebuilt = _snapshot(db, dataset)
+    assert rebuilt.row_count == len(crud.get_dataset_rows_raw(db, dataset.id, limit=1000))
+    assert rebuilt.watermark > appended.watermark
+    kinds = {column["name"]: column["kind"] for column in rebuilt.meta["columns"]}
+    assert kinds["score"] == ("number" if storage == "json" else "float64")
+    assert kinds["age"] == ("string" if storage == "json" else "int64")
+
+    # 3. Сборка с нуля даёт тот же снимок (файлы читаются лениво — до удаления)
+    stats, contents = rebuilt.describe(), _contents(rebuilt)
+    snapshots.delete_snapshot(dataset.id)
+    fresh = _snapshot(db, dataset)
+    assert {column["name"]: column["kind"] for column in fresh.meta["columns"]} == kinds
+    assert fresh.describe() == stats
+    assert _contents(fresh) == contents
+
+
+def test_snapshot_keeps_integers_in_number_columns(db, make_dataset):
+    dataset = make_dataset("json")
+    crud.create_dataset_rows(db, [{"name": "a", "score": 5}, {"name": "b", "score": 0.5}], dataset.id)
+
+    snapshot = _snapshot(db, dataset)
+    score = snapshot.columns["score"]
+    assert score.to_list() == [5, 0.5]
+    assert isinstance(score.to_list()[0], int)
+    stats = score.describe()
+    assert (stats["min"], stats["max"], stats["count"]) == (0.5, 5, 2)
+
+
+def test_new_rows_after_watermark(db, make_dataset):
+    dataset = make_dataset("json")
+    crud.create_dataset_rows(db, [{"name": "a"}], dataset.id)
+    snapshot = _snapshot(db, dataset)
+
+    crud.create_dataset_rows(db, [{"name": "b"}, {"name": "c"}], dataset.id)
+    assert [row["name"] for row in snapshot.new_rows(db)] == ["b", "c"]
+    assert [row["name"] for row in snapshot.new_rows(db, limit=1)] == ["b"]